@@ -0,0 +1,148 @@
+"""
+In-process Python API for pushing and pulling theme files, without argparse, log formatting or progress bars.
+
+    from ntk import api
+
+    config = {'store': 'https://storedomain.com', 'apikey': '<api key>', 'theme_id': 1}
+    results = api.push(['layouts/base.html'], config=config)
+    failed = [result for result in results if not result.ok]
+
+A dict config overrides the entry of config.yml of its env, development by default, when there is one. Importing
+this module leaves the logging configuration of the application alone.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import RequestException
+
+from ntk.command import Command
+from ntk.conf import Config, MAX_CONCURRENCY
+from ntk.gateway import Gateway
+from ntk.utils import get_template_name, sort_by_upload_priority
+from ntk.validator import validate_files
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+class TemplateResult:
+    """Outcome of one template transfer."""
+
+    def __init__(self, template_name, status, size=0, duration=0.0, error=None):
+        self.template_name = template_name
+        self.status = status
+        self.size = size
+        self.duration = duration
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return f'<TemplateResult {self.template_name} {self.status} {self.size} bytes {self.duration:.3f}s>'
+
+
+def _get_command(config):
+    if config is None:
+        config = Config()
+    elif isinstance(config, dict):
+        config = Config(**config)
+    config.validate_config()
+
+    # gateways are kept between calls so their connections and concurrency limit are reused
+    with _gateways_lock:
+        key = (config.store, config.apikey, config.rate_limit, config.gzip, config.max_bandwidth)
+        if key not in _gateways:
+            _gateways[key] = Gateway(
+                store=config.store, apikey=config.apikey, rate_limit=config.rate_limit, gzip=config.gzip,
+                max_bandwidth=config.max_bandwidth)
+        gateway = _gateways[key]
+
+    return Command(config=config, gateway=gateway)
+
+
+def _get_error(response):
+    if response.ok:
+        return None
+    if response.headers.get('content-type') == 'application/json':
+        result = response.json()
+        if isinstance(result, dict):
+            return ' '.join(' '.join(value) if isinstance(value, list) else str(value) for value in result.values())
+    return f'HTTP {response.status_code}'
+
+
+def _run(func, items):
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix='ntk-api') as executor:
+        return list(executor.map(func, items))
+
+
+def push(paths=None, config=None):
+    """
+    Upload theme files and return a TemplateResult per file, in upload order.
+    paths defaults to every theme file, config is a Config, a dict of Config attributes or None for config.yml.
+    Nothing is uploaded when a file is invalid, invalid files are reported "invalid" and the others "skipped".
+    """
+    command = _get_command(config)
+    template_names = sort_by_upload_priority(command._get_accept_files(paths or []))
+
+    invalid = validate_files(template_names, max_file_size=command.config.max_file_size)
+    if invalid:
+        return [
+            TemplateResult(template_name, 'invalid', error='; '.join(invalid[template_name]))
+            if template_name in invalid else
+            TemplateResult(template_name, 'skipped', error='Not uploaded, other files are invalid')
+            for template_name in map(get_template_name, template_names)
+        ]
+
+    def push_template(template_name):
+        template_name = get_template_name(template_name)
+        started = time.monotonic()
+        try:
+            response = command._push_template(template_name)
+            error = _get_error(response)
+        except (OSError, RequestException) as exception:
+            error = str(exception)
+        status = 'failed' if error else 'uploaded'
+        size = os.path.getsize(template_name) if os.path.isfile(template_name) else 0
+        return TemplateResult(template_name, status, size, time.monotonic() - started, error)
+
+    return _run(push_template, template_names)
+
+
+def pull(paths=None, config=None):
+    """
+    Download theme files into the current directory and return a TemplateResult per file.
+    paths defaults to every template of the theme, config is a Config, a dict of Config attributes or None.
+    """
+    command = _get_command(config)
+    theme_id = command.config.theme_id
+
+    if paths:
+        templates = []
+        for path in paths:
+            response = command.gateway.get_template(theme_id=theme_id, template_name=get_template_name(path))
+            templates.append(response.json() if response.ok else {'name': get_template_name(path), 'error': response})
+    else:
+        response = command.gateway.get_templates(theme_id=theme_id)
+        if not response.ok:
+            raise RequestException(f'Downloading templates from theme id #{theme_id} failed, {_get_error(response)}')
+        templates = response.json()
+
+    def pull_template(template):
+        template_name = str(template['name'])
+        if 'error' in template:
+            return TemplateResult(template_name, 'failed', error=_get_error(template['error']))
+        started = time.monotonic()
+        try:
+            response = command._pull_template(template)
+            error = _get_error(response) if response is not None else None
+        except (OSError, RequestException) as exception:
+            error = str(exception)
+        status = 'failed' if error else 'downloaded'
+        size = os.path.getsize(template_name) if os.path.isfile(template_name) else 0
+        return TemplateResult(template_name, status, size, time.monotonic() - started, error)
+
+    return _run(pull_template, templates)
@@ -0,0 +1,109 @@
+import itertools
+import logging
+import posixpath
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ntk.conf import ARCHIVE_SPOOL_SIZE, MAX_CONCURRENCY
+from ntk.ignore import is_ignored
+from ntk.utils import is_theme_file
+
+CHUNK_SIZE = 64 * 1024
+
+
+def is_safe_name(template_name):
+    """Return True if a template name stays inside the theme directory, not absolute and without ".." parts."""
+    return bool(template_name) and '\\' not in template_name and \
+        posixpath.normpath(template_name) == template_name and \
+        not template_name.startswith(('/', '../')) and template_name != '..'
+
+
+class ThemeExport:
+    """
+    Write the templates of a remote theme into a zip archive, without writing the theme files to disk.
+
+    Text templates come with the listing and are deflated into the archive as they are. Media files are
+    downloaded concurrently and streamed into a spool file, in memory up to ARCHIVE_SPOOL_SIZE and on disk past
+    it, then copied into the archive by the calling thread, the only one writing to it. At most 2 * MAX_CONCURRENCY
+    downloads are in flight or waiting to be written, so memory stays bounded whatever the theme size.
+    """
+
+    def __init__(self, gateway, path, env):
+        self.gateway = gateway
+        self.path = path
+        self.env = env
+
+    def _download(self, url):
+        response = self.gateway._request("GET", url, stream=True)
+        with response:
+            if not response.ok:
+                raise IOError(f'Downloading failed with status {response.status_code}')
+            spool = tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE)
+            try:
+                for chunk in self.gateway.iter_content(response, CHUNK_SIZE):
+                    spool.write(chunk)
+            except BaseException:
+                spool.close()
+                raise
+        return spool
+
+    def _write_media(self, archive, template_name, spool):
+        info = zipfile.ZipInfo(template_name, date_time=time.localtime()[:6])
+        # media files are compressed formats already
+        info.compress_type = zipfile.ZIP_STORED
+        # a known size lets zipfile pick the zip64 format for files over 2 GiB
+        info.file_size = spool.seek(0, 2)
+        spool.seek(0)
+        with archive.open(info, 'w') as entry:
+            shutil.copyfileobj(spool, entry, CHUNK_SIZE)
+
+    def export(self, templates):
+        """Write the templates of a listing into the archive, return the number of files written and failed."""
+        templates = [template for template in templates if is_safe_name(str(template['name']))]
+        media_templates = iter([template for template in templates if template.get('file')])
+        written, failed = 0, 0
+
+        # the archive only replaces a previous one once complete
+        temporary_path = f'{self.path}.tmp'
+        with zipfile.ZipFile(temporary_path, 'w', zipfile.ZIP_DEFLATED) as archive, \
+                ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix='ntk-export') as executor:
+            for template in templates:
+                if not template.get('file'):
+                    info = zipfile.ZipInfo(str(template['name']), date_time=time.localtime()[:6])
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    archive.writestr(info, (template.get('content') or '').encode('utf-8'))
+                    written += 1
+
+            downloads = {}
+            while True:
+                for template in itertools.islice(media_templates, 2 * MAX_CONCURRENCY - len(downloads)):
+                    downloads[executor.submit(self._download, template['file'])] = str(template['name'])
+                if not downloads:
+                    break
+                done, _ = wait(downloads, return_when=FIRST_COMPLETED)
+                for future in done:
+                    template_name = downloads.pop(future)
+                    try:
+                        spool = future.result()
+                    except Exception as error:
+                        failed += 1
+                        logging.error(f'[{self.env}] {template_name}: {error}')
+                        continue
+                    with spool:
+                        self._write_media(archive, template_name, spool)
+                    written += 1
+
+        shutil.move(temporary_path, self.path)
+        return written, failed
+
+
+def get_archive_templates(archive):
+    """Return the zip entries of an archive which are theme files and not ignored."""
+    return [
+        info for info in archive.infolist()
+        if not info.is_dir() and is_safe_name(info.filename) and is_theme_file(info.filename)
+        and not is_ignored(info.filename)
+    ]
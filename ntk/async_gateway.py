@@ -0,0 +1,143 @@
+import asyncio
+import json
+from urllib.parse import urljoin
+
+from ntk.conf import MAX_CONCURRENCY
+from ntk.decorator import check_error
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+class AsyncResponse:
+    """Fully read aiohttp response, exposing the parts of requests.Response used by ntk."""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncGateway:
+    """
+    asyncio version of Gateway, with the same operations and the same error logging through check_error.
+
+    Every request goes through one aiohttp session, whose connection pool is bounded by `limit`, so thousands
+    of template operations can be awaited concurrently from one event loop. Use it as an async context manager,
+    or call close() when done. Requires aiohttp, install with `pip install next-theme-kit[async]`.
+    """
+
+    def __init__(self, store, apikey, limit=MAX_CONCURRENCY):
+        if aiohttp is None:
+            raise ImportError('AsyncGateway requires aiohttp, install it with pip install next-theme-kit[async]')
+        self.store = store
+        self.apikey = apikey
+        self.limit = limit
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.limit))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def _request(self, request_type, url, apikey=None, payload={}, files={}):
+        headers = {}
+        if apikey:
+            headers = {'Authorization': f'Bearer {apikey}'}
+
+        # like requests, fields set to None are not sent
+        payload = {name: value for name, value in payload.items() if value is not None}
+        data = payload or None
+        if files:
+            data = aiohttp.MultipartWriter('form-data')
+            for name, value in payload.items():
+                data.append(str(value)).set_content_disposition('form-data', name=name)
+            for name, (filename, content, *content_type) in files.items():
+                headers_part = {'Content-Type': content_type[0]} if content_type else None
+                disposition = {'name': name, 'filename': filename} if filename else {'name': name}
+                data.append(content, headers_part).set_content_disposition('form-data', **disposition)
+
+        async with self.session.request(request_type, url, headers=headers, data=data) as response:
+            result = AsyncResponse(response.status, response.headers, await response.read())
+
+        if result.status_code == 429 and "throttled" in result.content.decode():
+            await asyncio.sleep(float(result.headers.get('Retry-After', 1)))
+            return await self._request(request_type, url, apikey, payload, files)
+        return result
+
+    @check_error(error_format='Missing Themes in {store}')
+    async def get_themes(self):
+        api_path = '/api/admin/themes/'
+        url = urljoin(self.store, api_path)
+
+        return await self._request("GET", url, apikey=self.apikey)
+
+    @check_error(error_format='Theme "{name}" creation failed.{error_msg}')
+    async def create_theme(self, name):
+        api_path = '/api/admin/themes/'
+        url = urljoin(self.store, api_path)
+
+        payload = dict(name=name)
+
+        return await self._request("POST", url, apikey=self.apikey, payload=payload)
+
+    @check_error(error_format='Downloading {template_name} file from theme id #{theme_id} failed.{error_msg}')
+    async def get_template(self, theme_id, template_name):
+        api_path = f"/api/admin/themes/{theme_id}/templates/?name={template_name}"
+        url = urljoin(self.store, api_path)
+
+        return await self._request("GET", url, apikey=self.apikey)
+
+    @check_error(error_format='Downloading templates files from theme id #{theme_id} failed.{error_msg}')
+    async def get_templates(self, theme_id):
+        api_path = f"/api/admin/themes/{theme_id}/templates/"
+        url = urljoin(self.store, api_path)
+
+        return await self._request("GET", url, apikey=self.apikey)
+
+    @check_error(error_format='Uploading {template_name} file to theme id #{theme_id} failed.{error_msg}')
+    async def create_or_update_template(self, theme_id, template_name, content=None, files=None):
+        api_path = f"/api/admin/themes/{theme_id}/templates/"
+        url = urljoin(self.store, api_path)
+
+        if files:
+            payload = dict(
+                name=template_name,
+                content=content
+            )
+        else:
+            # text content is sent as raw bytes in a multipart part, URL encoding would inflate it up to 3 times
+            payload = dict(name=template_name)
+            if isinstance(content, str):
+                content = content.encode('utf-8')
+            files = {'content': (None, content or b'', 'text/plain; charset=utf-8')}
+
+        return await self._request("POST", url, apikey=self.apikey, payload=payload, files=files)
+
+    @check_error(error_format='Deleting {template_name} file from theme id #{theme_id} failed.{error_msg}',
+                 response_json=False)
+    async def delete_template(self, theme_id, template_name):
+        api_path = f"/api/admin/themes/{theme_id}/templates/?name={template_name}"
+        url = urljoin(self.store, api_path)
+
+        return await self._request("DELETE", url, apikey=self.apikey)
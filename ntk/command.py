@@ -1,89 +1,534 @@
 import asyncio
+import collections
+import difflib
+import fnmatch
 import glob
 import logging
 import os
+import re
+import sys
+import threading
 import time
-import sass
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
-from watchgod import awatch
+import sass
+from requests.exceptions import RequestException
 from watchgod.watcher import Change
 
+from ntk.archive import get_archive_templates, ThemeExport
 from ntk.conf import (
-    Config, MEDIA_FILE_EXTENSIONS, GLOB_PATTERN, SASS_DESTINATION, SASS_SOURCE
+    Config, INDEX_MAX_AGE, LARGE_FILE_SIZE, MAX_CONCURRENCY, MEDIA_FILE_EXTENSIONS, OFFLINE_RETRY_INTERVAL,
+    REMOTE_POLL_INTERVAL, SASS_DESTINATION, SASS_SOURCE, WATCH_DIRECTORIES
 )
+from ntk.daemon import Daemon
 from ntk.decorator import parser_config
 from ntk.gateway import Gateway
-from ntk.utils import get_template_name, progress_bar
-
-
-logging.basicConfig(
-    format='%(asctime)s %(levelname)s %(message)s',
-    level=logging.INFO,
-    datefmt='%Y-%m-%d %H:%M:%S'
+from ntk.ignore import get_ignore_matcher, is_ignored
+from ntk.index import ThemeIndex
+from ntk.limiter import get_limiter
+from ntk.live_reload import LiveReloadServer
+from ntk.metrics import LatencyRecorder
+from ntk.mirror import match_theme, ThemeMirror
+from ntk.offline import DELETE, is_unavailable, OfflineQueue, PUSH
+from ntk.optimizer import optimize_files
+from ntk.pipeline import UploadPipeline
+from ntk.snapshot import SnapshotStore
+from ntk.utils import (
+    get_content_hash, get_file_hash, get_file_size, get_git_changes, get_template_name, is_large_file, is_theme_file,
+    progress_bar, sort_by_upload_priority
 )
+from ntk.validator import validate_files
+from ntk.watcher import watch_theme
 
 
 class Command:
-    def __init__(self):
-        self.config = Config()
-        self.gateway = Gateway(store=self.config.store, apikey=self.config.apikey)
+    def __init__(self, config=None, gateway=None):
+        self.config = config or Config()
+        self.gateway = gateway or Gateway(store=self.config.store, apikey=self.config.apikey)
+        self._sass_lock = threading.Lock()
+        # content hash of every template last uploaded, by template name
+        self._content_hashes = {}
+        # content hash of every asset last compiled from sass, by template name, so the file change events caused
+        # by compiling are ignored whether or not the upload went through
+        self._generated_hashes = {}
+        # path of the optimized copy to upload instead of the theme file, by template name
+        self._optimized_paths = {}
+        # changes not confirmed by the store yet, only kept by watch
+        self._offline_queue = None
+        # (remote hash, local file hash) of every template when both sides were last in sync, only kept by
+        # watch --bidirectional
+        self._remote_state = None
+        self._remote_etag = None
+        # save to store acknowledgement latency, when each change was detected by template name, and the changes
+        # confirmed since the uploads were last idle, only kept by watch
+        self._latency = None
+        self._detected_at = {}
+        self._live_changes = None
+        self._live_changes_lock = threading.Lock()
 
     def _get_accept_files(self, template_names):
-        files = []
-        glob_list = map(lambda x: os.path.abspath(x), GLOB_PATTERN)
-        for pattern in glob_list:
-            files.extend(glob.glob(pattern, recursive=True))
+        ignore_matcher = get_ignore_matcher()
 
+        # explicit files are matched against GLOB_PATTERN directly, without scanning the whole theme
         if template_names:
             filenames = list(map(lambda x: os.path.abspath(x), template_names))
-            template_names = list(filter(lambda x: x in files, filenames))
-        else:
-            template_names = files
+            return list(filter(
+                lambda x: is_theme_file(x) and not ignore_matcher.is_ignored(x) and os.path.isfile(x), filenames))
 
-        return template_names
+        # only the theme directories are walked, and ignored directories are pruned instead of walked
+        files = []
+        for directory in WATCH_DIRECTORIES:
+            for dirpath, dirnames, filenames in os.walk(os.path.abspath(directory), followlinks=True):
+                dirnames[:] = [
+                    dirname for dirname in dirnames
+                    if not dirname.startswith('.') and not ignore_matcher.should_prune(os.path.join(dirpath, dirname))
+                ]
+                for filename in filenames:
+                    pathfile = os.path.join(dirpath, filename)
+                    if is_theme_file(pathfile) and not ignore_matcher.is_ignored(pathfile):
+                        files.append(pathfile)
+        return files
 
     def _handle_files_change(self, changes):
         for event_type, pathfile in changes:
             template_name = get_template_name(pathfile)
             if event_type in [Change.added, Change.modified]:
+                content_hash = get_file_hash(template_name)
+                if content_hash and content_hash in (
+                        self._content_hashes.get(template_name), self._generated_hashes.get(template_name)):
+                    logging.debug(f'[{self.config.env}] Skipping {template_name}, content is unchanged')
+                    continue
                 logging.info(f'[{self.config.env}] {str(event_type)} {template_name}')
                 self._push_templates([template_name], compile_sass=True)
             elif event_type == Change.deleted:
                 logging.info(f'[{self.config.env}] {str(event_type)} {template_name}')
                 self._delete_templates([template_name])
 
+    def _sync_changes(self, changes):
+        """Reconcile a burst of file changes at once, only pushing and deleting what differs from the last push."""
+        template_names = {get_template_name(pathfile) for _, pathfile in changes}
+
+        compiled_files = []
+        if any(template_name.split('/')[0] == SASS_SOURCE for template_name in template_names):
+            compiled_files = [get_template_name(pathfile) for pathfile in self._compile_sass()]
+
+        push_names, delete_names = [], []
+        for template_name in sorted(template_names):
+            content_hash = get_file_hash(template_name)
+            if content_hash is None:
+                delete_names.append(template_name)
+            elif content_hash != self._content_hashes.get(template_name):
+                push_names.append(template_name)
+            else:
+                self._confirm_change(template_name, None)
+        push_names = sort_by_upload_priority(set(push_names + compiled_files))
+        # invalid files are left out of the burst, they are uploaded once fixed and saved again
+        invalid_names = self._get_invalid_templates(push_names)
+        push_names = [template_name for template_name in push_names if template_name not in invalid_names]
+        if self.config.optimize:
+            self._optimize_templates(push_names)
+        self._queue_changes(push_names, PUSH)
+        self._queue_changes(delete_names, DELETE)
+
+        logging.info(
+            f'[{self.config.env}] Synchronizing {len(changes)} changes, '
+            f'{len(push_names)} files to upload and {len(delete_names)} files to delete')
+
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix='ntk-sync') as executor:
+            futures = [executor.submit(self._push_template, template_name) for template_name in push_names]
+            futures += [executor.submit(self._delete_template, template_name) for template_name in delete_names]
+            for future in progress_bar(futures, prefix=f'[{self.config.env}] Progress:', suffix='Complete', length=50):
+                future.result()
+
+    def _queue_changes(self, template_names, action):
+        if self._offline_queue is not None:
+            self._offline_queue.add([get_template_name(template_name) for template_name in template_names], action)
+
+    def _confirm_change(self, template_name, response):
+        # once the store answered, sending the change again would not change the outcome
+        if self._offline_queue is not None and (response is None or not is_unavailable(response)):
+            self._offline_queue.discard(template_name)
+
+    def _record_live_change(self, template_name, started_at=None):
+        """Keep a change confirmed by the store for the next live reload, with its latency since the file save."""
+        if self._live_changes is None:
+            return
+        latency = None
+        detected_at = self._detected_at.pop(template_name, None)
+        if started_at is not None and detected_at is not None and os.path.isfile(template_name):
+            latency = self._latency.record(os.path.getmtime(template_name), detected_at, started_at, time.time())
+        with self._live_changes_lock:
+            self._live_changes.append((template_name, latency))
+
+    def _is_store_reachable(self):
+        try:
+            response = self.gateway._request("GET", self.config.store)
+        except RequestException:
+            return False
+        return not is_unavailable(response)
+
+    def _get_source_pathfile(self, relative_pathfile, optimized=None):
+        # the optimized copy is only uploaded while optimize is on, a later plain push sends the theme file
+        if optimized is None:
+            optimized = self.config.optimize
+        return self._optimized_paths.get(relative_pathfile, relative_pathfile) if optimized else relative_pathfile
+
+    def _read_template(self, template_name, optimized=None):
+        relative_pathfile = get_template_name(template_name)
+        source_pathfile = self._get_source_pathfile(relative_pathfile, optimized)
+
+        files = {}
+        content = ''
+        if relative_pathfile.endswith(tuple(MEDIA_FILE_EXTENSIONS)):
+            files = {'file': (relative_pathfile, open(source_pathfile, 'rb'))}
+        else:
+            # text content is uploaded as is, without a decode and encode round trip
+            with open(source_pathfile, "rb") as f:
+                content = f.read()
+                f.close()
+        return content, files
+
+    def _run_concurrently(self, func, items, large_items=(), stop_on_error=True):
+        """
+        Call func for every item on a thread pool with a progress bar, and return the results in order.
+        Stop at the first failed response unless stop_on_error is False. large_items run on a separate single
+        worker lane so they never hold back the other items. The requests in flight are bounded by the gateway
+        adaptive limit.
+        """
+        results = []
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix='ntk-worker') as executor, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix='ntk-large-worker') as large_lane:
+            futures = [executor.submit(func, item) for item in items]
+            futures += [large_lane.submit(func, item) for item in large_items]
+            for future in progress_bar(futures, prefix=f'[{self.config.env}] Progress:', suffix='Complete', length=50):
+                result = future.result()
+                results.append(result)
+                if stop_on_error and result is not None and not result.ok:
+                    for pending_future in futures:
+                        pending_future.cancel()
+                    break
+
+        if len(futures) > 1:
+            logging.info(f'[{self.config.env}] Store {get_limiter(self.config.store).summary()}')
+        return results
+
+    def _get_succeeded(self, template_names, results):
+        """Return the template names of a batch when every request succeeded, otherwise None."""
+        if len(results) != len(template_names) or not all(result is not None and result.ok for result in results):
+            return None
+        return [get_template_name(template_name) for template_name in template_names]
+
+    def _push_template(self, template_name, payload=None):
+        relative_pathfile = get_template_name(template_name)
+        started_at = time.time()
+        content, files = payload or self._read_template(relative_pathfile)
+
+        response = self.gateway.create_or_update_template(
+            theme_id=self.config.theme_id, template_name=relative_pathfile, content=content, files=files)
+        if response.ok:
+            # an optimized upload is tracked by the hash of the theme file, which is what watch compares against
+            is_original = (
+                isinstance(content, bytes) and not files
+                and self._get_source_pathfile(relative_pathfile) == relative_pathfile)
+            content_hash = get_content_hash(content) if is_original else None
+            self._content_hashes[relative_pathfile] = content_hash or get_file_hash(relative_pathfile)
+            if self._remote_state is not None:
+                self._record_upload(relative_pathfile, content, files, response)
+            self._record_live_change(relative_pathfile, started_at)
+        self._confirm_change(relative_pathfile, response)
+        return response
+
     def _push_templates(self, template_names, compile_sass=False):
         template_names = self._get_accept_files(template_names)
+
+        # compiled assets are uploaded in the same pass instead of waiting for their file change events
+        if compile_sass and any(get_template_name(name).split('/')[0] == SASS_SOURCE for name in template_names):
+            for compiled_pathfile in self._compile_sass():
+                if compiled_pathfile not in template_names:
+                    template_names.append(compiled_pathfile)
+
+        template_names = sort_by_upload_priority(template_names)
         template_count = len(template_names)
 
+        # nothing is uploaded when a file would be rejected, the theme is never left half deployed
+        if self._get_invalid_templates(template_names):
+            logging.error(f'[{self.config.env}] Nothing was uploaded, fix the files above and push again')
+            return None
+
+        if self.config.optimize:
+            self._optimize_templates(template_names)
+
         logging.info(f'[{self.config.env}] Connecting to {self.config.store}')
         logging.info(f'[{self.config.env}] Uploading {template_count} files to theme id {self.config.theme_id}')
 
+        # large files are uploaded on a background lane so they never hold back the templates
+        small_files = [template_name for template_name in template_names if not is_large_file(template_name)]
+        large_files = [template_name for template_name in template_names if is_large_file(template_name)]
+        self._queue_changes(template_names, PUSH)
+        results = self._run_concurrently(self._push_template, small_files, large_items=large_files)
+        return self._get_succeeded(small_files + large_files, results)
+
+    def _get_invalid_templates(self, template_names):
+        """Check the files before any upload, log the problems found and return the names of the invalid files."""
+        invalid = validate_files(template_names, max_file_size=self.config.max_file_size)
+        for template_name, problems in invalid.items():
+            for problem in problems:
+                logging.error(f'[{self.config.env}] {template_name}: {problem}')
+        return set(invalid)
+
+    def _optimize_templates(self, template_names):
+        optimized_paths = optimize_files(template_names)
+        # a file which no longer shrinks must not keep the copy of its previous content
         for template_name in template_names:
-            if compile_sass and get_template_name(template_name).split('/')[0] == SASS_SOURCE:
-                self._compile_sass()
-
-        for template_name in progress_bar(
-                template_names, prefix=f'[{self.config.env}] Progress:', suffix='Complete', length=50):
+            self._optimized_paths.pop(get_template_name(template_name), None)
+        self._optimized_paths.update(optimized_paths)
+        if optimized_paths:
+            original_size = sum(os.path.getsize(pathfile) for pathfile in optimized_paths)
+            optimized_size = sum(os.path.getsize(pathfile) for pathfile in optimized_paths.values())
+            logging.info(
+                f'[{self.config.env}] Optimized {len(optimized_paths)} files, '
+                f'{original_size} bytes down to {optimized_size} bytes')
+
+    def _get_changes_since(self, revision, env):
+        """Return the theme files to upload and to delete since a git revision, with Sass compiled if it changed."""
+        try:
+            changed, deleted = get_git_changes(revision)
+        except (OSError, ValueError) as error:
+            raise TypeError(f'[{env}] argument --since {revision} could not be compared with git: {error}')
+        deleted = [template_name for template_name in deleted if not is_ignored(template_name)]
+
+        if any(template_name.split('/')[0] == SASS_SOURCE for template_name in changed + deleted):
+            self._compile_sass()
+            changed += [output for output in self._get_sass_outputs() if output not in changed]
+        return changed, deleted
+
+    def _push_changes(self, changed, deleted, revision, snapshot=True):
+        if not changed and not deleted:
+            logging.info(f'[{self.config.env}] No theme files changed since {revision}')
+            return
+        pushed = self._push_templates(changed) if changed else []
+        deleted = self._delete_templates(deleted) if deleted else []
+        if snapshot and pushed is not None and deleted is not None:
+            self._record_snapshot(pushed, deleted)
+
+    def _record_snapshot(self, pushed, deleted=(), complete=False):
+        """
+        Record the theme state after a successful push: the uploaded files on top of the latest snapshot of the
+        same theme, or only the uploaded files when the whole theme was pushed.
+        """
+        store = SnapshotStore(self.config.env)
+        latest = store.get_latest()
+        if latest and (latest.get('store'), latest.get('theme_id')) != (self.config.store, self.config.theme_id):
+            latest = None
+
+        files = dict(latest['files']) if latest and not complete else {}
+        for template_name in map(get_template_name, pushed):
+            files[template_name] = store.put_blob(self._get_source_pathfile(template_name))
+        for template_name in map(get_template_name, deleted):
+            files.pop(template_name, None)
+
+        snapshot_id = store.record(
+            files, complete or bool(latest and latest.get('complete')),
+            store=self.config.store, theme_id=self.config.theme_id)
+        logging.info(f'[{self.config.env}] Recorded snapshot {snapshot_id} of {len(files)} files')
+        return snapshot_id
+
+    def _get_env_command(self, env, parser=None):
+        command = Command()
+        command.config.env = env
+        command.config.read_config()
+        if parser is not None:
+            command.config.apply_options(parser)
+        command.config.validate_config()
+        command.gateway.store = command.config.store
+        command.gateway.apikey = command.config.apikey
+        command.gateway.rate_limit = command.config.rate_limit
+        command.gateway.gzip = command.config.gzip
+        command.gateway.max_bandwidth = command.config.max_bandwidth
+        return command
+
+    def _push_to_envs(self, template_names, envs, snapshot=True, parser=None, deleted=None):
+        """
+        Scan and read the theme files once, then upload them to every environment concurrently. The deleted
+        template names, the ones of push --since, are then removed from every environment concurrently as well.
+        """
+        targets = [self._get_env_command(env, parser) for env in envs]
+        complete = not template_names and deleted is None
+        template_names = sort_by_upload_priority(self._get_accept_files(template_names)) if (
+            template_names or complete) else []
+        template_count = len(template_names)
 
-            relative_pathfile = get_template_name(template_name)
-            template_name = get_template_name(template_name)
+        if self._get_invalid_templates(template_names):
+            logging.error(f'[{",".join(envs)}] Nothing was uploaded, fix the files above and push again')
+            return dict.fromkeys(envs, 0)
+
+        # the optimized copies are made once, for the environments which upload them
+        if any(target.config.optimize for target in targets):
+            self._optimize_templates(template_names)
+            for target in targets:
+                if target.config.optimize:
+                    target._optimized_paths = self._optimized_paths
+
+        if template_count:
+            logging.info(f'[{",".join(envs)}] Uploading {template_count} files to {len(targets)} environments')
+
+        # each file is read once per variant, original or optimized, and released as soon as every environment
+        # has uploaded it
+        payloads = {}
+        remaining = collections.Counter(
+            (template_name, bool(target.config.optimize)) for target in targets for template_name in template_names)
+        payloads_lock = threading.Lock()
+
+        def get_payload(key):
+            with payloads_lock:
+                if key not in payloads:
+                    template_name, optimized = key
+                    content, files = self._read_template(template_name, optimized=optimized)
+                    if files:
+                        relative_pathfile, media_file = files['file']
+                        with media_file:
+                            files = {'file': (relative_pathfile, media_file.read())}
+                    payloads[key] = (content, files)
+                return payloads[key]
+
+        def release_payloads(keys):
+            with payloads_lock:
+                for key in keys:
+                    remaining[key] -= 1
+                    if not remaining[key]:
+                        payloads.pop(key, None)
+
+        def push_env(target):
+            # every environment gets the concurrent upload of a single push, with its own large file lane
+            optimized = bool(target.config.optimize)
+            released = set()
+            uploaded = []
+
+            def push_template(template_name):
+                key = (template_name, optimized)
+                try:
+                    response = target._push_template(template_name, payload=get_payload(key))
+                finally:
+                    released.add(key)
+                    release_payloads([key])
+                if response.ok:
+                    uploaded.append(template_name)
+                return response
+
+            small_files = [template_name for template_name in template_names if not is_large_file(template_name)]
+            large_files = [template_name for template_name in template_names if is_large_file(template_name)]
+            deleted_names = None
+            try:
+                if template_names:
+                    target._run_concurrently(push_template, small_files, large_items=large_files)
+                deleted_names = target._delete_templates(deleted) if deleted else []
+            except RequestException as error:
+                logging.error(f'[{target.config.env}] {error}')
+            # the files never sent after a failure are not waited for either
+            release_payloads([
+                (template_name, optimized) for template_name in template_names
+                if (template_name, optimized) not in released
+            ])
+            return len(uploaded), deleted_names
+
+        with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix='ntk-env') as executor:
+            results = list(executor.map(push_env, targets))
+
+        for target, (uploaded, deleted_names) in zip(targets, results):
+            if template_count:
+                log = logging.info if uploaded == template_count else logging.error
+                log(f'[{target.config.env}] Uploaded {uploaded} of {template_count} files '
+                    f'to theme id {target.config.theme_id} on {target.config.store}')
+            if snapshot and uploaded == template_count and deleted_names is not None:
+                target._record_snapshot(template_names, deleted_names, complete=complete)
+        return {env: uploaded for env, (uploaded, _) in zip(envs, results)}
+
+    def _pull_template(self, template):
+        template_name = str(template['name'])
+        current_pathfile = os.path.abspath(template_name)
+
+        # create directories
+        dirs = os.path.dirname(current_pathfile)
+        os.makedirs(dirs, exist_ok=True)
+
+        # write file
+        if template['file']:
+            response = self.gateway._request("GET", template['file'])
+            with open(current_pathfile, "wb") as media_file:
+                media_file.write(response.content)
+                media_file.close()
+            return response
+        else:
+            with open(current_pathfile, "w", encoding="utf-8") as template_file:
+                template_file.write(template.get('content'))
+                template_file.close()
+
+    def _get_remote_hash(self, template):
+        # media content is not part of the listing, their URL and update time stand for it
+        if template.get('file'):
+            return get_content_hash(f'{template["file"]}|{template.get("updated_at") or ""}'.encode('utf-8'))
+        return get_content_hash((template.get('content') or '').encode('utf-8'))
+
+    def _record_upload(self, template_name, content, files, response):
+        remote_hash = None
+        if files and response.headers.get('content-type') == 'application/json':
+            remote_hash = self._get_remote_hash(response.json())
+        elif not files:
+            remote_hash = get_content_hash(content if isinstance(content, bytes) else content.encode('utf-8'))
+        self._remote_state[template_name] = (remote_hash, get_file_hash(template_name))
+
+    def _poll_remote_changes(self):
+        """
+        Pull the templates changed in the store since the last poll, and keep a copy next to the local file when
+        it was changed locally too. The first poll only records the current state of both sides.
+        """
+        response = self.gateway.get_templates(theme_id=self.config.theme_id, etag=self._remote_etag)
+        if response.status_code == 304 or not response.ok:
+            return
+        self._remote_etag = response.headers.get('ETag')
+        templates = {
+            str(template['name']): template for template in response.json()
+            if is_theme_file(str(template['name'])) and not is_ignored(str(template['name']))
+        }
+
+        if self._remote_state is None:
+            self._remote_state = {
+                template_name: (self._get_remote_hash(template), get_file_hash(template_name))
+                for template_name, template in templates.items()
+            }
+            return
 
-            files = {}
-            content = ''
-            if relative_pathfile.endswith(tuple(MEDIA_FILE_EXTENSIONS)):
-                files = {'file': (relative_pathfile, open(relative_pathfile, 'rb'))}
+        for template_name in set(self._remote_state) - set(templates):
+            logging.warning(f'[{self.config.env}] {template_name} was deleted in the store')
+            self._remote_state.pop(template_name)
+
+        for template_name, template in templates.items():
+            remote_hash = self._get_remote_hash(template)
+            synced_remote_hash, synced_local_hash = self._remote_state.get(template_name, (None, None))
+            if remote_hash == synced_remote_hash:
+                continue
+
+            local_hash = get_file_hash(template_name)
+            if not template.get('file') and local_hash == remote_hash:
+                # both sides already hold the same content
+                self._remote_state[template_name] = (remote_hash, local_hash)
+            elif local_hash is not None and local_hash != synced_local_hash:
+                conflict_pathfile = f'{template_name}.remote'
+                self._pull_template(dict(template, name=conflict_pathfile))
+                self._remote_state[template_name] = (remote_hash, synced_local_hash)
+                logging.warning(
+                    f'[{self.config.env}] {template_name} was changed both locally and in the store, '
+                    f'the store version is saved to {conflict_pathfile}')
             else:
-                with open(relative_pathfile, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    f.close()
-
-            response = self.gateway.create_or_update_template(
-                theme_id=self.config.theme_id, template_name=relative_pathfile, content=content, files=files)
-
-            time.sleep(0.07)
-            if not response.ok:
-                return
+                logging.info(f'[{self.config.env}] Pulling {template_name} changed in the store')
+                if not template.get('file'):
+                    # the file change event of the pulled content must not upload it back
+                    self._content_hashes[template_name] = remote_hash
+                self._pull_template(template)
+                local_hash = get_file_hash(template_name)
+                self._content_hashes[template_name] = local_hash
+                self._remote_state[template_name] = (remote_hash, local_hash)
 
     def _pull_templates(self, template_names):
         templates = []
@@ -98,54 +543,61 @@ class Command:
 
         if not isinstance(templates, list):
             return
+        templates = [template for template in templates if not is_ignored(str(template.get('name', '')))]
 
         template_count = len(templates)
         logging.info(f'[{self.config.env}] Connecting to {self.config.store}')
         logging.info(f'[{self.config.env}] Pulling {template_count} files from theme id {self.config.theme_id} ')
-        current_files = []
-        for template in progress_bar(templates, prefix=f'[{self.config.env}] Progress:', suffix='Complete', length=50):
-            template_name = str(template['name'])
-            current_pathfile = os.path.abspath(template_name)
-            current_files.append(current_pathfile.replace('\\', '/'))
-
-            # create directories
-            dirs = os.path.dirname(current_pathfile)
-            if not os.path.exists(dirs):
-                os.makedirs(dirs)
-
-            # write file
-            if template['file']:
-                response = self.gateway._request("GET", template['file'])
-                with open(current_pathfile, "wb") as media_file:
-                    media_file.write(response.content)
-                    media_file.close()
-            else:
-                with open(current_pathfile, "w", encoding="utf-8") as template_file:
-                    template_file.write(template.get('content'))
-                    template_file.close()
-
-            time.sleep(0.08)
+        self._run_concurrently(self._pull_template, templates, stop_on_error=False)
+
+    def _delete_template(self, template_name):
+        template_name = get_template_name(template_name)
+        response = self.gateway.delete_template(theme_id=self.config.theme_id, template_name=template_name)
+        if response.ok:
+            self._content_hashes.pop(template_name, None)
+            if self._remote_state is not None:
+                self._remote_state.pop(template_name, None)
+            self._record_live_change(template_name)
+        self._confirm_change(template_name, response)
+        return response
 
     def _delete_templates(self, template_names):
         template_count = len(template_names)
         logging.info(f'[{self.config.env}] Connecting to {self.config.store}')
         logging.info(f'[{self.config.env}] Deleting {template_count} files from theme id {self.config.theme_id}')
 
-        for template_name in progress_bar(
-                template_names, prefix=f'[{self.config.env}] Progress:', suffix='Complete', length=50):
-            template_name = get_template_name(template_name)
-            response = self.gateway.delete_template(theme_id=self.config.theme_id, template_name=template_name)
-            if not response.ok:
-                return
+        self._queue_changes(template_names, DELETE)
+        results = self._run_concurrently(self._delete_template, template_names)
+        return self._get_succeeded(template_names, results)
+
+    def _get_sass_outputs(self):
+        outputs = []
+        for source in glob.glob(f'{SASS_SOURCE}/**/*.scss', recursive=True):
+            if not os.path.basename(source).startswith('_'):
+                name = os.path.splitext(os.path.relpath(source, SASS_SOURCE))[0]
+                outputs.append(get_template_name(os.path.join(SASS_DESTINATION, f'{name}.css')))
+        return outputs
 
     def _compile_sass(self):
+        """Compile sass to css and return the absolute path of compiled files which content has changed."""
         logging.info(f'[{self.config.env}] Processing {SASS_SOURCE} to {SASS_DESTINATION}.')
+        changed_files = []
         try:
-            sass.compile(dirname=(SASS_SOURCE, SASS_DESTINATION), output_style=self.config.sass_output_style)
+            # watch uploads run on several threads, only one of them may write the compiled assets
+            with self._sass_lock:
+                outputs = self._get_sass_outputs()
+                previous_hashes = {output: get_file_hash(output) for output in outputs}
+                sass.compile(dirname=(SASS_SOURCE, SASS_DESTINATION), output_style=self.config.sass_output_style)
+                for output in outputs:
+                    content_hash = get_file_hash(output)
+                    if content_hash != self._content_hashes.get(output, previous_hashes[output]):
+                        changed_files.append(os.path.abspath(output))
+                    self._generated_hashes[output] = content_hash
             logging.info(f'[{self.config.env}] Sass successfully processed.')
         except Exception as error:
             logging.error(f'[{self.config.env}] Sass processing failed, see error below.')
             logging.error(f'[{self.config.env}] {error}')
+        return changed_files
 
     @parser_config(theme_id_required=False)
     def init(self, parser):
@@ -180,9 +632,109 @@ class Command:
     def checkout(self, parser):
         self._pull_templates([])
 
-    @parser_config()
     def push(self, parser):
-        self._push_templates(parser.filenames or [])
+        envs = self.config.get_envs(parser)
+        snapshot = not getattr(parser, 'no_snapshot', False)
+        if len(envs) > 1:
+            # each environment is pushed to the theme of its entry of config.yml, only the options are shared
+            theme_arguments = [
+                argument for argument, name in [('-a/--apikey', 'apikey'), ('-s/--store', 'store'),
+                                                ('-t/--theme_id', 'theme_id')]
+                if getattr(parser, name, None)
+            ]
+            if theme_arguments:
+                raise TypeError(
+                    f'[{",".join(envs)}] argument {", ".join(theme_arguments)} cannot be used with several '
+                    f'environments, set them in config.yml instead.')
+        if len(envs) > 1 and getattr(parser, 'since', None):
+            # the Sass compiled for the changes follows the command line options as well
+            self.config.apply_options(parser)
+            changed, deleted = self._get_changes_since(parser.since, ','.join(envs))
+            if not changed and not deleted:
+                logging.info(f'[{",".join(envs)}] No theme files changed since {parser.since}')
+            else:
+                self._push_to_envs(changed, envs, snapshot=snapshot, parser=parser, deleted=deleted)
+        elif len(envs) > 1:
+            self._push_to_envs(parser.filenames or [], envs, snapshot=snapshot, parser=parser)
+        else:
+            parser.env = envs[0] if envs else parser.env
+            self._push(parser)
+
+    @parser_config()
+    def _push(self, parser):
+        snapshot = not getattr(parser, 'no_snapshot', False)
+        if getattr(parser, 'since', None):
+            changed, deleted = self._get_changes_since(parser.since, self.config.env)
+            self._push_changes(changed, deleted, parser.since, snapshot=snapshot)
+        else:
+            pushed = self._push_templates(parser.filenames or [])
+            if snapshot and pushed:
+                self._record_snapshot(pushed, complete=not parser.filenames)
+
+    @parser_config()
+    def rollback(self, parser):
+        store = SnapshotStore(self.config.env)
+        if not parser.snapshot:
+            snapshot_ids = store.get_snapshot_ids()
+            if not snapshot_ids:
+                logging.warning(f'[{self.config.env}] No snapshots recorded yet, they are recorded by ntk push')
+            for snapshot_id in snapshot_ids:
+                logging.info(f'[{self.config.env}] \t{snapshot_id}')
+            return
+
+        try:
+            snapshot = store.get(store.find(parser.snapshot))
+        except (KeyError, OSError):
+            raise TypeError(f'[{self.config.env}] Snapshot {parser.snapshot} not found, run ntk rollback to list them')
+        if snapshot.get('theme_id') != self.config.theme_id:
+            raise TypeError(
+                f'[{self.config.env}] Snapshot {snapshot["id"]} belongs to theme id {snapshot.get("theme_id")}')
+
+        response = self.gateway.get_templates(theme_id=self.config.theme_id)
+        if not response.ok:
+            return
+        remote_templates = {
+            str(template['name']): template for template in response.json()
+            if is_theme_file(str(template['name'])) and not is_ignored(str(template['name']))
+        }
+
+        # the listing has no hash of media files, they are compared with the latest snapshot instead
+        latest = store.get_latest()
+        latest_files = latest['files'] if latest else {}
+        upload_names = []
+        for template_name, content_hash in snapshot['files'].items():
+            template = remote_templates.get(template_name)
+            if template is None:
+                upload_names.append(template_name)
+            elif template.get('file'):
+                if latest_files.get(template_name) != content_hash:
+                    upload_names.append(template_name)
+            elif get_content_hash((template.get('content') or '').encode('utf-8')) != content_hash:
+                upload_names.append(template_name)
+        delete_names = [
+            template_name for template_name in remote_templates if template_name not in snapshot['files']
+        ] if snapshot.get('complete') else []
+
+        logging.info(
+            f'[{self.config.env}] Rolling back theme id {self.config.theme_id} to snapshot {snapshot["id"]}, '
+            f'{len(upload_names)} files to upload and {len(delete_names)} files to delete')
+
+        def push_snapshot_file(template_name):
+            blob_path = store.get_blob_path(snapshot['files'][template_name])
+            if template_name.endswith(tuple(MEDIA_FILE_EXTENSIONS)):
+                files = {'file': (template_name, open(blob_path, 'rb'))}
+                return self._push_template(template_name, payload=('', files))
+            with open(blob_path, 'rb') as f:
+                return self._push_template(template_name, payload=(f.read(), {}))
+
+        upload_names = sort_by_upload_priority(upload_names)
+        uploaded = self._get_succeeded(upload_names, self._run_concurrently(push_snapshot_file, upload_names))
+        deleted = self._delete_templates(delete_names) if delete_names else []
+        if uploaded is not None and deleted is not None:
+            store.record(
+                snapshot['files'], snapshot.get('complete', False), store=self.config.store,
+                theme_id=self.config.theme_id)
+            logging.info(f'[{self.config.env}] Theme id {self.config.theme_id} is back to snapshot {snapshot["id"]}')
 
     @parser_config()
     def watch(self, parser):
@@ -194,12 +746,243 @@ class Command:
         logging.info(f'[{self.config.env}] Watching for file changes in {current_pathfile}')
         logging.info(f'[{self.config.env}] Press Ctrl + C to stop')
 
+        self._offline_queue = OfflineQueue(self.config.env, self.config.theme_id)
+        if len(self._offline_queue):
+            logging.info(f'[{self.config.env}] {len(self._offline_queue)} changes were not uploaded by the last watch')
+
+        self._latency = LatencyRecorder()
+        self._live_changes = []
+        live_reload = LiveReloadServer(port=parser.live_reload) if getattr(parser, 'live_reload', None) else None
+
+        def on_uploads_done():
+            with self._live_changes_lock:
+                live_changes, self._live_changes = self._live_changes, []
+            if not live_changes:
+                return
+            latencies = [latency for _, latency in live_changes if latency is not None]
+            after_save = f' {max(latencies):.2f}s after save' if latencies else ''
+            logging.info(f'[{self.config.env}] {len(live_changes)} changes live{after_save}')
+            if live_reload:
+                tabs = live_reload.notify([template_name for template_name, _ in live_changes])
+                logging.debug(f'[{self.config.env}] Reloading {tabs} preview tabs')
+
+        pipeline = UploadPipeline(
+            self._handle_files_change, bulk_handler=self._sync_changes, idle_callback=on_uploads_done)
+
+        async def watch_changes():
+            async for changes in watch_theme('.'):
+                detected_at = time.time()
+                for _, pathfile in changes:
+                    self._detected_at[get_template_name(pathfile)] = detected_at
+                pipeline.submit(changes)
+
+        async def flush_offline_queue():
+            # queued changes are sent again in one batch once no upload is running and the store answers
+            loop = asyncio.get_event_loop()
+            while True:
+                if len(self._offline_queue) and not pipeline.tasks and not pipeline.pending:
+                    if await loop.run_in_executor(None, self._is_store_reachable):
+                        logging.info(f'[{self.config.env}] Uploading {len(self._offline_queue)} queued changes')
+                        pipeline.submit_bulk(self._offline_queue.get_changes())
+                await asyncio.sleep(OFFLINE_RETRY_INTERVAL)
+
+        async def poll_remote_changes():
+            # the store is only polled while no upload is running, so uploads in flight are never mistaken for
+            # remote edits
+            loop = asyncio.get_event_loop()
+            while True:
+                if not pipeline.tasks and not pipeline.pending:
+                    try:
+                        await loop.run_in_executor(None, self._poll_remote_changes)
+                    except RequestException as error:
+                        logging.debug(f'[{self.config.env}] Polling the store failed, {error}')
+                await asyncio.sleep(REMOTE_POLL_INTERVAL)
+
         async def main():
-            async for changes in awatch('.'):
-                self._handle_files_change(changes)
+            if live_reload:
+                try:
+                    await live_reload.start()
+                except OSError as error:
+                    raise TypeError(
+                        f'[{self.config.env}] argument --live_reload could not listen on port {live_reload.port}, '
+                        f'{error}')
+                logging.info(
+                    f'[{self.config.env}] Live reload enabled, add <script src="http://{live_reload.host}:'
+                    f'{live_reload.port}/livereload.js"></script> to the layout of the preview')
+            tasks = [watch_changes(), flush_offline_queue()]
+            if getattr(parser, 'bidirectional', False):
+                logging.info(f'[{self.config.env}] Pulling changes made in the store every {REMOTE_POLL_INTERVAL}s')
+                tasks.append(poll_remote_changes())
+            await asyncio.gather(*tasks)
 
         loop = asyncio.get_event_loop()
-        loop.run_until_complete(main())
+        try:
+            loop.run_until_complete(main())
+        finally:
+            pipeline.shutdown()
+            self._offline_queue.save()
+            if live_reload:
+                loop.run_until_complete(live_reload.close())
+            if len(self._latency):
+                logging.info(f'[{self.config.env}] Latency of {len(self._latency)} uploads')
+                for line in self._latency.summary():
+                    logging.info(f'[{self.config.env}] \t{line}')
+
+    @parser_config(theme_id_required=False)
+    def mirror(self, parser):
+        response = self.gateway.get_themes()
+        themes = response.json().get('results', []) if response.ok else []
+        filters = [theme_filter.strip() for theme_filter in (parser.themes or '').split(',') if theme_filter.strip()]
+        themes = [theme for theme in themes if match_theme(theme, filters)]
+        if not themes:
+            logging.warning(f'[{self.config.env}] No themes to mirror in {self.config.store}')
+            return
+
+        logging.info(
+            f'[{self.config.env}] Mirroring {len(themes)} themes of {self.config.store} into {parser.directory}')
+        ThemeMirror(self.gateway, parser.directory, self.config.env).mirror(themes)
+
+    @parser_config()
+    def export(self, parser):
+        response = self.gateway.get_templates(theme_id=self.config.theme_id)
+        if not response.ok:
+            return
+        templates = response.json()
+
+        logging.info(
+            f'[{self.config.env}] Exporting {len(templates)} files of theme id {self.config.theme_id} '
+            f'into {parser.archive}')
+        written, failed = ThemeExport(self.gateway, parser.archive, self.config.env).export(templates)
+        log = logging.info if not failed else logging.error
+        log(f'[{self.config.env}] Exported {written} files into {parser.archive}, {failed} failed')
+
+    @parser_config()
+    def import_theme(self, parser):
+        try:
+            archive = zipfile.ZipFile(parser.archive)
+        except (OSError, zipfile.BadZipFile) as error:
+            raise TypeError(f'[{self.config.env}] argument archive: {parser.archive} is not a zip archive, {error}')
+
+        with archive:
+            entries = {info.filename: info for info in get_archive_templates(archive)}
+            template_names = sort_by_upload_priority(list(entries))
+
+            def push_entry(template_name):
+                # entries are read straight from the archive, never extracted to disk
+                with archive.open(entries[template_name]) as f:
+                    content = f.read()
+                if template_name.endswith(tuple(MEDIA_FILE_EXTENSIONS)):
+                    return self._push_template(template_name, payload=('', {'file': (template_name, content)}))
+                return self._push_template(template_name, payload=(content, {}))
+
+            logging.info(
+                f'[{self.config.env}] Uploading {len(template_names)} files of {parser.archive} '
+                f'to theme id {self.config.theme_id}')
+            small_files = [name for name in template_names if entries[name].file_size <= LARGE_FILE_SIZE]
+            large_files = [name for name in template_names if entries[name].file_size > LARGE_FILE_SIZE]
+            self._run_concurrently(push_entry, small_files, large_items=large_files)
+
+    def _get_index(self, parser):
+        """Return the index of the remote theme, refreshed from the store when older than INDEX_MAX_AGE."""
+        index = ThemeIndex()
+        refreshed_at = index.get_refreshed_at(self.config.store, self.config.theme_id)
+        if getattr(parser, 'refresh', False) or refreshed_at is None or time.time() - refreshed_at > INDEX_MAX_AGE:
+            try:
+                counts = index.refresh(self.gateway, self.config.theme_id)
+            except RequestException as error:
+                # the index is local, a stale one still answers while the store is unreachable
+                if refreshed_at is None:
+                    index.close()
+                    raise TypeError(
+                        f'[{self.config.env}] Theme id {self.config.theme_id} is not indexed yet and the store '
+                        f'could not be reached, {error}')
+                logging.warning(
+                    f'[{self.config.env}] Index of theme id {self.config.theme_id} could not be refreshed, using the '
+                    f'index of {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(refreshed_at))}, {error}')
+                counts = None
+            if counts and any(counts):
+                logging.debug(
+                    f'[{self.config.env}] Index of theme id {self.config.theme_id} refreshed, '
+                    f'{counts[0]} added, {counts[1]} updated and {counts[2]} removed')
+        return index
+
+    @parser_config()
+    def ls(self, parser):
+        with self._get_index(parser) as index:
+            templates = index.get_templates(self.config.store, self.config.theme_id, parser.filenames)
+        for template_name, size, _, updated_at, _ in templates:
+            logging.info(
+                f'[{self.config.env}] \t{"-" if size is None else size:>10} \t{updated_at or "-"} \t{template_name}')
+        logging.info(f'[{self.config.env}] {len(templates)} files in theme id {self.config.theme_id}')
+
+    @parser_config()
+    def grep(self, parser):
+        try:
+            re.compile(parser.pattern)
+        except re.error as error:
+            raise TypeError(f'[{self.config.env}] argument pattern is not a valid regular expression, {error}')
+
+        with self._get_index(parser) as index:
+            matches = index.grep(
+                self.config.store, self.config.theme_id, parser.pattern, ignore_case=parser.ignore_case,
+                patterns=parser.filenames)
+        for template_name, line_number, line in matches:
+            logging.info(f'[{self.config.env}] {template_name}:{line_number}: {line.strip()}')
+        if not matches:
+            logging.info(f'[{self.config.env}] No match for "{parser.pattern}" in theme id {self.config.theme_id}')
+
+    @parser_config()
+    def diff(self, parser):
+        patterns = parser.filenames or []
+        with self._get_index(parser) as index:
+            remote_templates = {
+                template_name: (size, sha256, file)
+                for template_name, size, sha256, _, file in index.get_templates(
+                    self.config.store, self.config.theme_id, patterns)
+                if is_theme_file(template_name) and not is_ignored(template_name)
+            }
+            local_names = {
+                template_name for template_name in map(get_template_name, self._get_accept_files([]))
+                if not patterns or any(fnmatch.fnmatch(template_name, pattern) for pattern in patterns)
+            }
+
+            differences = []
+            for template_name in sorted(set(remote_templates) | local_names):
+                if template_name not in remote_templates:
+                    differences.append(('local only', template_name))
+                elif template_name not in local_names:
+                    differences.append(('remote only', template_name))
+                else:
+                    size, sha256, file = remote_templates[template_name]
+                    # the listing has no hash of media files, they are compared by size when the store reports it
+                    if file:
+                        modified = size is not None and size != get_file_size(template_name)
+                    else:
+                        modified = sha256 != get_file_hash(template_name)
+                    if modified:
+                        differences.append(('modified', template_name))
+
+            for status, template_name in differences:
+                logging.info(f'[{self.config.env}] \t{status:<11} \t{template_name}')
+                if parser.patch and not template_name.endswith(tuple(MEDIA_FILE_EXTENSIONS)):
+                    remote_content = index.get_content(self.config.store, self.config.theme_id, template_name)
+                    local_content = ''
+                    if template_name in local_names:
+                        with open(template_name, 'rb') as f:
+                            local_content = f.read().decode('utf-8', 'replace')
+                    sys.stdout.writelines(difflib.unified_diff(
+                        (remote_content or '').splitlines(True), local_content.splitlines(True),
+                        f'remote/{template_name}', f'local/{template_name}'))
+
+        if differences:
+            logging.info(f'[{self.config.env}] {len(differences)} files differ from theme id {self.config.theme_id}')
+        else:
+            logging.info(f'[{self.config.env}] No differences with theme id {self.config.theme_id}')
+
+    def daemon(self, parser):
+        logging.info(f'[{self.config.env}] Serving push, pull and sass commands of {os.path.abspath(".")}')
+        logging.info(f'[{self.config.env}] Press Ctrl + C to stop')
+        Daemon().run()
 
     @parser_config()
     def compile_sass(self, parser):
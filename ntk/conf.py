@@ -49,12 +49,62 @@ GLOB_PATTERN = [
     f"{SASS_SOURCE}/**/*.scss",
 ]
 
+# directories of the templates a storefront preview renders, uploaded before anything else
+TEMPLATE_DIRECTORIES = ['layouts', 'partials', 'templates', 'checkout']
+# files larger than this (in bytes) are uploaded on a separate background lane
+LARGE_FILE_SIZE = 1024 * 1024
+# number of pending file changes from which watch switches to a single bulk synchronization
+BURST_THRESHOLD = 50
+# upper bound of the adaptive number of concurrent requests used by bulk operations
+MAX_CONCURRENCY = 16
+# request bodies of text uploads larger than this (in bytes) are gzipped when compression is enabled
+GZIP_MIN_SIZE = 8 * 1024
+
+# size (in bytes) of the chunks media files are sent and received in when the bandwidth is limited
+BANDWIDTH_CHUNK_SIZE = 64 * 1024
+
+# local state of ntk in the theme directory, not part of the theme
+NTK_DIRECTORY = '.ntk'
+# gitignore style patterns of theme files never uploaded, pulled or watched
+IGNORE_FILE_NAME = '.ntkignore'
+# optimized copies of theme files, named by the hash of their original content
+OPTIMIZE_CACHE_DIRECTORY = os.path.join(NTK_DIRECTORY, 'cache', 'optimized')
+# empty files named by the hash of every theme file content found valid, so it is never checked again
+VALIDATE_CACHE_DIRECTORY = os.path.join(NTK_DIRECTORY, 'cache', 'validated')
+# local index of the templates of remote themes, queried by ls, grep and diff
+INDEX_FILE = os.path.join(NTK_DIRECTORY, 'index.sqlite3')
+# changes of watch not confirmed by the store yet, one file per environment
+OFFLINE_QUEUE_DIRECTORY = os.path.join(NTK_DIRECTORY, 'queue')
+# pushed theme states, file contents are stored once by hash and shared by all snapshots
+SNAPSHOT_DIRECTORY = os.path.join(NTK_DIRECTORY, 'snapshots')
+# number of snapshots recorded as changes to their parent before the whole file tree is recorded again
+SNAPSHOT_CHAIN_LENGTH = 20
+# bytes of a media file kept in memory while it is downloaded into an archive, the rest is spooled to disk
+ARCHIVE_SPOOL_SIZE = 1024 * 1024
+# seconds between two checks of whether the store is reachable again while changes are queued
+OFFLINE_RETRY_INTERVAL = 10
+# seconds an index of remote templates is used as is before it is refreshed from the store
+INDEX_MAX_AGE = 60
+# seconds between two polls of the store templates by watch --bidirectional
+REMOTE_POLL_INTERVAL = 30
+
+# local port of the live reload endpoint of watch, the usual live reload port
+LIVE_RELOAD_PORT = 35729
+
+# top level theme directories, the only directories watched for changes
+WATCH_DIRECTORIES = sorted({pattern.split('/')[0] for pattern in GLOB_PATTERN})
+
 
 class Config(object):
     apikey = None
     store = None
     theme_id = None
     sass_output_style = None
+    rate_limit = None
+    gzip = False
+    optimize = False
+    max_bandwidth = None
+    max_file_size = None
 
     env = 'development'
 
@@ -63,6 +113,8 @@ class Config(object):
     theme_id_required = True
 
     def __init__(self, **kwargs):
+        # the environment decides which entry of config.yml is read, the other attributes override it
+        self.env = kwargs.get('env', self.env)
         self.read_config()
         for name, value in kwargs.items():
             setattr(self, name, value)
@@ -79,10 +131,34 @@ class Config(object):
         if getattr(parser, 'store', None):
             self.store = parser.store
 
+        self.apply_options(parser)
+        self.save(write_file)
+
+    def apply_options(self, parser):
+        """Override the options read from config.yml by the ones of the command line, the target theme aside."""
         if getattr(parser, 'sass_output_style', None):
             self.sass_output_style = parser.sass_output_style
 
-        self.save(write_file)
+        if getattr(parser, 'rate_limit', None):
+            self.rate_limit = parser.rate_limit
+
+        if getattr(parser, 'gzip', None):
+            self.gzip = True
+
+        if getattr(parser, 'optimize', None):
+            self.optimize = True
+
+        if getattr(parser, 'max_bandwidth', None):
+            self.max_bandwidth = parser.max_bandwidth
+
+        if getattr(parser, 'max_file_size', None):
+            self.max_file_size = parser.max_file_size
+
+    def get_envs(self, parser):
+        """Return the environments targeted by a command, --env accepts a comma separated list."""
+        if getattr(parser, 'all_envs', False):
+            return list(self.read_config(update=False))
+        return [env.strip() for env in str(parser.env).split(',') if env.strip()]
 
     def validate_config(self):
         error_msgs = []
@@ -97,6 +173,18 @@ class Config(object):
             pluralize = 'is' if len(error_msgs) == 1 else 'are'
             raise TypeError(f'[{self.env}] argument {message} {pluralize} required.')
 
+        if self.rate_limit is not None and (not isinstance(self.rate_limit, (int, float)) or self.rate_limit <= 0):
+            raise TypeError(f'[{self.env}] argument -rl/--rate_limit must be a positive number of requests per second')
+
+        if self.max_bandwidth is not None and (
+                not isinstance(self.max_bandwidth, (int, float)) or self.max_bandwidth <= 0):
+            raise TypeError(
+                f'[{self.env}] argument -bw/--max_bandwidth must be a positive number of kilobytes per second')
+
+        if self.max_file_size is not None and (
+                not isinstance(self.max_file_size, (int, float)) or self.max_file_size <= 0):
+            raise TypeError(f'[{self.env}] argument -mfs/--max_file_size must be a positive number of kilobytes')
+
         if self.sass_output_style and self.sass_output_style not in SASS_OUTPUT_STYLES:
             raise TypeError(
                 f'[{self.env}] argument -sos/--sass_output_style is unsupported '
@@ -116,6 +204,11 @@ class Config(object):
                 self.theme_id = configs[self.env].get('theme_id')
                 if configs[self.env].get('sass'):
                     self.sass_output_style = configs[self.env]['sass'].get('output_style')
+                self.rate_limit = configs[self.env].get('rate_limit')
+                self.gzip = configs[self.env].get('gzip', False)
+                self.optimize = configs[self.env].get('optimize', False)
+                self.max_bandwidth = configs[self.env].get('max_bandwidth')
+                self.max_file_size = configs[self.env].get('max_file_size')
 
         return configs
 
@@ -130,6 +223,16 @@ class Config(object):
                 'output_style': self.sass_output_style or 'nested'  # default sass output style is nested
             }
         }
+        if self.rate_limit:
+            new_config['rate_limit'] = self.rate_limit
+        if self.gzip:
+            new_config['gzip'] = True
+        if self.optimize:
+            new_config['optimize'] = True
+        if self.max_bandwidth:
+            new_config['max_bandwidth'] = self.max_bandwidth
+        if self.max_file_size:
+            new_config['max_file_size'] = self.max_file_size
         # If the config has been changed, then the config will be saved to config.yml.
         if configs.get(self.env) != new_config:
             configs[self.env] = new_config
@@ -0,0 +1,170 @@
+import asyncio
+import codecs
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import socket
+import stat
+import sys
+
+from ntk.utils import get_private_directory
+
+# commands the CLI hands over to a running daemon
+DAEMON_COMMANDS = ['push', 'pull', 'sass']
+
+
+def get_socket_path(directory='.', create=False):
+    """
+    Return the control socket path of the daemon serving a theme directory, in the private directory of the user
+    so no other user can listen in its place and read the commands, API keys included. The private directory is
+    only created, and checked, with create True, by the daemon.
+    """
+    directory_key = hashlib.sha1(os.path.abspath(directory).encode()).hexdigest()[:16]
+    return os.path.join(get_private_directory(create=create), f'ntk-{directory_key}.sock')
+
+
+def is_own_socket(path):
+    """Return whether path is a socket created by the current user."""
+    try:
+        status = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(status.st_mode) and (not hasattr(os, 'getuid') or status.st_uid == os.getuid())
+
+
+def forward_to_daemon(argv, output=None):
+    """
+    Run a command on the daemon of the current directory and stream its output.
+    Return False when there is no daemon to hand the command to, so the CLI runs it itself.
+    """
+    if not argv or argv[0] not in DAEMON_COMMANDS or not hasattr(socket, 'AF_UNIX') or os.environ.get('NTK_NO_DAEMON'):
+        return False
+
+    # a client only looks for the socket, a daemon which is not running leaves no trace
+    socket_path = get_socket_path()
+    if not is_own_socket(socket_path):
+        return False
+
+    output = output or sys.stdout
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return False
+
+    with client:
+        client.sendall(json.dumps({'argv': argv}).encode() + b'\n')
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        try:
+            for chunk in iter(lambda: client.recv(65536), b''):
+                output.write(decoder.decode(chunk))
+                output.flush()
+        except OSError as error:
+            logging.error(f'Connection to ntk daemon lost, {error}')
+    return True
+
+
+class _SocketStream(io.TextIOBase):
+    """Text stream writing to an asyncio stream writer from any thread."""
+
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.loop.call_soon_threadsafe(self.writer.write, text.encode('utf-8'))
+        return len(text)
+
+
+class Daemon:
+    """
+    Long running ntk process serving push, pull and sass commands over a Unix domain socket.
+
+    The gateway stays alive between requests, so every command reuses the imported modules, the open connections
+    to the store and the adaptive concurrency limit it learned. Each request gets its own command and config, the
+    theme and options of a request never leak into the next one.
+    Commands run one at a time, their logs and progress are streamed back to the client.
+    """
+
+    def __init__(self, socket_path=None):
+        from ntk.gateway import Gateway
+
+        self.socket_path = socket_path
+        self.gateway = Gateway(store=None, apikey=None)
+
+    def _create_parser(self):
+        from ntk.command import Command
+        from ntk.conf import Config
+        from ntk.ntk_parser import Parser
+
+        return Parser(command=Command(config=Config(), gateway=self.gateway)).create_parser()
+
+    def _execute(self, argv, stream):
+        from ntk.ntk import execute
+
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s', '%Y-%m-%d %H:%M:%S'))
+        root_logger = logging.getLogger()
+        root_logger.addHandler(handler)
+        try:
+            with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+                execute(self._create_parser(), argv)
+        except SystemExit:
+            # argparse exits on --help and invalid arguments
+            pass
+        finally:
+            root_logger.removeHandler(handler)
+
+    async def _handle(self, reader, writer):
+        loop = asyncio.get_event_loop()
+        try:
+            request = json.loads(await reader.readline() or '{}')
+            argv = request.get('argv') or []
+            if argv and argv[0] in DAEMON_COMMANDS:
+                logging.info(f'Running ntk {argv[0]}')
+                async with self._lock:
+                    await loop.run_in_executor(None, self._execute, argv, _SocketStream(loop, writer))
+            else:
+                writer.write(f'Supported daemon commands: {", ".join(DAEMON_COMMANDS)}\n'.encode())
+            await writer.drain()
+        except (ValueError, ConnectionError) as error:
+            logging.error(f'Invalid daemon request, {error}')
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if not self.socket_path:
+            try:
+                self.socket_path = get_socket_path(create=True)
+            except OSError as error:
+                raise TypeError(f'ntk daemon can not start, {error}')
+
+        if os.path.exists(self.socket_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                try:
+                    client.connect(self.socket_path)
+                    raise TypeError(f'ntk daemon is already running on {self.socket_path}')
+                except OSError:
+                    # socket left behind by a daemon which did not stop cleanly
+                    os.unlink(self.socket_path)
+
+        self._lock = asyncio.Lock()
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        logging.info(f'ntk daemon listening on {self.socket_path}')
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        finally:
+            if self.socket_path and os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
@@ -1,12 +1,7 @@
+import asyncio
 import functools
 import logging
 
-logging.basicConfig(
-    format='%(asctime)s %(levelname)s %(message)s',
-    level=logging.INFO,
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-
 
 def parser_config(*args, **kwargs):
     """Decorator for parser config values from command arguments."""
@@ -20,6 +15,9 @@ def parser_config(*args, **kwargs):
             self.config.parser_config(parser, write_file=kwargs.get('write_file', False))
             self.gateway.store = self.config.store
             self.gateway.apikey = self.config.apikey
+            self.gateway.rate_limit = self.config.rate_limit
+            self.gateway.gzip = self.config.gzip
+            self.gateway.max_bandwidth = self.config.max_bandwidth
 
             func(self, parser, **func_kwargs)
 
@@ -29,34 +27,48 @@ def parser_config(*args, **kwargs):
 
 
 def check_error(error_format='{error_default} -> {error_msg}', response_json=True, **kwargs):
-    """Decorator for check response error from request API"""
+    """Decorator for check response error from request API, supports both sync and async gateway methods"""
+
+    def _check_response(self, func, response, func_kwargs):
+        error_default = f'{func.__name__.capitalize().replace("_", " ")} of {self.store} failed.'
+        error_msg = ""
+        if response.status_code == 304:
+            # not modified since the ETag sent with the request
+            return response
+        elif response.ok and not response_json:
+            return response
+        elif response.ok and response.headers.get('content-type') == 'application/json':
+            return response
+        elif response.headers.get('content-type') == 'application/json':
+            result = response.json()
+            error_msg = " -> "
+            for key, value in result.items():
+                if isinstance(value, list):
+                    error_msg += f'"{key}" : {" ".join(value)}'
+                else:
+                    error_msg += value
+
+        error_log = error_format.format(
+            **vars(self), **func_kwargs, error_default=error_default, error_msg=error_msg
+        )
+
+        logging.info(f'{error_log}')
+
+        return response
 
     def _decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def _async_wrapper(self, *func_args, **func_kwargs):
+                response = await func(self, *func_args, **func_kwargs)
+                return _check_response(self, func, response, func_kwargs)
+
+            return _async_wrapper
+
         @functools.wraps(func)
         def _wrapper(self, *func_args, **func_kwargs):
             response = func(self, *func_args, **func_kwargs)
-            error_default = f'{func.__name__.capitalize().replace("_", " ")} of {self.store} failed.'
-            error_msg = ""
-            if response.ok and not response_json:
-                return response
-            elif response.ok and response.headers.get('content-type') == 'application/json':
-                return response
-            elif response.headers.get('content-type') == 'application/json':
-                result = response.json()
-                error_msg = " -> "
-                for key, value in result.items():
-                    if isinstance(value, list):
-                        error_msg += f'"{key}" : {" ".join(value)}'
-                    else:
-                        error_msg += value
-
-            error_log = error_format.format(
-                **vars(self), **func_kwargs, error_default=error_default, error_msg=error_msg
-            )
-
-            logging.info(f'{error_log}')
-
-            return response
+            return _check_response(self, func, response, func_kwargs)
 
         return _wrapper
 
@@ -1,24 +1,132 @@
+import gzip
+import logging
+import threading
+import time
+
 import requests
 from urllib.parse import urljoin
 
+from ntk.conf import BANDWIDTH_CHUNK_SIZE, GZIP_MIN_SIZE, MAX_CONCURRENCY
 from ntk.decorator import check_error
+from ntk.limiter import get_bandwidth_limiter, get_limiter, get_shared_limiter
+
+# whether a store accepts gzip request bodies, detected on the first compressed upload and kept for the process
+_gzip_support = {}
+_gzip_support_lock = threading.Lock()
 
 
 class Gateway:
-    def __init__(self, store, apikey):
+    def __init__(self, store, apikey, rate_limit=None, gzip=False, max_bandwidth=None):
         self.store = store
         self.apikey = apikey
-
-    def _request(self, request_type, url, apikey=None, payload={}, files={}):
-        headers = {}
+        # one session for every request, so connections to the store are kept alive and reused
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=MAX_CONCURRENCY)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # requests per second shared by every ntk process of the machine talking to the store
+        self.rate_limit = rate_limit
+        # compress large text uploads when the store accepts it
+        self.gzip = gzip
+        # kilobytes per second of media uploads and downloads, in each direction, shared by every worker
+        self.max_bandwidth = max_bandwidth
+
+    @property
+    def limiter(self):
+        return get_limiter(self.store)
+
+    def _get_bandwidth_limiter(self, direction):
+        return get_bandwidth_limiter(self.max_bandwidth * 1024 if self.max_bandwidth else None, direction)
+
+    def iter_content(self, response, chunk_size=BANDWIDTH_CHUNK_SIZE):
+        """Yield the body of a streamed response by chunks, no faster than the bandwidth limit when set."""
+        limiter = self._get_bandwidth_limiter('download')
+        for chunk in response.iter_content(chunk_size):
+            if limiter:
+                limiter.consume(len(chunk))
+            yield chunk
+
+    def _iter_body(self, body, limiter):
+        for start in range(0, len(body), BANDWIDTH_CHUNK_SIZE):
+            chunk = body[start:start + BANDWIDTH_CHUNK_SIZE]
+            limiter.consume(len(chunk))
+            yield chunk
+
+    def _request(self, request_type, url, apikey=None, payload={}, files={}, headers=None, stream=False):
+        headers = dict(headers or {})
         if apikey:
-            headers = {'Authorization': f'Bearer {apikey}'}
+            headers['Authorization'] = f'Bearer {apikey}'
+
+        shared_limiter = get_shared_limiter(self.store, self.rate_limit) if apikey else None
+        # media files are downloaded without the store API key, only they are held to the bandwidth limit
+        download_limited = bool(self.max_bandwidth) and request_type == 'GET' and not apikey
+        with self.limiter:
+            if shared_limiter:
+                shared_limiter.acquire()
+            started = time.monotonic()
+            response = self._send(request_type, url, headers, payload, files, stream or download_limited)
+            if download_limited and not stream:
+                response._content = b''.join(self.iter_content(response))
+            # only store API calls without an uploaded media file tell how healthy the store is through their
+            # latency, text contents are sent as form fields
+            latency = time.monotonic() - started if apikey and (not files or self._is_compressible(files)) else None
+            overloaded = response.status_code == 429 or response.status_code in range(500, 600)
+            self.limiter.record(latency, overloaded=overloaded)
 
-        response = requests.request(request_type, url, headers=headers, data=payload, files=files)
         if response.status_code == 429 and "throttled" in response.content.decode():
-            return self._request(request_type, url, apikey, payload, files)
+            return self._request(request_type, url, apikey, payload, files, headers, stream)
         return response
 
+    def _is_compressible(self, files):
+        # only form fields are compressed, uploaded media files are mostly compressed already
+        return bool(files) and all(isinstance(value, tuple) and value[0] is None for value in files.values())
+
+    def _send(self, request_type, url, headers, payload, files, stream=False):
+        upload_limiter = self._get_bandwidth_limiter('upload')
+        if upload_limiter and files and not self._is_compressible(files):
+            return self._send_limited(request_type, url, headers, payload, files, upload_limiter)
+        if self.gzip and _gzip_support.get(self.store) is not False and self._is_compressible(files):
+            request = requests.Request(request_type, url, headers=headers, data=payload, files=files)
+            prepared = self.session.prepare_request(request)
+            if len(prepared.body) >= GZIP_MIN_SIZE:
+                return self._send_gzip(prepared)
+        if stream:
+            # the body is read by the caller, chunk by chunk
+            return self.session.request(request_type, url, headers=headers, data=payload, files=files, stream=True)
+        return self.session.request(request_type, url, headers=headers, data=payload, files=files)
+
+    def _send_limited(self, request_type, url, headers, payload, files, limiter):
+        # the body of a media upload is sent by chunks, with its Content-Length kept
+        prepared = self.session.prepare_request(
+            requests.Request(request_type, url, headers=headers, data=payload, files=files))
+        settings = self.session.merge_environment_settings(prepared.url, {}, None, None, None)
+        prepared.body = self._iter_body(prepared.body, limiter)
+        return self.session.send(prepared, **settings)
+
+    def _send_gzip(self, prepared):
+        settings = self.session.merge_environment_settings(prepared.url, {}, None, None, None)
+        body = prepared.body
+        prepared.body = gzip.compress(body, compresslevel=6)
+        prepared.headers['Content-Encoding'] = 'gzip'
+        prepared.headers['Content-Length'] = str(len(prepared.body))
+        response = self.session.send(prepared, **settings)
+        if self.store in _gzip_support or response.status_code not in (400, 415):
+            if response.ok:
+                with _gzip_support_lock:
+                    _gzip_support.setdefault(self.store, True)
+            return response
+
+        # the store may not understand compressed bodies, send the same request again as is
+        prepared.body = body
+        del prepared.headers['Content-Encoding']
+        prepared.headers['Content-Length'] = str(len(body))
+        response_plain = self.session.send(prepared, **settings)
+        if response.status_code == 415 or response_plain.ok:
+            with _gzip_support_lock:
+                _gzip_support[self.store] = False
+            logging.info(f'{self.store} does not accept gzip request bodies, uploading uncompressed.')
+        return response_plain
+
     @check_error(error_format='Missing Themes in {store}')
     def get_themes(self):
         api_path = '/api/admin/themes/'
@@ -43,21 +151,30 @@ class Gateway:
         return self._request("GET", url, apikey=self.apikey)
 
     @check_error(error_format='Downloading templates files from theme id #{theme_id} failed.{error_msg}')
-    def get_templates(self, theme_id):
+    def get_templates(self, theme_id, etag=None):
         api_path = f"/api/admin/themes/{theme_id}/templates/"
         url = urljoin(self.store, api_path)
 
-        return self._request("GET", url, apikey=self.apikey)
+        # with the ETag of a previous listing, an unchanged listing is answered with an empty 304 response
+        headers = {'If-None-Match': etag} if etag else None
+        return self._request("GET", url, apikey=self.apikey, headers=headers)
 
     @check_error(error_format='Uploading {template_name} file to theme id #{theme_id} failed.{error_msg}')
     def create_or_update_template(self, theme_id, template_name, content=None, files=None):
         api_path = f"/api/admin/themes/{theme_id}/templates/"
         url = urljoin(self.store, api_path)
 
-        payload = dict(
-            name=template_name,
-            content=content
-        )
+        if files:
+            payload = dict(
+                name=template_name,
+                content=content
+            )
+        else:
+            # text content is sent as raw bytes in a multipart part, URL encoding would inflate it up to 3 times
+            payload = dict(name=template_name)
+            if isinstance(content, str):
+                content = content.encode('utf-8')
+            files = {'content': (None, content or b'', 'text/plain; charset=utf-8')}
 
         return self._request("POST", url, apikey=self.apikey, payload=payload, files=files)
 
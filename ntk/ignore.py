@@ -0,0 +1,137 @@
+import os
+import re
+
+from ntk.conf import IGNORE_FILE_NAME
+from ntk.utils import get_template_name
+
+
+def _pattern_to_regex(pattern):
+    """Translate one gitignore pattern, without its "!" and trailing "/", into a regular expression string."""
+    # a pattern with a slash at its beginning or middle is relative to the theme root, otherwise matches at any level
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    regex = '' if anchored else '(?:.*/)?'
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith('**/', index):
+            regex += '(?:.*/)?'
+            index += 3
+        elif pattern.startswith('**', index):
+            regex += '.*'
+            index += 2
+        elif pattern[index] == '*':
+            regex += '[^/]*'
+            index += 1
+        elif pattern[index] == '?':
+            regex += '[^/]'
+            index += 1
+        elif pattern[index] == '[' and ']' in pattern[index + 2:]:
+            end = pattern.index(']', index + 2)
+            characters = pattern[index + 1:end].replace('\\', '\\\\')
+            if characters.startswith('!'):
+                characters = '^' + characters[1:]
+            regex += f'[{characters}]'
+            index = end + 1
+        elif pattern[index] == '\\' and index + 1 < len(pattern):
+            regex += re.escape(pattern[index + 1])
+            index += 2
+        else:
+            regex += re.escape(pattern[index])
+            index += 1
+    return regex
+
+
+class IgnoreMatcher:
+    """
+    Match theme paths against gitignore style patterns, compiled once into a single regular expression.
+    The patterns are tried from the last one, so like in gitignore the last matching pattern decides and a "!"
+    pattern includes again what an earlier one ignored. Ignoring a directory ignores everything below it, except
+    what a later "!" pattern includes again.
+    """
+
+    def __init__(self, patterns=()):
+        self.patterns = []
+        alternatives = []
+        for line in patterns:
+            pattern = line.rstrip('\n')
+            if not pattern.endswith('\\ '):
+                pattern = pattern.rstrip(' ')
+            if not pattern or pattern.startswith('#'):
+                continue
+            negated = pattern.startswith('!')
+            pattern = pattern[1:] if negated else pattern
+            directory_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            if not pattern:
+                continue
+            if pattern.startswith('\\'):
+                pattern = pattern[1:]
+            regex = _pattern_to_regex(pattern)
+            # directories are matched with a trailing slash, so a directory pattern never matches a file
+            regex += '/.*' if directory_only else '(?:/.*)?'
+            self.patterns.append((pattern, negated))
+            alternatives.append(f'({regex})')
+
+        self._negated = [negated for _, negated in reversed(self.patterns)]
+        # literal start of the paths every pattern matches, None when it matches at any level
+        self._prefixes = [
+            re.split(r'[*?\[\\]', pattern.lstrip('/'))[0] if '/' in pattern else None
+            for pattern, _ in reversed(self.patterns)
+        ]
+        self._regex = re.compile('(?:' + '|'.join(reversed(alternatives)) + r')\Z') if alternatives else None
+
+    def __bool__(self):
+        return self._regex is not None
+
+    def is_ignored(self, pathfile, is_dir=False):
+        if self._regex is None:
+            return False
+        template_name = get_template_name(pathfile)
+        match = self._regex.match(f'{template_name}/' if is_dir else template_name)
+        return bool(match) and not self._negated[match.lastindex - 1]
+
+    def should_prune(self, pathfile):
+        """
+        Return whether a directory can be skipped without walking it: it is ignored and no later "!" pattern may
+        include again anything below it.
+        """
+        if self._regex is None:
+            return False
+        directory = get_template_name(pathfile) + '/'
+        match = self._regex.match(directory)
+        if not match or self._negated[match.lastindex - 1]:
+            return False
+        # the patterns after the one which ignored the directory
+        later = zip(self._negated[:match.lastindex - 1], self._prefixes[:match.lastindex - 1])
+        return not any(
+            negated and (prefix is None or prefix.startswith(directory) or directory.startswith(prefix))
+            for negated, prefix in later
+        )
+
+
+_matchers = {}
+
+
+def get_ignore_matcher(root_path='.'):
+    """Return the matcher of the .ntkignore file of root_path, compiled again only when the file changes."""
+    ignore_file = os.path.abspath(os.path.join(root_path, IGNORE_FILE_NAME))
+    try:
+        mtime = os.stat(ignore_file).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    cached = _matchers.get(ignore_file)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    patterns = []
+    if mtime is not None:
+        with open(ignore_file, encoding='utf-8') as f:
+            patterns = f.readlines()
+    matcher = IgnoreMatcher(patterns)
+    _matchers[ignore_file] = (mtime, matcher)
+    return matcher
+
+
+def is_ignored(pathfile, is_dir=False):
+    return get_ignore_matcher().is_ignored(pathfile, is_dir=is_dir)
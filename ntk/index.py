@@ -0,0 +1,181 @@
+import fnmatch
+import os
+import re
+import sqlite3
+import time
+
+from ntk.conf import INDEX_FILE
+from ntk.utils import get_content_hash
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS themes (
+    store TEXT NOT NULL,
+    theme_id INTEGER NOT NULL,
+    etag TEXT,
+    refreshed_at REAL,
+    PRIMARY KEY (store, theme_id)
+);
+CREATE TABLE IF NOT EXISTS templates (
+    id INTEGER PRIMARY KEY,
+    store TEXT NOT NULL,
+    theme_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER,
+    sha256 TEXT,
+    updated_at TEXT,
+    file TEXT,
+    content TEXT,
+    UNIQUE (store, theme_id, name)
+);
+'''
+
+# trigram tokens let the full-text index answer any substring of 3 characters or more, not only whole words
+FTS_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS templates_fts USING fts5(
+    content, content='templates', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS templates_fts_insert AFTER INSERT ON templates BEGIN
+    INSERT INTO templates_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS templates_fts_delete AFTER DELETE ON templates BEGIN
+    INSERT INTO templates_fts (templates_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS templates_fts_update AFTER UPDATE ON templates BEGIN
+    INSERT INTO templates_fts (templates_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO templates_fts (rowid, content) VALUES (new.id, new.content);
+END;
+'''
+
+REGEX_SPECIAL_CHARACTERS = set('.^$*+?{}[]\\|()')
+
+
+def _get_row(template):
+    """Return the (size, sha256, updated_at, file, content) of a template of the listing."""
+    if template.get('file'):
+        return template.get('size'), None, template.get('updated_at'), template['file'], None
+    content = template.get('content') or ''
+    encoded = content.encode('utf-8')
+    return len(encoded), get_content_hash(encoded), template.get('updated_at'), None, content
+
+
+class ThemeIndex:
+    """
+    Local SQLite index of the templates of remote themes, by store and theme id.
+
+    The index keeps the name, size, sha256 and update time of every template, and the content of text templates.
+    A refresh sends the ETag of the previous listing, so an unchanged theme costs one empty response, and only the
+    templates which changed since are written. With SQLite FTS5 support, text contents are also indexed by
+    trigrams so literal searches only scan the templates containing the searched text.
+    """
+
+    def __init__(self, path=INDEX_FILE):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        try:
+            self.connection.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:  # pragma: no cover
+            # SQLite built without FTS5 or older than 3.34, searches scan every text template instead
+            self.fts = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get_refreshed_at(self, store, theme_id):
+        row = self.connection.execute(
+            'SELECT refreshed_at FROM themes WHERE store = ? AND theme_id = ?', (store, theme_id)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, gateway, theme_id):
+        """
+        Bring the index of a theme up to date with the listing of the store, and return the number of templates
+        added, updated and removed, or None when the listing failed.
+        """
+        store = gateway.store
+        row = self.connection.execute(
+            'SELECT etag FROM themes WHERE store = ? AND theme_id = ?', (store, theme_id)).fetchone()
+        response = gateway.get_templates(theme_id=theme_id, etag=row[0] if row else None)
+        if response.status_code == 304:
+            with self.connection:
+                self.connection.execute(
+                    'UPDATE themes SET refreshed_at = ? WHERE store = ? AND theme_id = ?',
+                    (time.time(), store, theme_id))
+            return 0, 0, 0
+        if not response.ok:
+            return None
+
+        indexed = {
+            name: (size, sha256, updated_at, file)
+            for name, size, sha256, updated_at, file in self.connection.execute(
+                'SELECT name, size, sha256, updated_at, file FROM templates WHERE store = ? AND theme_id = ?',
+                (store, theme_id))
+        }
+        added, updated = 0, 0
+        names = set()
+        with self.connection:
+            for template in response.json():
+                name = str(template['name'])
+                names.add(name)
+                size, sha256, updated_at, file, content = _get_row(template)
+                if indexed.get(name) == (size, sha256, updated_at, file):
+                    continue
+                added += name not in indexed
+                updated += name in indexed
+                self.connection.execute(
+                    'INSERT INTO templates (store, theme_id, name, size, sha256, updated_at, file, content) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (store, theme_id, name) DO UPDATE SET '
+                    'size = excluded.size, sha256 = excluded.sha256, updated_at = excluded.updated_at, '
+                    'file = excluded.file, content = excluded.content',
+                    (store, theme_id, name, size, sha256, updated_at, file, content))
+
+            removed = set(indexed) - names
+            self.connection.executemany(
+                'DELETE FROM templates WHERE store = ? AND theme_id = ? AND name = ?',
+                [(store, theme_id, name) for name in removed])
+            self.connection.execute(
+                'INSERT OR REPLACE INTO themes (store, theme_id, etag, refreshed_at) VALUES (?, ?, ?, ?)',
+                (store, theme_id, response.headers.get('ETag'), time.time()))
+        return added, updated, len(removed)
+
+    def get_templates(self, store, theme_id, patterns=()):
+        """Return the (name, size, sha256, updated_at, file) of the indexed templates matching the name patterns."""
+        rows = self.connection.execute(
+            'SELECT name, size, sha256, updated_at, file FROM templates WHERE store = ? AND theme_id = ? '
+            'ORDER BY name', (store, theme_id)).fetchall()
+        if patterns:
+            rows = [row for row in rows if any(fnmatch.fnmatch(row[0], pattern) for pattern in patterns)]
+        return rows
+
+    def get_content(self, store, theme_id, name):
+        row = self.connection.execute(
+            'SELECT content FROM templates WHERE store = ? AND theme_id = ? AND name = ?',
+            (store, theme_id, name)).fetchone()
+        return row[0] if row else None
+
+    def grep(self, store, theme_id, pattern, ignore_case=False, patterns=()):
+        """Return the (name, line number, line) of every line of the text templates matching a regular expression."""
+        regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+        query = 'SELECT name, content FROM templates WHERE store = ? AND theme_id = ? AND content IS NOT NULL'
+        arguments = [store, theme_id]
+        # a literal of 3 characters or more is looked up in the trigram index first, it is case insensitive so
+        # the templates it returns are a superset of the matching ones
+        if self.fts and len(pattern) >= 3 and not REGEX_SPECIAL_CHARACTERS & set(pattern):
+            query += ' AND id IN (SELECT rowid FROM templates_fts WHERE templates_fts MATCH ?)'
+            arguments.append('"{}"'.format(pattern.replace('"', '""')))
+
+        matches = []
+        for name, content in self.connection.execute(query + ' ORDER BY name', arguments):
+            if patterns and not any(fnmatch.fnmatch(name, name_pattern) for name_pattern in patterns):
+                continue
+            for line_number, line in enumerate(content.splitlines(), 1):
+                if regex.search(line):
+                    matches.append((name, line_number, line))
+        return matches
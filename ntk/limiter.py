@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from ntk.conf import MAX_CONCURRENCY
+from ntk.utils import get_private_directory
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+class AdaptiveLimiter:
+    """
+    Adaptive concurrency limit using additive increase / multiplicative decrease (AIMD).
+
+    The limit grows by one for every `limit` healthy responses, and is halved on a 429 or 5xx response, or when
+    the latency rises above `latency_tolerance` times the healthy baseline. Decreases are applied at most once per
+    baseline latency, so a whole window of in flight requests failing together only backs off once.
+    """
+
+    def __init__(self, initial=2, minimum=1, maximum=MAX_CONCURRENCY, latency_tolerance=3.0, decrease_factor=0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.baseline_latency = None
+        self.last_decrease = 0
+        self.started = time.monotonic()
+        self.history = [(0.0, int(self.limit))]
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def record(self, latency=None, overloaded=False):
+        """
+        Adjust the limit from a response, `overloaded` is True for 429 and 5xx responses.
+        Latency is None for requests which duration says nothing about the store health, such as media uploads.
+        """
+        with self._condition:
+            baseline = self.baseline_latency
+            slow = bool(latency and baseline and latency > baseline * self.latency_tolerance)
+            if latency:
+                # slow responses also move the baseline, so a lasting change of latency is eventually accepted
+                self.baseline_latency = latency if baseline is None else baseline * 0.9 + latency * 0.1
+
+            if overloaded or slow:
+                now = time.monotonic()
+                if now - self.last_decrease >= (baseline or 0):
+                    self.last_decrease = now
+                    self._set_limit(self.limit * self.decrease_factor)
+            else:
+                self._set_limit(self.limit + 1 / self.limit)
+
+    def _set_limit(self, limit):
+        previous = int(self.limit)
+        self.limit = min(max(limit, self.minimum), self.maximum)
+        if int(self.limit) != previous:
+            self.history.append((round(time.monotonic() - self.started, 2), int(self.limit)))
+            self._condition.notify_all()
+
+    def summary(self):
+        limits = [limit for _, limit in self.history]
+        return (f'concurrency limit {limits[0]} -> {limits[-1]} (min {min(limits)}, max {max(limits)}, '
+                f'{len(limits) - 1} adjustments)')
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(store):
+    """Return the adaptive limiter of a store, shared by every gateway of the process talking to that store."""
+    with _limiters_lock:
+        if store not in _limiters:
+            _limiters[store] = AdaptiveLimiter()
+        return _limiters[store]
+
+
+class SharedRateLimiter:
+    """
+    Request rate budget of a store shared by every ntk process of the machine through a lock file.
+
+    Each process active in the last `active_window` seconds gets an equal share of `rate` requests per second,
+    so parallel CI jobs divide the store rate limit fairly instead of all falling into 429 retries. Without
+    file locking support (Windows) the budget is only enforced inside the current process.
+    """
+
+    active_window = 2.0
+
+    def __init__(self, store, rate, state_dir=None):
+        self.rate = float(rate)
+        store_key = hashlib.sha1(str(store).encode()).hexdigest()[:16]
+        # the budget is shared through the private directory of the user, other users can not tamper with it
+        try:
+            state_dir = state_dir or get_private_directory()
+        except OSError as error:
+            raise TypeError(f'argument -rl/--rate_limit can not be shared with other ntk processes, {error}')
+        self.state_file = os.path.join(state_dir, f'ntk-rate-{store_key}.json')
+        self.pid = str(os.getpid())
+        self._lock = threading.Lock()
+
+    def _read_state(self, state_file):
+        state_file.seek(0)
+        try:
+            return json.loads(state_file.read() or '{}')
+        except ValueError:
+            return {}
+
+    def _write_state(self, state_file, state):
+        state_file.seek(0)
+        state_file.truncate()
+        state_file.write(json.dumps(state))
+        state_file.flush()
+
+    def acquire(self):
+        """Wait for the next request slot of this process."""
+        with self._lock, open(self.state_file, 'a+') as state_file:
+            if fcntl:
+                fcntl.flock(state_file, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                state = self._read_state(state_file)
+                processes = {
+                    pid: process for pid, process in state.get('processes', {}).items()
+                    if now - process['seen'] < self.active_window
+                }
+                process = processes.setdefault(self.pid, {'next': now})
+                slot = max(now, process['next'])
+                process['next'] = slot + len(processes) / self.rate
+                process['seen'] = now
+                self._write_state(state_file, {'processes': processes})
+            finally:
+                if fcntl:
+                    fcntl.flock(state_file, fcntl.LOCK_UN)
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_shared_limiters = {}
+
+
+def get_shared_limiter(store, rate):
+    """Return the cross process rate limiter of a store, or None when no shared rate budget is configured."""
+    if not rate:
+        return None
+    with _limiters_lock:
+        if (store, rate) not in _shared_limiters:
+            _shared_limiters[(store, rate)] = SharedRateLimiter(store, rate)
+        return _shared_limiters[(store, rate)]
+
+
+class BandwidthLimiter:
+    """
+    Token bucket of bytes per second shared by every worker thread moving data in one direction.
+
+    Callers take tokens for each chunk before sending it or after receiving it, and sleep for the time the bucket
+    needs to refill when it is in debt. The bucket holds at most one second worth of bytes, so an idle period never
+    turns into a long burst.
+    """
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size):
+        """Take size bytes from the bucket, waiting until the bucket covers them."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # tokens are reserved before waiting, so concurrent callers queue up behind each other
+            self.tokens -= size
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+
+_bandwidth_limiters = {}
+
+
+def get_bandwidth_limiter(rate, direction):
+    """
+    Return the bandwidth limiter of the process for a direction, "upload" or "download", or None when no bandwidth
+    limit is configured. rate is in bytes per second.
+    """
+    if not rate:
+        return None
+    with _limiters_lock:
+        if (rate, direction) not in _bandwidth_limiters:
+            _bandwidth_limiters[(rate, direction)] = BandwidthLimiter(rate)
+        return _bandwidth_limiters[(rate, direction)]
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+
+from ntk.conf import LIVE_RELOAD_PORT
+
+LIVE_RELOAD_SCRIPT = '''(function () {
+    var source = new EventSource('http://%(host)s:%(port)d/events');
+    source.addEventListener('reload', function () {
+        window.location.reload();
+    });
+})();
+'''
+
+
+class LiveReloadServer:
+    """
+    Local Server-Sent Events endpoint telling the preview tabs to reload once watch uploads are confirmed.
+
+    A tab subscribes by loading /livereload.js, which opens an EventSource on /events. Every confirmed batch of
+    changes is sent as one "reload" event, with the changed template names as JSON data. Server-Sent Events only
+    need plain HTTP on the asyncio loop of watch, and browsers reconnect by themselves when watch restarts.
+    """
+
+    keepalive_interval = 15
+
+    def __init__(self, host='127.0.0.1', port=LIVE_RELOAD_PORT):
+        self.host = host
+        self.port = port
+        self.clients = set()
+        self.server = None
+        self.keepalive_task = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port 0 listens on a free port chosen by the system
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.keepalive_task = asyncio.ensure_future(self._keepalive())
+
+    async def close(self):
+        if self.keepalive_task:
+            self.keepalive_task.cancel()
+        for writer in list(self.clients):
+            writer.close()
+        self.clients.clear()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def _write_response(self, writer, status, content_type, body=b''):
+        writer.write(
+            f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n'
+            f'Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n'.encode('ascii') + body)
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            # the headers are not used, they are only read up to the blank line
+            while (await reader.readline()).strip():
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+        parts = request_line.decode('latin-1').split()
+        path = parts[1].split('?')[0] if len(parts) > 1 else ''
+
+        if path == '/events':
+            writer.write(
+                b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                b'Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\nretry: 1000\n\n')
+            self.clients.add(writer)
+            logging.debug(f'Live reload client connected, {len(self.clients)} connected')
+            try:
+                # the connection stays open until the tab goes away
+                await reader.read()
+            except ConnectionError:
+                pass
+            finally:
+                self.clients.discard(writer)
+                writer.close()
+            return
+
+        if path == '/livereload.js':
+            script = LIVE_RELOAD_SCRIPT % {'host': self.host, 'port': self.port}
+            self._write_response(writer, '200 OK', 'application/javascript', script.encode('utf-8'))
+        else:
+            self._write_response(writer, '404 Not Found', 'text/plain', b'Not found')
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    def _send(self, message):
+        for writer in list(self.clients):
+            if writer.is_closing():
+                self.clients.discard(writer)
+                continue
+            writer.write(message)
+
+    async def _keepalive(self):
+        # a comment line every keepalive_interval seconds, so proxies keep the streams open and gone tabs are noticed
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            self._send(b': keepalive\n\n')
+
+    def notify(self, template_names):
+        """Tell the connected tabs to reload, must be called from the event loop thread."""
+        data = json.dumps({'files': sorted(template_names)})
+        self._send(f'event: reload\ndata: {data}\n\n'.encode('utf-8'))
+        return len(self.clients)
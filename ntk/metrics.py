@@ -0,0 +1,66 @@
+import collections
+import math
+import threading
+
+# stages of the time between a file save and its upload confirmed by the store
+STAGES = (
+    ('detect', 'save to change detected'),
+    ('queue', 'detected to upload started'),
+    ('upload', 'upload started to store acknowledgement'),
+    ('total', 'save to store acknowledgement'),
+)
+
+
+def get_percentile(sorted_samples, percent):
+    """Return the nearest rank percentile of sorted samples."""
+    rank = max(math.ceil(percent / 100 * len(sorted_samples)), 1)
+    return sorted_samples[rank - 1]
+
+
+class LatencyRecorder:
+    """
+    Latency of the uploads of watch, from the file save to the store acknowledgement, split by stage so the slow
+    part of the edit loop shows: noticing the save, waiting for a worker, or the upload itself.
+
+    Only the last max_samples uploads are kept.
+    """
+
+    def __init__(self, max_samples=10000):
+        self.samples = {stage: collections.deque(maxlen=max_samples) for stage, _ in STAGES}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.samples['total'])
+
+    def record(self, saved_at, detected_at, started_at, acknowledged_at):
+        """Record the timestamps of one upload, in seconds since the epoch, and return its total latency."""
+        # a file saved again while its upload was waiting is only late from its last save
+        detected_at = max(detected_at, saved_at)
+        started_at = max(started_at, detected_at)
+        durations = {
+            'detect': detected_at - saved_at,
+            'queue': started_at - detected_at,
+            'upload': acknowledged_at - started_at,
+            'total': acknowledged_at - saved_at,
+        }
+        with self._lock:
+            for stage, duration in durations.items():
+                self.samples[stage].append(max(duration, 0.0))
+        return durations['total']
+
+    def get_percentiles(self, stage, percents=(50, 90, 99)):
+        with self._lock:
+            samples = sorted(self.samples[stage])
+        if not samples:
+            return {}
+        return {percent: get_percentile(samples, percent) for percent in percents}
+
+    def summary(self):
+        """Return one line per stage with its latency percentiles."""
+        lines = []
+        for stage, description in STAGES:
+            percentiles = self.get_percentiles(stage)
+            if percentiles:
+                values = ', '.join(f'p{percent} {value:.2f}s' for percent, value in percentiles.items())
+                lines.append(f'{description}: {values}')
+        return lines
@@ -0,0 +1,157 @@
+import fnmatch
+import json
+import logging
+import os
+import time
+from concurrent.futures import as_completed, ThreadPoolExecutor
+
+from ntk.conf import MAX_CONCURRENCY
+from ntk.utils import get_content_hash
+
+MANIFEST_FILE_NAME = 'manifest.json'
+
+
+def match_theme(theme, filters):
+    """Return True if a theme id or name matches one of the filters, names accept shell wildcards."""
+    if not filters:
+        return True
+    return any(
+        str(theme.get('id')) == theme_filter or fnmatch.fnmatch(str(theme.get('name', '')), theme_filter)
+        for theme_filter in filters
+    )
+
+
+def _get_source(template):
+    # what a template is made of in the listing, an unchanged source means an unchanged file
+    if template.get('file'):
+        return f'{template["file"]}|{template.get("updated_at") or ""}'
+    return get_content_hash((template.get('content') or '').encode('utf-8'))
+
+
+class ThemeMirror:
+    """
+    Back up themes of a store into one directory per theme id, with a manifest of every theme file.
+
+    All themes share the gateway connection pool and rate budget, and one pool of workers: the template listings
+    are fetched concurrently, then the files of every theme are written and downloaded concurrently. Files whose
+    source in the listing did not change since the last mirror, and are still on disk, are not written again.
+    """
+
+    def __init__(self, gateway, directory, env):
+        self.gateway = gateway
+        self.directory = directory
+        self.env = env
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE_NAME)
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'themes': {}}
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = f'{self.manifest_path}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.manifest_path)
+
+    def _get_pathfile(self, theme_id, template_name):
+        theme_directory = os.path.abspath(os.path.join(self.directory, str(theme_id)))
+        pathfile = os.path.abspath(os.path.join(theme_directory, template_name))
+        # a template name never gets to write outside of its theme directory
+        if not pathfile.startswith(theme_directory + os.sep):
+            return None
+        return pathfile
+
+    def _mirror_template(self, theme_id, template, previous_entry):
+        """Write a template into its theme directory unless unchanged, return its manifest entry and if written."""
+        pathfile = self._get_pathfile(theme_id, str(template['name']))
+        source = _get_source(template)
+        if previous_entry and previous_entry.get('source') == source and pathfile and os.path.isfile(pathfile):
+            return previous_entry, False
+
+        if template.get('file'):
+            response = self.gateway._request("GET", template['file'])
+            if not response.ok:
+                raise IOError(f'Downloading {template["name"]} failed with status {response.status_code}')
+            content = response.content
+        else:
+            content = (template.get('content') or '').encode('utf-8')
+
+        os.makedirs(os.path.dirname(pathfile), exist_ok=True)
+        with open(pathfile, 'wb') as f:
+            f.write(content)
+        return {'source': source, 'sha256': get_content_hash(content), 'size': len(content)}, True
+
+    def _remove_stale_files(self, theme_id, previous_files, files):
+        for template_name in set(previous_files) - set(files):
+            pathfile = self._get_pathfile(theme_id, template_name)
+            if pathfile and os.path.isfile(pathfile):
+                os.remove(pathfile)
+
+    def mirror(self, themes):
+        """Mirror the given themes and return the manifest."""
+        manifest = self._read_manifest()
+        previous_themes = manifest.get('themes', {})
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix='ntk-mirror') as executor:
+            listings = {
+                executor.submit(self.gateway.get_templates, theme_id=theme['id']): theme for theme in themes
+            }
+            file_futures = {}
+            for listing in as_completed(listings):
+                theme = listings[listing]
+                theme_key = str(theme['id'])
+                try:
+                    response = listing.result()
+                except Exception as error:
+                    logging.error(f'[{self.env}] Theme id {theme_key}: {error}')
+                    continue
+                if not response.ok:
+                    logging.error(f'[{self.env}] Mirroring theme id {theme_key} "{theme.get("name")}" failed')
+                    continue
+                previous_files = previous_themes.get(theme_key, {}).get('files', {})
+                templates = [
+                    template for template in response.json()
+                    if self._get_pathfile(theme_key, str(template['name']))
+                ]
+                file_futures[theme_key] = (theme, previous_files, [
+                    (str(template['name']), executor.submit(
+                        self._mirror_template, theme_key, template, previous_files.get(str(template['name']))))
+                    for template in templates
+                ])
+
+            for theme_key, (theme, previous_files, futures) in file_futures.items():
+                files, written, unchanged, failed = {}, 0, 0, 0
+                for template_name, future in futures:
+                    try:
+                        files[template_name], is_written = future.result()
+                        written += is_written
+                        unchanged += not is_written
+                    except Exception as error:
+                        failed += 1
+                        logging.error(f'[{self.env}] Theme id {theme_key} {template_name}: {error}')
+                        if template_name in previous_files:
+                            files[template_name] = previous_files[template_name]
+                self._remove_stale_files(theme_key, previous_files, files)
+                previous_themes[theme_key] = {
+                    'id': theme['id'],
+                    'name': theme.get('name'),
+                    'active': bool(theme.get('active')),
+                    'mirrored_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                    'complete': not failed,
+                    'files': files,
+                }
+                log = logging.info if not failed else logging.error
+                log(f'[{self.env}] Mirrored theme id {theme_key} "{theme.get("name")}": {len(files)} files, '
+                    f'{written} updated, {unchanged} unchanged, {failed} failed')
+
+        manifest['themes'] = previous_themes
+        self._write_manifest(manifest)
+        logging.info(
+            f'[{self.env}] Mirrored {len(file_futures)} of {len(themes)} themes into {self.directory} '
+            f'in {time.monotonic() - started:.1f}s')
+        return manifest
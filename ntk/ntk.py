@@ -1,9 +1,8 @@
 #!/usr/bin/env python
 import logging
+import sys
 
-from requests.exceptions import HTTPError
-
-from ntk.ntk_parser import Parser
+from ntk.daemon import forward_to_daemon
 
 logging.basicConfig(
     format='%(asctime)s %(levelname)s %(message)s',
@@ -12,9 +11,10 @@ logging.basicConfig(
 )
 
 
-def main():
-    parser = Parser().create_parser()
-    args = parser.parse_args()
+def execute(parser, argv=None):
+    from requests.exceptions import HTTPError
+
+    args = parser.parse_args(argv)
     try:
         args.func(args)
     except AttributeError:
@@ -27,5 +27,15 @@ def main():
         pass
 
 
+def main():
+    # hand the command to a running daemon before paying for the heavy imports
+    if forward_to_daemon(sys.argv[1:]):
+        return
+
+    from ntk.ntk_parser import Parser
+
+    execute(Parser().create_parser())
+
+
 if __name__ == '__main__':
     main()
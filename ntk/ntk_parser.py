@@ -1,11 +1,12 @@
 import argparse
 
 from ntk.command import Command
+from ntk.conf import LIVE_RELOAD_PORT
 
 
 class Parser:
-    def __init__(self):
-        self.command = Command()
+    def __init__(self, command=None):
+        self.command = command or Command()
 
     def _add_config_arguments(self, parser):
         parser.add_argument('-a', '--apikey', action="store", dest="apikey", help=argparse.SUPPRESS)
@@ -14,6 +15,14 @@ class Parser:
         parser.add_argument('-e', '--env', action="store", dest="env", default='development', help=argparse.SUPPRESS)
         parser.add_argument(
             '-sos', '--sass_output_style', action="store", dest="sass_output_style", help=argparse.SUPPRESS)
+        parser.add_argument(
+            '-rl', '--rate_limit', action="store", type=float, dest="rate_limit", help=argparse.SUPPRESS)
+        parser.add_argument('-gz', '--gzip', action="store_true", dest="gzip", help=argparse.SUPPRESS)
+        parser.add_argument('-op', '--optimize', action="store_true", dest="optimize", help=argparse.SUPPRESS)
+        parser.add_argument(
+            '-bw', '--max_bandwidth', action="store", type=float, dest="max_bandwidth", help=argparse.SUPPRESS)
+        parser.add_argument(
+            '-mfs', '--max_file_size', action="store", type=float, dest="max_file_size", help=argparse.SUPPRESS)
 
     def create_parser(self):
         option_commands = '''
@@ -22,7 +31,12 @@ options:
     -s, --store                  Full domain of the store
     -t, --theme_id               ID of the theme
     -e, --env                    Environment to run the command (default [development])
-    -sos, --sass_output_style    Specify Sass output style: nested, expanded, compact, or compressed'''
+    -sos, --sass_output_style    Specify Sass output style: nested, expanded, compact, or compressed
+    -rl, --rate_limit            Requests per second to the store, shared by all ntk processes on this machine
+    -gz, --gzip                  Compress large text uploads when the store accepts gzip request bodies
+    -op, --optimize              Minify JSON, CSS and JS files and recompress PNG images losslessly before upload
+    -bw, --max_bandwidth         Kilobytes per second of media uploads and downloads, in each direction
+    -mfs, --max_file_size        Kilobytes a theme file may weigh, larger files are refused before any upload'''
 
         # create the top-level parser
         parser = argparse.ArgumentParser(
@@ -38,6 +52,14 @@ available commands:
     push         Push all theme files from your current direcotry to the store
     watch        Watch for changes in your current directory and push updates to the store
     sass         Process Sass files to CSS files in assets directory
+    daemon       Keep ntk running in the background and serve push, pull and sass commands faster
+    mirror       Back up every theme of the store into a directory per theme
+    rollback     Upload a theme state recorded by a previous push, or list the recorded states
+    export       Download a theme into a zip archive
+    import       Upload the theme files of a zip archive
+    ls           List the files of the theme on the store, from the local index
+    grep         Search the files of the theme on the store, from the local index
+    diff         Show the files which differ between the current directory and the theme on the store
 ''' + option_commands,
             usage=argparse.SUPPRESS,
             epilog='Use "ntk [command] --help" for more information about a command.',
@@ -108,10 +130,16 @@ Usage:
             description='''
 Usage:
     ntk push [options] [Filename ...]
-''' + option_commands,
+''' + option_commands + '''
+    --all_envs                   Push to every environment in config.yml, -e/--env also accepts a list: -e a,b
+    --since                      Only push and delete the theme files changed since a git revision
+    --no_snapshot                Do not record a snapshot of the pushed theme for ntk rollback''',
             formatter_class=argparse.RawTextHelpFormatter)
         parser_push.set_defaults(func=self.command.push)
         parser_push.add_argument('filenames', metavar='filenames', type=str, nargs='*', help=argparse.SUPPRESS)
+        parser_push.add_argument('--all_envs', action="store_true", dest="all_envs", help=argparse.SUPPRESS)
+        parser_push.add_argument('--since', action="store", dest="since", help=argparse.SUPPRESS)
+        parser_push.add_argument('--no_snapshot', action="store_true", dest="no_snapshot", help=argparse.SUPPRESS)
         self._add_config_arguments(parser_push)
 
         # create the parser for the "watch" command
@@ -122,9 +150,15 @@ Usage:
             description='''
 Usage:
     ntk watch [options]
-''' + option_commands,
+''' + option_commands + '''
+    --bidirectional              Also pull the templates changed in the store, and report conflicting local changes
+    --live_reload [Port]         Reload preview tabs once changes are uploaded (default port %d)''' % LIVE_RELOAD_PORT,
             formatter_class=argparse.RawTextHelpFormatter)
         parser_watch.set_defaults(func=self.command.watch)
+        parser_watch.add_argument('--bidirectional', action="store_true", dest="bidirectional", help=argparse.SUPPRESS)
+        parser_watch.add_argument(
+            '--live_reload', action="store", type=int, nargs='?', const=LIVE_RELOAD_PORT, dest="live_reload",
+            help=argparse.SUPPRESS)
         self._add_config_arguments(parser_watch)
 
         # create the parser for the "sass" command
@@ -139,4 +173,129 @@ Usage:
             formatter_class=argparse.RawTextHelpFormatter)
         parser_watch.set_defaults(func=self.command.compile_sass)
         self._add_config_arguments(parser_watch)
+
+        # create the parser for the "rollback" command
+        parser_rollback = subparsers.add_parser(
+            'rollback',
+            help='Upload a previously pushed theme state',
+            usage=argparse.SUPPRESS,
+            description='''
+Usage:
+    ntk rollback [options] [Snapshot]
+''' + option_commands,
+            formatter_class=argparse.RawTextHelpFormatter)
+        parser_rollback.set_defaults(func=self.command.rollback)
+        parser_rollback.add_argument('snapshot', metavar='snapshot', type=str, nargs='?', help=argparse.SUPPRESS)
+        self._add_config_arguments(parser_rollback)
+
+        # create the parser for the "mirror" command
+        parser_mirror = subparsers.add_parser(
+            'mirror',
+            help='Back up every theme of the store',
+            usage=argparse.SUPPRESS,
+            description='''
+Usage:
+    ntk mirror [options] [Directory]
+''' + option_commands + '''
+    --themes                     Only mirror these themes, comma separated ids or names (wildcards allowed)''',
+            formatter_class=argparse.RawTextHelpFormatter)
+        parser_mirror.set_defaults(func=self.command.mirror)
+        parser_mirror.add_argument(
+            'directory', metavar='directory', type=str, nargs='?', default='mirror', help=argparse.SUPPRESS)
+        parser_mirror.add_argument('--themes', action="store", dest="themes", help=argparse.SUPPRESS)
+        self._add_config_arguments(parser_mirror)
+
+        # create the parser for the "export" command
+        parser_export = subparsers.add_parser(
+            'export',
+            help='Download a theme into a zip archive',
+            usage=argparse.SUPPRESS,
+            description='''
+Usage:
+    ntk export [options] <Archive>
+''' + option_commands,
+            formatter_class=argparse.RawTextHelpFormatter)
+        parser_export.set_defaults(func=self.command.export)
+        parser_export.add_argument('archive', metavar='archive', type=str, help=argparse.SUPPRESS)
+        self._add_config_arguments(parser_export)
+
+        # create the parser for the "import" command
+        parser_import = subparsers.add_parser(
+            'import',
+            help='Upload the theme files of a zip archive',
+            usage=argparse.SUPPRESS,
+            description='''
+Usage:
+    ntk import [options] <Archive>
+''' + option_commands,
+            formatter_class=argparse.RawTextHelpFormatter)
+        parser_import.set_defaults(func=self.command.import_theme)
+        parser_import.add_argument('archive', metavar='archive', type=str, help=argparse.SUPPRESS)
+        self._add_config_arguments(parser_import)
+
+        # create the parser for the "ls" command
+        parser_ls = subparsers.add_parser(
+            'ls',
+            help='List the files of the theme on the store',
+            usage=argparse.SUPPRESS,
+            description='''
+Usage:
+    ntk ls [options] [Patterns]
+''' + option_commands + '''
+    --refresh                    Refresh the local index of the theme from the store first''',
+            formatter_class=argparse.RawTextHelpFormatter)
+        parser_ls.set_defaults(func=self.command.ls)
+        parser_ls.add_argument('filenames', metavar='filenames', type=str, nargs='*', help=argparse.SUPPRESS)
+        parser_ls.add_argument('--refresh', action="store_true", dest="refresh", help=argparse.SUPPRESS)
+        self._add_config_arguments(parser_ls)
+
+        # create the parser for the "grep" command
+        parser_grep = subparsers.add_parser(
+            'grep',
+            help='Search the files of the theme on the store',
+            usage=argparse.SUPPRESS,
+            description='''
+Usage:
+    ntk grep [options] <Pattern> [Patterns]
+''' + option_commands + '''
+    --refresh                    Refresh the local index of the theme from the store first
+    -i, --ignore_case            Match the pattern regardless of case''',
+            formatter_class=argparse.RawTextHelpFormatter)
+        parser_grep.set_defaults(func=self.command.grep)
+        parser_grep.add_argument('pattern', metavar='pattern', type=str, help=argparse.SUPPRESS)
+        parser_grep.add_argument('filenames', metavar='filenames', type=str, nargs='*', help=argparse.SUPPRESS)
+        parser_grep.add_argument('--refresh', action="store_true", dest="refresh", help=argparse.SUPPRESS)
+        parser_grep.add_argument(
+            '-i', '--ignore_case', action="store_true", dest="ignore_case", help=argparse.SUPPRESS)
+        self._add_config_arguments(parser_grep)
+
+        # create the parser for the "diff" command
+        parser_diff = subparsers.add_parser(
+            'diff',
+            help='Show the differences with the theme on the store',
+            usage=argparse.SUPPRESS,
+            description='''
+Usage:
+    ntk diff [options] [Patterns]
+''' + option_commands + '''
+    --refresh                    Refresh the local index of the theme from the store first
+    --patch                      Also print a unified diff of every text file which differs''',
+            formatter_class=argparse.RawTextHelpFormatter)
+        parser_diff.set_defaults(func=self.command.diff)
+        parser_diff.add_argument('filenames', metavar='filenames', type=str, nargs='*', help=argparse.SUPPRESS)
+        parser_diff.add_argument('--refresh', action="store_true", dest="refresh", help=argparse.SUPPRESS)
+        parser_diff.add_argument('--patch', action="store_true", dest="patch", help=argparse.SUPPRESS)
+        self._add_config_arguments(parser_diff)
+
+        # create the parser for the "daemon" command
+        parser_daemon = subparsers.add_parser(
+            'daemon',
+            help='Serve push, pull and sass commands from a long running process',
+            usage=argparse.SUPPRESS,
+            description='''
+Usage:
+    ntk daemon
+''',
+            formatter_class=argparse.RawTextHelpFormatter)
+        parser_daemon.set_defaults(func=self.command.daemon)
         return parser
@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from watchgod.watcher import Change
+
+from ntk.conf import OFFLINE_QUEUE_DIRECTORY
+
+PUSH = 'push'
+DELETE = 'delete'
+
+
+def is_unavailable(response):
+    """Return True when a response tells the store could not take the request now, so it is worth retrying later."""
+    return response.status_code == 429 or response.status_code in range(500, 600)
+
+
+class OfflineQueue:
+    """
+    Theme changes of a watch not confirmed by the store yet, kept in a small JSON file of the theme directory.
+
+    Changes are added before their request is sent and removed once the store answered, so changes that failed
+    because the store was unreachable, or never got sent because watch stopped, are still there on the next
+    flush, including after a restart. Only the latest action of each template is kept.
+
+    Additions are written at once, while removals are written at most every `save_interval` seconds: losing
+    a removal only means uploading a file once more.
+    """
+
+    save_interval = 1.0
+
+    def __init__(self, env, theme_id, queue_dir=OFFLINE_QUEUE_DIRECTORY):
+        self.path = os.path.join(queue_dir, f'{env}.json')
+        self.theme_id = theme_id
+        self.changes = {}
+        self._lock = threading.Lock()
+        self._saved_at = 0
+        self._dirty = False
+        self.load()
+
+    def __len__(self):
+        return len(self.changes)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        # a queue of another theme, config.yml was changed since, is not ours to upload
+        if state.get('theme_id') == self.theme_id:
+            self.changes = state.get('changes', {})
+        else:
+            logging.warning(f'Discarding {len(state.get("changes", {}))} queued changes of theme id '
+                            f'{state.get("theme_id")}')
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = f'{self.path}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump({'theme_id': self.theme_id, 'changes': self.changes}, f)
+        os.replace(temporary_path, self.path)
+        self._saved_at = time.monotonic()
+        self._dirty = False
+
+    def add(self, template_names, action):
+        with self._lock:
+            changed = False
+            for template_name in template_names:
+                if self.changes.get(template_name) != action:
+                    self.changes[template_name] = action
+                    changed = True
+            if changed or self._dirty:
+                self._save()
+
+    def discard(self, template_name):
+        with self._lock:
+            if self.changes.pop(template_name, None) is None:
+                return
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.save_interval:
+                self._save()
+
+    def get_changes(self):
+        """Return the queued changes as watch file changes, what is on disk now decides between upload and delete."""
+        with self._lock:
+            template_names = list(self.changes)
+        return [
+            (Change.modified if os.path.isfile(template_name) else Change.deleted, os.path.abspath(template_name))
+            for template_name in template_names
+        ]
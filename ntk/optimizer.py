@@ -0,0 +1,124 @@
+import io
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from ntk.conf import MAX_CONCURRENCY, OPTIMIZE_CACHE_DIRECTORY
+from ntk.utils import get_content_hash, get_template_name
+
+try:
+    import rcssmin
+except ImportError:  # pragma: no cover
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:  # pragma: no cover
+    rjsmin = None
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover
+    Image = None
+
+# bump when the output of an optimizer changes, so cached results are not reused
+OPTIMIZER_VERSION = '1'
+
+
+def _minify_json(content):
+    return json.dumps(json.loads(content), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _minify_css(content):
+    return rcssmin.cssmin(content.decode('utf-8')).encode('utf-8')
+
+
+def _minify_js(content):
+    return rjsmin.jsmin(content.decode('utf-8')).encode('utf-8')
+
+
+def _optimize_png(content):
+    # PNG compression is lossless, the pixels are kept and only the encoding is redone
+    image = Image.open(io.BytesIO(content))
+    output = io.BytesIO()
+    image.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+
+def get_optimizers():
+    """Return the available optimizer by file extension, the optional libraries add CSS, JS and PNG support."""
+    optimizers = {'.json': _minify_json}
+    if rcssmin:
+        optimizers['.css'] = _minify_css
+    if rjsmin:
+        optimizers['.js'] = _minify_js
+    if Image:
+        optimizers['.png'] = _optimize_png
+    return optimizers
+
+
+def is_optimizable(template_name):
+    return os.path.splitext(template_name)[1].lower() in get_optimizers()
+
+
+def optimize_content(template_name, content):
+    """Return the optimized content, or the content itself when it can not be made smaller."""
+    optimizer = get_optimizers().get(os.path.splitext(template_name)[1].lower())
+    if optimizer is None:
+        return content
+    try:
+        optimized = optimizer(content)
+    except Exception as e:
+        logging.debug(f'Optimizing {template_name} failed, uploading it as is: {e}')
+        return content
+    return optimized if len(optimized) < len(content) else content
+
+
+def get_cache_path(template_name, content, cache_dir=OPTIMIZE_CACHE_DIRECTORY):
+    extension = os.path.splitext(template_name)[1].lower()
+    key = get_content_hash(
+        content + f'|{extension}|{OPTIMIZER_VERSION}|{",".join(sorted(get_optimizers()))}'.encode('utf-8'))
+    return os.path.join(cache_dir, f'{key}{extension}')
+
+
+def _optimize_file(template_name, content, cache_path):
+    optimized = optimize_content(template_name, content)
+    # written to a temporary file first, a cache entry is never read half written
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as f:
+        f.write(optimized)
+    os.replace(temporary_path, cache_path)
+
+
+def optimize_files(template_names, cache_dir=OPTIMIZE_CACHE_DIRECTORY):
+    """
+    Optimize the given theme files and return the path of the optimized copy by template name. Results are
+    cached by input content hash, only the files never seen before are optimized, on a process pool.
+    """
+    optimized_paths = {}
+    misses = []
+    for template_name in template_names:
+        relative_pathfile = get_template_name(template_name)
+        if not is_optimizable(relative_pathfile):
+            continue
+        with open(relative_pathfile, 'rb') as f:
+            content = f.read()
+        cache_path = get_cache_path(relative_pathfile, content, cache_dir=cache_dir)
+        if not os.path.exists(cache_path):
+            misses.append((relative_pathfile, content, cache_path))
+        optimized_paths[relative_pathfile] = cache_path
+
+    # a single file, the usual watch case, is not worth starting worker processes for
+    if len(misses) > 1:
+        # workers are spawned, forking while upload threads hold locks could leave a worker deadlocked
+        with ProcessPoolExecutor(
+                max_workers=min(len(misses), os.cpu_count() or 1, MAX_CONCURRENCY),
+                mp_context=multiprocessing.get_context('spawn')) as executor:
+            list(executor.map(_optimize_file, *zip(*misses)))
+    else:
+        for miss in misses:
+            _optimize_file(*miss)
+    return optimized_paths
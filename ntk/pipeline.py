@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from watchgod.watcher import Change
+
+from ntk.conf import BURST_THRESHOLD
+from ntk.utils import get_template_name, is_large_file, sort_by_upload_priority
+
+
+class UploadPipeline:
+    """
+    Run the blocking watch handler on an executor so the event loop keeps collecting changes during uploads.
+
+    Changes are coalesced per template: a path is never handled by two workers at the same time, and while
+    a path is in flight only its latest change is kept, so saves made obsolete by a newer save are skipped.
+
+    Pending changes are started in upload priority order, and large files run on their own lane so a big
+    media upload never holds back template previews.
+
+    When burst_threshold or more changes are pending at once (a branch checkout, a build), they are handed
+    as a whole to bulk_handler, and per-change handling resumes once that bulk synchronization is done. The bulk
+    synchronization waits for the running changes to finish, so a late per-change upload never overwrites it.
+
+    idle_callback is called on the event loop each time the last running change is handled and none is pending.
+    """
+
+    def __init__(
+            self, handler, max_workers=4, large_file_workers=1, bulk_handler=None, burst_threshold=BURST_THRESHOLD,
+            idle_callback=None):
+        self.handler = handler
+        self.bulk_handler = bulk_handler
+        self.idle_callback = idle_callback
+        self.burst_threshold = burst_threshold
+        self.bulk_task = None
+        self.bulk_requested = False
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ntk-upload')
+        self.large_file_executor = ThreadPoolExecutor(
+            max_workers=large_file_workers, thread_name_prefix='ntk-large-upload')
+        self.pending = {}
+        self.running = set()
+        self.tasks = set()
+
+    def submit(self, changes):
+        for event_type, pathfile in changes:
+            self.pending[get_template_name(pathfile)] = (event_type, pathfile)
+        self._schedule()
+
+    def submit_bulk(self, changes):
+        """Hand changes to the bulk handler in one batch, whatever their number."""
+        for event_type, pathfile in changes:
+            self.pending[get_template_name(pathfile)] = (event_type, pathfile)
+        self.bulk_requested = True
+        self._schedule()
+
+    def _schedule(self):
+        loop = asyncio.get_event_loop()
+        if self.bulk_task:
+            return
+        if self.bulk_handler and self.pending and (
+                self.bulk_requested or len(self.pending) >= self.burst_threshold):
+            # the batch is kept pending until the running changes are done, they are rescheduled on completion
+            if self.running:
+                return
+            changes = list(self.pending.values())
+            self.pending.clear()
+            if not self.bulk_requested:
+                logging.info(f'Detected a burst of {len(changes)} file changes, switching to bulk synchronization')
+            self.bulk_requested = False
+            self.bulk_task = loop.create_task(self._run_bulk(changes))
+            self.tasks.add(self.bulk_task)
+            self.bulk_task.add_done_callback(self.tasks.discard)
+            return
+        for template_name in sort_by_upload_priority(self.pending):
+            if template_name in self.running:
+                continue
+            change = self.pending.pop(template_name)
+            self.running.add(template_name)
+            task = loop.create_task(self._run(template_name, change))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def _get_executor(self, change):
+        event_type, pathfile = change
+        if event_type != Change.deleted and is_large_file(pathfile):
+            return self.large_file_executor
+        return self.executor
+
+    async def _run(self, template_name, change):
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(self._get_executor(change), self.handler, [change])
+        except Exception as error:
+            logging.error(f'{template_name} upload failed, {error}')
+        finally:
+            self.running.discard(template_name)
+            self._schedule()
+            self._check_idle()
+
+    async def _run_bulk(self, changes):
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(self.executor, self.bulk_handler, changes)
+        except Exception as error:
+            logging.error(f'Bulk synchronization failed, {error}')
+        finally:
+            self.bulk_task = None
+            self._schedule()
+            self._check_idle()
+
+    def _check_idle(self):
+        if self.idle_callback and not self.running and not self.pending and not self.bulk_task:
+            try:
+                self.idle_callback()
+            except Exception as error:
+                logging.error(f'Handling the end of uploads failed, {error}')
+
+    async def join(self):
+        while self.tasks or self.pending:
+            if self.tasks:
+                await asyncio.gather(*list(self.tasks))
+            else:
+                self._schedule()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        self.large_file_executor.shutdown(wait=False)
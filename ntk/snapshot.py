@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from ntk.conf import SNAPSHOT_CHAIN_LENGTH, SNAPSHOT_DIRECTORY
+
+
+class SnapshotStore:
+    """
+    Content addressed store of the theme states pushed to an environment.
+
+    File contents are kept once in `objects/` by sha256, whatever the number of snapshots using them. A snapshot
+    only records what changed since its parent snapshot, and every SNAPSHOT_CHAIN_LENGTH snapshots the whole tree,
+    so hundreds of snapshots only cost the changed bytes while reading one stays cheap.
+    """
+
+    def __init__(self, env, root=SNAPSHOT_DIRECTORY):
+        self.objects_dir = os.path.join(root, 'objects')
+        self.snapshots_dir = os.path.join(root, env)
+
+    def get_blob_path(self, content_hash):
+        return os.path.join(self.objects_dir, content_hash[:2], content_hash)
+
+    def put_blob(self, pathfile):
+        """Add the content of a file to the store and return its sha256."""
+        sha256 = hashlib.sha256()
+        with open(pathfile, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                sha256.update(chunk)
+        content_hash = sha256.hexdigest()
+
+        blob_path = self.get_blob_path(content_hash)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            temporary_path = f'{blob_path}.{os.getpid()}.tmp'
+            shutil.copyfile(pathfile, temporary_path)
+            os.replace(temporary_path, blob_path)
+        return content_hash
+
+    def _read(self, snapshot_id):
+        with open(os.path.join(self.snapshots_dir, f'{snapshot_id}.json')) as f:
+            return json.load(f)
+
+    def get_snapshot_ids(self):
+        """Return the snapshot ids, oldest first."""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        return sorted(name[:-len('.json')] for name in os.listdir(self.snapshots_dir) if name.endswith('.json'))
+
+    def find(self, snapshot_id):
+        """Return the snapshot id starting with snapshot_id, the latest one for "latest"."""
+        snapshot_ids = self.get_snapshot_ids()
+        if snapshot_id == 'latest' and snapshot_ids:
+            return snapshot_ids[-1]
+        matches = [candidate for candidate in snapshot_ids if candidate.startswith(snapshot_id)]
+        if len(matches) != 1:
+            raise KeyError(snapshot_id)
+        return matches[0]
+
+    def get(self, snapshot_id):
+        """Return the snapshot with its complete file tree, {template name: sha256}."""
+        snapshot = self._read(snapshot_id)
+        if 'files' not in snapshot:
+            files = dict(self.get(snapshot['parent'])['files'])
+            files.update(snapshot['changed'])
+            for template_name in snapshot['deleted']:
+                files.pop(template_name, None)
+            snapshot['files'] = files
+        return snapshot
+
+    def get_latest(self):
+        snapshot_ids = self.get_snapshot_ids()
+        return self.get(snapshot_ids[-1]) if snapshot_ids else None
+
+    def record(self, files, complete, **info):
+        """Record a snapshot of the file tree {template name: sha256} and return its id."""
+        latest = self.get_latest()
+        tree_hash = hashlib.sha256(json.dumps(files, sort_keys=True).encode('utf-8')).hexdigest()
+        now = time.time()
+        # ids sort in creation order, down to the millisecond
+        created = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+        snapshot_id = f'{created}.{int(now * 1000) % 1000:03d}-{tree_hash[:8]}'
+        snapshot = dict(
+            info, id=snapshot_id, created_at=time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(now)),
+            complete=complete)
+
+        if latest and latest.get('depth', 0) + 1 < SNAPSHOT_CHAIN_LENGTH:
+            snapshot.update(
+                parent=latest['id'],
+                depth=latest.get('depth', 0) + 1,
+                changed={name: content_hash for name, content_hash in files.items()
+                         if latest['files'].get(name) != content_hash},
+                deleted=sorted(set(latest['files']) - set(files)),
+            )
+        else:
+            snapshot.update(depth=0, files=files)
+
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        with open(os.path.join(self.snapshots_dir, f'{snapshot_id}.json'), 'w') as f:
+            json.dump(snapshot, f, indent=1, sort_keys=True)
+        return snapshot_id
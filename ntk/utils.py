@@ -1,12 +1,161 @@
+import hashlib
 import os
+import re
+import stat
+import subprocess
 import time
 from pathlib import Path
 
+from ntk.conf import (
+    GLOB_PATTERN, LARGE_FILE_SIZE, MEDIA_FILE_EXTENSIONS, SASS_SOURCE, TEMPLATE_DIRECTORIES
+)
+
 
 def get_template_name(pathfile):
     return Path(os.path.relpath(pathfile)).as_posix()
 
 
+def get_private_directory(create=True):
+    """
+    Return the directory of the state shared by the ntk processes of the current user, daemon sockets and shared
+    rate budgets: $XDG_RUNTIME_DIR/ntk, or ~/.ntk/run without it. It is created accessible by its owner only, and
+    an OSError is raised when it belongs to another user or other users can access it. With create False, only
+    its path is returned.
+    """
+    runtime_directory = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_directory:
+        directory = os.path.join(runtime_directory, 'ntk')
+    else:
+        directory = os.path.join(os.path.expanduser('~'), '.ntk', 'run')
+    if not create:
+        return directory
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    status = os.lstat(directory)
+    if not stat.S_ISDIR(status.st_mode):
+        raise OSError(f'{directory} is not a directory')
+    # ownership and permission bits are only meaningful on POSIX systems
+    if hasattr(os, 'getuid') and (status.st_uid != os.getuid() or status.st_mode & 0o077):
+        raise OSError(f'{directory} must only be accessible by its owner')
+    return directory
+
+
+def glob_to_regex(pattern):
+    """
+    Translate a recursive glob pattern (``**``, ``*``, ``?``) into a regular expression string.
+    Like glob.glob, wildcards do not match hidden files and directories.
+    """
+    regex = ''
+    index = 0
+    while index < len(pattern):
+        segment_start = index == 0 or pattern[index - 1] == '/'
+        if pattern.startswith('**/', index):
+            regex += r'(?:(?!\.)[^/]*/)*'
+            index += 3
+        elif pattern.startswith('**', index):
+            regex += r'(?:(?!\.)[^/]*/)*(?!\.)[^/]*'
+            index += 2
+        elif pattern[index] in '*?':
+            if segment_start:
+                regex += r'(?!\.)'
+            regex += '[^/]*' if pattern[index] == '*' else '[^/]'
+            index += 1
+        else:
+            regex += re.escape(pattern[index])
+            index += 1
+    return regex
+
+
+GLOB_PATTERN_REGEX = re.compile('(?:' + '|'.join(glob_to_regex(pattern) for pattern in GLOB_PATTERN) + r')\Z')
+
+
+def is_theme_file(pathfile):
+    """Return True if pathfile matches one of the GLOB_PATTERN entries."""
+    return bool(GLOB_PATTERN_REGEX.match(get_template_name(pathfile)))
+
+
+def _run_git(args):
+    result = subprocess.run(['git'] + args, capture_output=True)
+    if result.returncode:
+        raise ValueError(result.stderr.decode('utf-8', 'replace').strip())
+    return [field for field in result.stdout.decode('utf-8').split('\0') if field]
+
+
+def get_git_changes(revision):
+    """
+    Return the theme files added or modified, and the theme files deleted, in the current directory since a git
+    revision. Uncommitted and untracked (not ignored) files count as changes, renames as a deletion and an addition.
+    """
+    changed, deleted = [], []
+    fields = _run_git(['diff', '--name-status', '-M', '-z', '--relative', revision, '--'])
+    index = 0
+    while index < len(fields):
+        status = fields[index][0]
+        if status in 'RC':
+            old_name, new_name = fields[index + 1], fields[index + 2]
+            if status == 'R':
+                deleted.append(old_name)
+            changed.append(new_name)
+            index += 3
+        else:
+            (deleted if status == 'D' else changed).append(fields[index + 1])
+            index += 2
+    changed.extend(_run_git(['ls-files', '--others', '--exclude-standard', '-z']))
+
+    return (
+        [name for name in changed if is_theme_file(name)],
+        [name for name in deleted if is_theme_file(name)],
+    )
+
+
+def get_content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_file_hash(pathfile):
+    """Return the sha256 hex digest of a file content, or None if the file does not exist."""
+    if not os.path.isfile(pathfile):
+        return None
+    sha256 = hashlib.sha256()
+    with open(pathfile, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_file_size(pathfile):
+    try:
+        return os.path.getsize(pathfile)
+    except OSError:
+        return 0
+
+
+def is_large_file(pathfile):
+    return get_file_size(pathfile) > LARGE_FILE_SIZE
+
+
+def get_upload_priority(pathfile):
+    """
+    Return the upload priority of a file, lower values are uploaded first:
+    0 - templates rendered by the storefront preview (layouts, partials, templates, checkout)
+    1 - compiled CSS, JS and JSON content
+    2 - sass sources
+    3 - media files
+    """
+    template_name = get_template_name(pathfile)
+    directory = template_name.split('/')[0]
+    if directory in TEMPLATE_DIRECTORIES:
+        return 0
+    if directory == SASS_SOURCE:
+        return 2
+    if template_name.endswith(tuple(MEDIA_FILE_EXTENSIONS)):
+        return 3
+    return 1
+
+
+def sort_by_upload_priority(template_names):
+    return sorted(template_names, key=lambda pathfile: (get_upload_priority(pathfile), get_file_size(pathfile)))
+
+
 def progress_bar(iterable, prefix='', suffix='', decimals=1, length=100, fill='█', printEnd="\r"):
     """
     Call in a loop to create terminal progress bar
@@ -0,0 +1,135 @@
+import json
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from ntk.conf import CONTENT_FILE_EXTENSIONS, MAX_CONCURRENCY, VALIDATE_CACHE_DIRECTORY
+from ntk.utils import get_content_hash, get_file_size, get_template_name
+
+# bump when a check is added or changed, so files validated before are checked again
+VALIDATOR_VERSION = '1'
+
+TEMPLATE_TAG_REGEX = re.compile(r'{%-?\s*(\w+)(.*?)-?%}|{#.*?#}', re.DOTALL)
+# block tags of the template language, any other tag is a block when its end tag is used in the same file
+BLOCK_TAGS = {
+    'autoescape', 'block', 'blocktrans', 'blocktranslate', 'comment', 'filter', 'for', 'if', 'ifchanged', 'spaceless',
+    'verbatim', 'with',
+}
+# tags whose content is not parsed as template code
+RAW_TAGS = {'comment', 'verbatim'}
+
+
+def _get_line(content, position):
+    return content.count('\n', 0, position) + 1
+
+
+def _check_template_tags(content):
+    """Return the problems of the template tags of an HTML template: unclosed, unexpected and mismatched tags."""
+    tags = set(re.findall(r'{%-?\s*(\w+)', content))
+    block_tags = BLOCK_TAGS | {tag[3:] for tag in tags if tag.startswith('end') and tag[3:] in tags}
+    stack = []
+    for match in TEMPLATE_TAG_REGEX.finditer(content):
+        tag = match.group(1)
+        if not tag:
+            continue
+        if stack and stack[-1][0] in RAW_TAGS and tag != f'end{stack[-1][0]}':
+            continue
+        if tag.startswith('end') and tag[3:] in block_tags:
+            if not stack:
+                return [f'line {_get_line(content, match.start())}: unexpected {{% {tag} %}}']
+            opening_tag, position = stack.pop()
+            if tag != f'end{opening_tag}':
+                return [
+                    f'line {_get_line(content, match.start())}: {{% {tag} %}} closes {{% {opening_tag} %}} '
+                    f'of line {_get_line(content, position)}'
+                ]
+        elif tag in block_tags:
+            stack.append((tag, match.start()))
+    if stack:
+        opening_tag, position = stack[-1]
+        return [f'line {_get_line(content, position)}: {{% {opening_tag} %}} is never closed']
+
+    # a tag delimiter left open swallows the rest of the template
+    unterminated = re.search(r'{%(?!.*?%})', content, re.DOTALL)
+    if unterminated:
+        return [f'line {_get_line(content, unterminated.start())}: {{% is never closed by %}}']
+    return []
+
+
+def validate_content(template_name, content):
+    """Return the problems found in the content of a text theme file, an empty list when it is valid."""
+    try:
+        text = content.decode('utf-8')
+    except UnicodeDecodeError as error:
+        return [f'not valid UTF-8, byte {error.start}']
+
+    extension = os.path.splitext(template_name)[1].lower()
+    if extension == '.json':
+        try:
+            json.loads(text)
+        except ValueError as error:
+            return [f'not valid JSON, {error}']
+    elif extension == '.html':
+        return _check_template_tags(text)
+    return []
+
+
+def get_cache_path(template_name, content, cache_dir=VALIDATE_CACHE_DIRECTORY):
+    extension = os.path.splitext(template_name)[1].lower()
+    key = get_content_hash(content + f'|{extension}|{VALIDATOR_VERSION}'.encode('utf-8'))
+    return os.path.join(cache_dir, key[:2], key)
+
+
+def _validate_file(template_name, content, cache_path):
+    problems = validate_content(template_name, content)
+    # only valid content is cached, an invalid file is fixed before it is pushed again
+    if not problems:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        open(cache_path, 'w').close()
+    return problems
+
+
+def validate_files(template_names, cache_dir=VALIDATE_CACHE_DIRECTORY, max_file_size=None):
+    """
+    Check the given theme files before any upload and return the problems found by template name, only for the
+    invalid files. Valid contents are cached by hash, only the files never seen before are checked, on a process
+    pool. With max_file_size (in kilobytes), any file larger than it is invalid, media files included.
+    """
+    invalid = {}
+    misses = []
+    for template_name in template_names:
+        relative_pathfile = get_template_name(template_name)
+        # the size is known without reading the file, an oversized one is never loaded
+        if max_file_size:
+            file_size = get_file_size(relative_pathfile)
+            if file_size > max_file_size * 1024:
+                invalid[relative_pathfile] = [f'{file_size} bytes, larger than max_file_size of {max_file_size:g} KB']
+                continue
+        # media files are otherwise uploaded as they are
+        if not relative_pathfile.endswith(tuple(CONTENT_FILE_EXTENSIONS)):
+            continue
+        # a file gone since it was listed is reported by its upload, not here
+        try:
+            with open(relative_pathfile, 'rb') as f:
+                content = f.read()
+        except OSError:
+            continue
+        cache_path = get_cache_path(relative_pathfile, content, cache_dir=cache_dir)
+        if not os.path.exists(cache_path):
+            misses.append((relative_pathfile, content, cache_path))
+
+    # a single file, the usual watch case, is not worth starting worker processes for
+    if len(misses) > 1:
+        # workers are spawned, forking while upload threads hold locks could leave a worker deadlocked
+        with ProcessPoolExecutor(
+                max_workers=min(len(misses), os.cpu_count() or 1, MAX_CONCURRENCY),
+                mp_context=multiprocessing.get_context('spawn')) as executor:
+            results = list(executor.map(_validate_file, *zip(*misses)))
+    else:
+        results = [_validate_file(*miss) for miss in misses]
+
+    for (relative_pathfile, _, _), problems in zip(misses, results):
+        if problems:
+            invalid[relative_pathfile] = problems
+    return invalid
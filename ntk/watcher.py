@@ -0,0 +1,55 @@
+import logging
+import os
+
+import watchgod
+from watchgod.watcher import Change, DefaultWatcher
+
+from ntk.conf import WATCH_DIRECTORIES
+from ntk.ignore import get_ignore_matcher
+from ntk.utils import is_theme_file
+
+try:
+    import watchfiles
+except ImportError:  # pragma: no cover
+    watchfiles = None
+
+
+class ThemeWatcher(DefaultWatcher):
+    """Polling watcher which only walks the theme directories and only stats theme files not ignored."""
+
+    def should_watch_dir(self, entry):
+        if os.path.dirname(os.path.normpath(entry.path)) == os.path.normpath(self.root_path):
+            return entry.name in WATCH_DIRECTORIES
+        return super().should_watch_dir(entry) and not get_ignore_matcher().should_prune(entry.path)
+
+    def should_watch_file(self, entry):
+        return (
+            super().should_watch_file(entry) and is_theme_file(entry.path)
+            and not get_ignore_matcher().is_ignored(entry.path)
+        )
+
+
+def get_watch_paths(root_path='.'):
+    paths = [os.path.normpath(os.path.join(root_path, directory)) for directory in WATCH_DIRECTORIES]
+    return [path for path in paths if os.path.isdir(path)]
+
+
+def _watch_filter(change, path):
+    return is_theme_file(path) and not get_ignore_matcher().is_ignored(path)
+
+
+async def watch_theme(root_path='.'):
+    """
+    Yield sets of (Change, path) for theme files under root_path.
+    Use kernel notifications (inotify, FSEvents, ReadDirectoryChangesW) through watchfiles when it is available,
+    otherwise poll the theme directories with watchgod.
+    """
+    paths = get_watch_paths(root_path)
+    if watchfiles and paths:
+        logging.debug(f'Watching {", ".join(paths)} with native file notifications')
+        async for changes in watchfiles.awatch(*paths, watch_filter=_watch_filter):
+            yield {(Change(int(event_type)), pathfile) for event_type, pathfile in changes}
+    else:
+        logging.debug(f'Polling {root_path} for file changes')
+        async for changes in watchgod.awatch(root_path, watcher_cls=ThemeWatcher):
+            yield changes
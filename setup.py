@@ -23,8 +23,13 @@ setup(
         "PyYAML>=5.4",
         "requests>=2.25",
         "watchgod>=0.7",
+        "watchfiles>=0.18",
         "libsass>=0.21.0"
     ],
+    extras_require={
+        'async': ["aiohttp>=3.8"],
+        'optimize': ["rcssmin>=1.1", "rjsmin>=1.2", "Pillow>=9.0"],
+    },
     entry_points={
         'console_scripts': [
             'ntk = ntk.ntk:main',
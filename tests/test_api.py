@@ -0,0 +1,108 @@
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from ntk import api
+
+
+class TestApi(unittest.TestCase):
+    def setUp(self):
+        self.config = {'apikey': 'abcd1234', 'store': 'http://development.com', 'theme_id': 1234}
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        os.makedirs('layouts')
+        for name in ['base', 'broken']:
+            with open(f'layouts/{name}.html', 'w') as f:
+                f.write(f'<div>{name}</div>')
+        api._gateways.clear()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    @patch('ntk.api.Gateway', autospec=True)
+    def test_push_should_return_result_per_file(self, mock_gateway):
+        def create_or_update_template(theme_id, template_name, content, files):
+            if template_name == 'layouts/broken.html':
+                return MagicMock(
+                    ok=False, status_code=400, headers={'content-type': 'application/json'},
+                    json=MagicMock(return_value={'content': ['Invalid template.']}))
+            return MagicMock(ok=True)
+
+        mock_gateway.return_value.create_or_update_template.side_effect = create_or_update_template
+
+        results = api.push(['layouts/base.html', 'layouts/broken.html', 'config.yml'], config=self.config)
+
+        self.assertEqual(
+            [(result.template_name, result.status, result.size, result.error) for result in results],
+            [('layouts/base.html', 'uploaded', 15, None), ('layouts/broken.html', 'failed', 17, 'Invalid template.')])
+        self.assertTrue(results[0].ok)
+        self.assertFalse(results[1].ok)
+
+        # the gateway and its connections are reused by the next calls
+        api.push(['layouts/base.html'], config=self.config)
+        mock_gateway.assert_called_once_with(
+            store='http://development.com', apikey='abcd1234', rate_limit=None, gzip=False, max_bandwidth=None)
+
+    @patch('ntk.api.Gateway', autospec=True)
+    def test_push_with_invalid_file_should_upload_nothing(self, mock_gateway):
+        with open('layouts/broken.html', 'w') as f:
+            f.write('{% if user %}<div>broken</div>')
+
+        results = api.push(['layouts/base.html', 'layouts/broken.html'], config=self.config)
+
+        self.assertEqual(
+            [(result.template_name, result.status, result.error) for result in results], [
+                ('layouts/base.html', 'skipped', 'Not uploaded, other files are invalid'),
+                ('layouts/broken.html', 'invalid', 'line 1: {% if %} is never closed'),
+            ])
+        mock_gateway.return_value.create_or_update_template.assert_not_called()
+
+    @patch('ntk.api.Gateway', autospec=True)
+    def test_pull_should_write_files_and_return_result_per_file(self, mock_gateway):
+        mock_gateway.return_value.get_templates.return_value.ok = True
+        mock_gateway.return_value.get_templates.return_value.json.return_value = [
+            {'name': 'layouts/base.html', 'content': '<div>remote</div>', 'file': None},
+            {'name': 'assets/image.png', 'content': '', 'file': 'https://cdn.com/assets/image.png'},
+        ]
+        mock_gateway.return_value._request.return_value = MagicMock(ok=True, content=b'\x89PNG')
+
+        results = api.pull(config=self.config)
+
+        self.assertEqual(
+            [(result.template_name, result.status, result.size) for result in results],
+            [('layouts/base.html', 'downloaded', 17), ('assets/image.png', 'downloaded', 4)])
+        with open('layouts/base.html') as f:
+            self.assertEqual(f.read(), '<div>remote</div>')
+
+    def test_push_without_required_config_should_raise_error(self):
+        with self.assertRaises(TypeError):
+            api.push(config={'apikey': None, 'store': None, 'theme_id': None})
+
+    @patch('ntk.api.Gateway', autospec=True)
+    def test_push_with_env_should_use_config_of_that_env(self, mock_gateway):
+        patcher = patch('ntk.conf.CONFIG_FILE', os.path.abspath('config.yml'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with open('config.yml', 'w') as f:
+            f.write(
+                'development:\n  apikey: dev\n  store: http://development.com\n  theme_id: 1\n'
+                'staging:\n  apikey: staging\n  store: http://staging.com\n  theme_id: 2\n')
+        mock_gateway.return_value.create_or_update_template.return_value = MagicMock(ok=True)
+
+        api.push(['layouts/base.html'], config={'env': 'staging'})
+
+        mock_gateway.assert_called_once_with(
+            store='http://staging.com', apikey='staging', rate_limit=None, gzip=False, max_bandwidth=None)
+        mock_gateway.return_value.create_or_update_template.assert_called_once_with(
+            theme_id=2, template_name='layouts/base.html', content=b'<div>base</div>', files={})
+
+    def test_import_should_not_configure_logging(self):
+        code = 'import logging, ntk.api; print(len(logging.getLogger().handlers), logging.getLogger().level)'
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=self.cwd).stdout
+        self.assertEqual(output.split(), ['0', str(logging.WARNING)])
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import MagicMock, patch
+
+from ntk.archive import get_archive_templates, is_safe_name, ThemeExport
+
+
+class TestThemeExport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'theme.zip')
+        self.gateway = MagicMock()
+        self.gateway._request.side_effect = lambda request_type, url, stream: MagicMock(
+            ok=True, iter_content=MagicMock(return_value=iter([b'\x89PNG', url.encode()])))
+        self.gateway.iter_content.side_effect = lambda response, chunk_size: response.iter_content(chunk_size)
+        self.templates = [
+            {'name': 'layouts/base.html', 'content': 'base', 'file': None},
+            {'name': 'assets/logo.png', 'content': '', 'file': 'https://cdn.com/logo.png'},
+            {'name': 'assets/banner.png', 'content': '', 'file': 'https://cdn.com/banner.png'},
+            {'name': '../escape.html', 'content': 'outside', 'file': None},
+        ]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_is_safe_name_should_reject_names_outside_of_theme(self):
+        self.assertTrue(is_safe_name('layouts/base.html'))
+        self.assertFalse(is_safe_name('../escape.html'))
+        self.assertFalse(is_safe_name('/etc/passwd'))
+        self.assertFalse(is_safe_name('assets/../../escape.html'))
+        self.assertFalse(is_safe_name('assets\\..\\escape.html'))
+
+    @patch('ntk.archive.MAX_CONCURRENCY', 1)
+    def test_export_should_stream_templates_into_archive(self):
+        written, failed = ThemeExport(self.gateway, self.path, 'development').export(self.templates)
+
+        self.assertEqual((written, failed), (3, 0))
+        self.gateway._request.assert_any_call('GET', 'https://cdn.com/logo.png', stream=True)
+        with zipfile.ZipFile(self.path) as archive:
+            self.assertEqual(
+                sorted(archive.namelist()), ['assets/banner.png', 'assets/logo.png', 'layouts/base.html'])
+            self.assertEqual(archive.read('layouts/base.html'), b'base')
+            self.assertEqual(archive.read('assets/logo.png'), b'\x89PNGhttps://cdn.com/logo.png')
+            self.assertEqual(archive.getinfo('assets/logo.png').compress_type, zipfile.ZIP_STORED)
+        self.assertFalse(os.path.exists(f'{self.path}.tmp'))
+
+    def test_export_should_report_failed_downloads(self):
+        self.gateway._request.side_effect = None
+        self.gateway._request.return_value = MagicMock(ok=False, status_code=404)
+        with self.assertLogs(level='ERROR'):
+            written, failed = ThemeExport(self.gateway, self.path, 'development').export(self.templates)
+
+        self.assertEqual((written, failed), (1, 2))
+        with zipfile.ZipFile(self.path) as archive:
+            self.assertEqual(archive.namelist(), ['layouts/base.html'])
+
+    def test_get_archive_templates_should_only_return_theme_files(self):
+        with zipfile.ZipFile(self.path, 'w') as archive:
+            for name in ['layouts/base.html', 'assets/logo.png', 'config.yml', 'notes/readme.txt', '../x.html']:
+                archive.writestr(name, 'content')
+            archive.writestr('assets/', '')
+
+        with zipfile.ZipFile(self.path) as archive:
+            self.assertEqual(
+                [info.filename for info in get_archive_templates(archive)], ['layouts/base.html', 'assets/logo.png'])
@@ -0,0 +1,75 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from ntk import async_gateway
+from ntk.async_gateway import AsyncGateway
+
+try:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+except ImportError:  # pragma: no cover
+    web = None
+
+
+def json_response(data, status=200):
+    return web.Response(body=json.dumps(data).encode(), status=status, headers={'Content-Type': 'application/json'})
+
+
+@unittest.skipIf(web is None, 'aiohttp is not installed')
+class TestAsyncGateway(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requests = []
+        self.responses = []
+
+        async def handler(request):
+            self.requests.append((request.method, request.path_qs, request.headers.get('Authorization'),
+                                  dict(await request.post())))
+            return self.responses.pop(0)
+
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', handler)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.gateway = AsyncGateway(str(self.server.make_url('/')), 'apikey')
+
+    async def asyncTearDown(self):
+        await self.gateway.close()
+        await self.server.close()
+
+    async def test_get_templates(self):
+        self.responses.append(json_response([{'name': 'layouts/base.html', 'content': '', 'file': None}]))
+
+        response = await self.gateway.get_templates(theme_id=6)
+
+        self.assertEqual(response.json(), [{'name': 'layouts/base.html', 'content': '', 'file': None}])
+        self.assertEqual(self.requests, [('GET', '/api/admin/themes/6/templates/', 'Bearer apikey', {})])
+
+    async def test_create_or_update_template_with_rate_limit_should_retry(self):
+        self.responses.append(web.Response(status=429, text='Request was throttled.', headers={'Retry-After': '0'}))
+        self.responses.append(json_response({'name': 'assets/base.css'}))
+
+        response = await self.gateway.create_or_update_template(
+            theme_id=6, template_name='assets/base.css', content='body {}')
+
+        self.assertTrue(response.ok)
+        self.assertEqual(len(self.requests), 2)
+        expected_payload = {'name': 'assets/base.css', 'content': 'body {}'}
+        self.assertEqual(
+            self.requests[1], ('POST', '/api/admin/themes/6/templates/', 'Bearer apikey', expected_payload))
+
+    async def test_delete_template_failed_should_log_error_like_gateway(self):
+        self.responses.append(json_response({'detail': 'Not found.'}, status=404))
+
+        with self.assertLogs(level='INFO') as log:
+            response = await self.gateway.delete_template(theme_id=6, template_name='asset/custom.css')
+
+        self.assertFalse(response.ok)
+        self.assertIn('INFO:root:Deleting asset/custom.css file from theme id #6 failed. -> Not found.', log.output)
+
+
+class TestAsyncGatewayWithoutAiohttp(unittest.TestCase):
+    def test_init_without_aiohttp_should_raise_import_error(self):
+        with patch.object(async_gateway, 'aiohttp', None):
+            with self.assertRaises(ImportError):
+                AsyncGateway('http://simple.com', 'apikey')
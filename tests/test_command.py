@@ -1,11 +1,21 @@
 import os
+import subprocess
+import tempfile
+import threading
+import time
 import unittest
+import zipfile
 from unittest.mock import call, MagicMock, mock_open, patch
 
+import requests
 from watchgod.watcher import Change
 
 from ntk import conf
 from ntk.command import Command
+from ntk.metrics import LatencyRecorder
+from ntk.offline import OfflineQueue
+from ntk.snapshot import SnapshotStore
+from ntk.utils import get_file_hash, get_template_name
 
 
 class TestCommand(unittest.TestCase):
@@ -28,7 +38,12 @@ class TestCommand(unittest.TestCase):
             'apikey': 'abcd1234',
             'theme_id': 1234,
             'store': 'http://development.com',
-            'sass_output_style': 'nested'
+            'sass_output_style': 'nested',
+            'rate_limit': None,
+            'gzip': False,
+            'optimize': False,
+            'max_bandwidth': None,
+            'max_file_size': None
         }
         with patch('builtins.open', mock_open(read_data='yaml data')):
             self.parser = MagicMock(**config)
@@ -305,9 +320,430 @@ class TestCommand(unittest.TestCase):
 
         mock_write_config.assert_not_called()
 
+    #####
+    # push
+    #####
+    @patch("ntk.command.MAX_CONCURRENCY", 1)
+    @patch("ntk.utils.get_file_size", autospec=True)
+    @patch("ntk.command.Command._get_accept_files", autospec=True)
+    def test_push_templates_should_upload_templates_before_media_and_large_files(
+        self, mock_get_accept_file, mock_get_file_size
+    ):
+        sizes = {'assets/video.mp4': 200 * 1024 * 1024, 'assets/logo.png': 1024}
+        mock_get_file_size.side_effect = lambda pathfile: sizes.get(pathfile, 100)
+        mock_get_accept_file.return_value = [
+            'assets/video.mp4', 'assets/logo.png', 'assets/main.css', 'sass/main.scss', 'layouts/base.html'
+        ]
+        self.command.config.parser_config(self.parser)
+        self.mock_gateway.return_value.create_or_update_template.return_value.ok = True
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                for pathfile in mock_get_accept_file.return_value:
+                    os.makedirs(os.path.dirname(pathfile), exist_ok=True)
+                    with open(pathfile, 'wb') as f:
+                        f.write(b'body {}' if pathfile.endswith(('.css', '.scss')) else b'<html></html>')
+
+                self.command._push_templates([])
+            finally:
+                os.chdir(cwd)
+
+        uploaded = [
+            gateway_call.kwargs['template_name'] for gateway_call in self.mock_gateway.return_value.mock_calls
+            if gateway_call[0] == 'create_or_update_template'
+        ]
+        # the large video is not refused by validation, it is uploaded on the background lane, concurrently with
+        # the other files
+        self.assertIn('assets/video.mp4', uploaded)
+        uploaded.remove('assets/video.mp4')
+        self.assertEqual(uploaded, ['layouts/base.html', 'assets/main.css', 'sass/main.scss', 'assets/logo.png'])
+
+    def get_env_targets(self, responses):
+        """Return a command per environment, with a mocked gateway answering the given response status."""
+        targets = {}
+        for env, ok in responses.items():
+            config = MagicMock(env=env, store=f'http://{env}.com', theme_id=1, optimize=False)
+            targets[env] = Command(config=config, gateway=MagicMock())
+            targets[env].gateway.create_or_update_template.return_value = MagicMock(ok=ok, status_code=201)
+        return targets
+
+    @patch("ntk.command.MAX_CONCURRENCY", 1)
+    @patch("ntk.command.Command._read_template", autospec=True)
+    @patch("ntk.command.Command._get_env_command", autospec=True)
+    @patch("ntk.command.Command._get_accept_files", autospec=True)
+    def test_push_command_with_multiple_envs_should_read_files_once_and_upload_to_every_env(
+        self, mock_get_accept_file, mock_get_env_command, mock_read_template
+    ):
+        mock_get_accept_file.return_value = ['layouts/base.html', 'assets/main.css']
+        mock_read_template.side_effect = (
+            lambda command, template_name, optimized: (f'content of {template_name}'.encode(), {}))
+        targets = self.get_env_targets({'staging': True, 'production': False})
+        mock_get_env_command.side_effect = lambda command, env, parser: targets[env]
+
+        self.parser.env = 'staging,production'
+        self.parser.apikey = self.parser.store = self.parser.theme_id = None
+        self.parser.all_envs = False
+        self.parser.since = None
+        self.parser.no_snapshot = True
+        self.parser.filenames = []
+        with self.assertLogs(level='INFO') as cm:
+            self.command.push(self.parser)
+
+        self.assertEqual(mock_read_template.call_count, 2)
+        self.assertEqual(targets['staging'].gateway.create_or_update_template.mock_calls, [
+            call(theme_id=1, template_name='layouts/base.html', content=b'content of layouts/base.html', files={}),
+            call(theme_id=1, template_name='assets/main.css', content=b'content of assets/main.css', files={}),
+        ])
+        self.assertIn("INFO:root:[staging] Uploaded 2 of 2 files to theme id 1 on http://staging.com", cm.output)
+        self.assertIn(
+            "ERROR:root:[production] Uploaded 0 of 2 files to theme id 1 on http://production.com", cm.output)
+
+    @patch("ntk.command.is_large_file", autospec=True)
+    @patch("ntk.command.Command._read_template", autospec=True)
+    @patch("ntk.command.Command._get_env_command", autospec=True)
+    @patch("ntk.command.Command._get_accept_files", autospec=True)
+    def test_push_command_with_multiple_envs_should_upload_concurrently_to_each_env(
+        self, mock_get_accept_file, mock_get_env_command, mock_read_template, mock_is_large_file
+    ):
+        mock_get_accept_file.return_value = ['layouts/base.html', 'layouts/page.html', 'assets/video.mp4']
+        mock_read_template.side_effect = lambda command, template_name, optimized: (b'content', {})
+        mock_is_large_file.side_effect = lambda template_name: template_name.endswith('.mp4')
+        targets = self.get_env_targets({'staging': True, 'production': True})
+        mock_get_env_command.side_effect = lambda command, env, parser: targets[env]
+
+        # every upload of an environment waits for the other two, so they only go through when in flight together
+        def upload_together(barrier, response):
+            def create_or_update_template(**kwargs):
+                barrier.wait()
+                return response
+            return create_or_update_template
+
+        for target in targets.values():
+            mock_create_or_update_template = target.gateway.create_or_update_template
+            mock_create_or_update_template.side_effect = upload_together(
+                threading.Barrier(3, timeout=5), mock_create_or_update_template.return_value)
+
+        self.parser.env = 'staging,production'
+        self.parser.apikey = self.parser.store = self.parser.theme_id = None
+        self.parser.all_envs = False
+        self.parser.since = None
+        self.parser.no_snapshot = True
+        self.parser.filenames = []
+        with self.assertLogs(level='INFO') as cm:
+            self.command.push(self.parser)
+
+        self.assertIn("INFO:root:[staging] Uploaded 3 of 3 files to theme id 1 on http://staging.com", cm.output)
+        self.assertIn("INFO:root:[production] Uploaded 3 of 3 files to theme id 1 on http://production.com", cm.output)
+
+    @patch("ntk.command.Command._get_env_command", autospec=True)
+    def test_push_command_with_multiple_envs_should_upload_optimized_copies_to_envs_with_optimize(
+        self, mock_get_env_command
+    ):
+        targets = self.get_env_targets({'staging': True, 'production': True})
+        targets['production'].config.optimize = True
+        mock_get_env_command.side_effect = lambda command, env, parser: targets[env]
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('locales')
+                with open('locales/en.json', 'w') as f:
+                    f.write('{\n    "title": "Home"\n}\n')
+
+                self.command._push_to_envs([], ['staging', 'production'], snapshot=False)
+            finally:
+                os.chdir(cwd)
+
+        targets['staging'].gateway.create_or_update_template.assert_called_once_with(
+            theme_id=1, template_name='locales/en.json', content=b'{\n    "title": "Home"\n}\n', files={})
+        targets['production'].gateway.create_or_update_template.assert_called_once_with(
+            theme_id=1, template_name='locales/en.json', content=b'{"title":"Home"}', files={})
+
+    def test_push_command_with_multiple_envs_should_refuse_theme_arguments(self):
+        self.parser.env = 'staging,production'
+        self.parser.all_envs = False
+        self.parser.theme_id = None
+
+        with self.assertRaises(TypeError) as error:
+            self.command.push(self.parser)
+
+        self.assertEqual(
+            str(error.exception),
+            '[staging,production] argument -a/--apikey, -s/--store cannot be used with several environments, '
+            'set them in config.yml instead.')
+
+    @patch("yaml.load", autospec=True)
+    @patch("os.path.exists", autospec=True)
+    def test_get_env_command_should_apply_command_line_options(self, mock_patch_exists, mock_load_yaml):
+        mock_patch_exists.return_value = True
+        mock_load_yaml.return_value = {
+            'staging': {'apikey': 'staging', 'store': 'http://staging.com', 'theme_id': 2, 'rate_limit': 5},
+        }
+        parser = MagicMock(
+            apikey=None, store=None, theme_id=None, sass_output_style=None, rate_limit=None, gzip=True,
+            optimize=True, max_bandwidth=256, max_file_size=None)
+
+        with patch('builtins.open', mock_open(read_data='yaml data')):
+            target = self.command._get_env_command('staging', parser)
+
+        self.assertEqual(
+            (target.config.store, target.config.theme_id, target.config.rate_limit, target.config.gzip,
+             target.config.optimize, target.config.max_bandwidth),
+            ('http://staging.com', 2, 5, True, True, 256))
+        self.assertEqual((target.gateway.gzip, target.gateway.max_bandwidth), (True, 256))
+
+    def test_get_accept_files_should_skip_ignored_files_and_prune_ignored_directories(self):
+        walk = os.walk
+        walked = []
+
+        def recording_walk(top, **kwargs):
+            for dirpath, dirnames, filenames in walk(top, **kwargs):
+                walked.append(get_template_name(dirpath))
+                yield dirpath, dirnames, filenames
+
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                for name in ['layouts/base.html', 'assets/main.js', 'assets/main.js.map', 'assets/vendor/lib.js',
+                             'assets/vendor/deep/lib.js', 'README.md']:
+                    os.makedirs(os.path.dirname(name) or '.', exist_ok=True)
+                    with open(name, 'w') as f:
+                        f.write('content')
+                with open('.ntkignore', 'w') as f:
+                    f.write('*.map\nassets/vendor/\n')
+
+                with patch("ntk.command.os.walk", side_effect=recording_walk):
+                    accept_files = self.command._get_accept_files([])
+                explicit_files = self.command._get_accept_files(['assets/main.js.map', 'assets/main.js'])
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(sorted(map(os.path.basename, accept_files)), ['base.html', 'main.js'])
+        self.assertEqual(list(map(os.path.basename, explicit_files)), ['main.js'])
+        # the ignored directory is never walked into
+        self.assertEqual(sorted(walked), ['assets', 'layouts'])
+
+    def test_get_accept_files_should_walk_ignored_directories_with_files_included_again(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('assets/vendor')
+                for name in ['assets/vendor/keep.js', 'assets/vendor/lib.js']:
+                    with open(name, 'w') as f:
+                        f.write('content')
+                with open('.ntkignore', 'w') as f:
+                    f.write('assets/vendor/\n!assets/vendor/keep.js\n')
+
+                accept_files = self.command._get_accept_files([])
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(list(map(os.path.basename, accept_files)), ['keep.js'])
+
+    def test_get_changes_since_should_read_theme_changes_from_git(self):
+        def git(*args):
+            subprocess.run(['git', '-c', 'user.name=ntk', '-c', 'user.email=ntk@example.com'] + list(args),
+                           check=True, capture_output=True)
+
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                git('init', '-q')
+                os.makedirs('layouts')
+                os.makedirs('assets')
+                for name in ['layouts/base.html', 'layouts/old.html', 'assets/main.css', 'assets/removed.js']:
+                    with open(name, 'w') as f:
+                        f.write(f'content of {name}')
+                git('add', '.')
+                git('commit', '-q', '-m', 'initial')
+
+                with open('assets/main.css', 'w') as f:
+                    f.write('body {}')
+                git('mv', 'layouts/old.html', 'layouts/new.html')
+                os.remove('assets/removed.js')
+                with open('layouts/added.html', 'w') as f:
+                    f.write('added')
+                with open('README.md', 'w') as f:
+                    f.write('not a theme file')
+
+                changed, deleted = self.command._get_changes_since('HEAD', 'development')
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(sorted(changed), ['assets/main.css', 'layouts/added.html', 'layouts/new.html'])
+        self.assertEqual(sorted(deleted), ['assets/removed.js', 'layouts/old.html'])
+
+    @patch("ntk.command.get_git_changes", autospec=True)
+    def test_get_changes_since_with_unknown_revision_should_raise_error(self, mock_get_git_changes):
+        mock_get_git_changes.side_effect = ValueError("fatal: bad revision 'v9'")
+        with self.assertRaises(TypeError) as error:
+            self.command._get_changes_since('v9', 'development')
+        self.assertEqual(
+            str(error.exception),
+            "[development] argument --since v9 could not be compared with git: fatal: bad revision 'v9'")
+
+    @patch("ntk.command.Command._compile_sass", autospec=True)
+    @patch("ntk.command.Command._get_sass_outputs", autospec=True)
+    @patch("ntk.command.Command._delete_templates", autospec=True)
+    @patch("ntk.command.Command._push_templates", autospec=True)
+    @patch("ntk.command.get_git_changes", autospec=True)
+    def test_push_command_with_since_should_only_push_and_delete_git_changes(
+        self, mock_get_git_changes, mock_push_templates, mock_delete_templates, mock_get_sass_outputs,
+        mock_compile_sass
+    ):
+        mock_get_git_changes.return_value = (['layouts/base.html', 'sass/_variables.scss'], ['assets/old.js'])
+        mock_get_sass_outputs.return_value = ['assets/main.css']
+        self.parser.all_envs = False
+        self.parser.since = 'origin/main'
+
+        self.command.push(self.parser)
+
+        mock_get_git_changes.assert_called_once_with('origin/main')
+        mock_compile_sass.assert_called_once_with(self.command)
+        mock_push_templates.assert_called_once_with(
+            self.command, ['layouts/base.html', 'sass/_variables.scss', 'assets/main.css'])
+        mock_delete_templates.assert_called_once_with(self.command, ['assets/old.js'])
+
+    @patch("ntk.command.Command._record_snapshot", autospec=True)
+    @patch("ntk.command.Command._compile_sass", autospec=True)
+    @patch("ntk.command.Command._get_sass_outputs", autospec=True)
+    @patch("ntk.command.Command._read_template", autospec=True)
+    @patch("ntk.command.Command._get_env_command", autospec=True)
+    @patch("ntk.command.Command._get_accept_files", autospec=True)
+    @patch("ntk.command.get_git_changes", autospec=True)
+    def test_push_command_with_since_and_multiple_envs_should_read_changes_once_and_push_them_concurrently(
+        self, mock_get_git_changes, mock_get_accept_file, mock_get_env_command, mock_read_template,
+        mock_get_sass_outputs, mock_compile_sass, mock_record_snapshot
+    ):
+        mock_get_git_changes.return_value = (['layouts/base.html', 'sass/_variables.scss'], ['assets/old.js'])
+        mock_get_sass_outputs.return_value = ['assets/main.css']
+        mock_get_accept_file.side_effect = lambda command, template_names: list(template_names)
+        mock_read_template.side_effect = lambda command, template_name, optimized: (b'content', {})
+        targets = self.get_env_targets({'staging': True, 'production': True})
+        for target in targets.values():
+            target.gateway.delete_template.return_value = MagicMock(ok=True, status_code=204)
+        mock_get_env_command.side_effect = lambda command, env, parser: targets[env]
+
+        self.parser.env = 'staging,production'
+        self.parser.apikey = self.parser.store = self.parser.theme_id = None
+        self.parser.all_envs = False
+        self.parser.since = 'origin/main'
+        self.parser.no_snapshot = False
+        self.parser.sass_output_style = 'compressed'
+        self.command.push(self.parser)
+
+        mock_get_git_changes.assert_called_once_with('origin/main')
+        mock_compile_sass.assert_called_once_with(self.command)
+        self.assertEqual(self.command.config.sass_output_style, 'compressed')
+        self.assertEqual(mock_read_template.call_count, 3)
+        for target in targets.values():
+            self.assertEqual(
+                sorted(call.kwargs['template_name'] for call in target.gateway.create_or_update_template.mock_calls),
+                ['assets/main.css', 'layouts/base.html', 'sass/_variables.scss'])
+            target.gateway.delete_template.assert_called_once_with(theme_id=1, template_name='assets/old.js')
+        self.assertEqual(
+            sorted((command.config.env, deleted) for command, pushed, deleted in (
+                call.args for call in mock_record_snapshot.mock_calls)),
+            [('production', ['assets/old.js']), ('staging', ['assets/old.js'])])
+
+    def test_push_templates_with_max_file_size_should_upload_nothing_when_a_file_is_larger(self):
+        self.parser.max_file_size = 1
+        self.command.config.parser_config(self.parser)
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('assets')
+                with open('assets/video.mp4', 'wb') as f:
+                    f.write(b'0' * 2048)
+
+                with self.assertLogs(level='ERROR') as log:
+                    pushed = self.command._push_templates(['assets/video.mp4'])
+            finally:
+                os.chdir(cwd)
+
+        self.assertIsNone(pushed)
+        self.mock_gateway.return_value.create_or_update_template.assert_not_called()
+        self.assertIn(
+            'ERROR:root:[development] assets/video.mp4: 2048 bytes, larger than max_file_size of 1 KB', log.output)
+
+    def test_push_templates_with_invalid_file_should_upload_nothing(self):
+        self.command.config.parser_config(self.parser)
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('layouts')
+                os.makedirs('locales')
+                with open('layouts/base.html', 'w') as f:
+                    f.write('<div>base</div>')
+                with open('locales/en.json', 'w') as f:
+                    f.write('{"title": ')
+
+                with self.assertLogs(level='ERROR') as log:
+                    pushed = self.command._push_templates(['layouts/base.html', 'locales/en.json'])
+            finally:
+                os.chdir(cwd)
+
+        self.assertIsNone(pushed)
+        self.mock_gateway.return_value.create_or_update_template.assert_not_called()
+        self.assertIn(
+            'ERROR:root:[development] Nothing was uploaded, fix the files above and push again', log.output)
+        self.assertTrue(any('locales/en.json: not valid JSON' in line for line in log.output))
+
+    def test_push_templates_with_optimize_should_upload_optimized_copy(self):
+        self.command.config.parser_config(self.parser)
+        self.command.config.optimize = True
+        self.mock_gateway.return_value.create_or_update_template.return_value.ok = True
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('locales')
+                with open('locales/en.json', 'w') as f:
+                    f.write('{\n    "title": "Home"\n}\n')
+
+                self.command._push_templates(['locales/en.json'])
+                original_hash = get_file_hash('locales/en.json')
+            finally:
+                os.chdir(cwd)
+
+        self.mock_gateway.return_value.create_or_update_template.assert_called_once_with(
+            theme_id=1234, template_name='locales/en.json', content=b'{"title":"Home"}', files={})
+        # watch keeps comparing against the theme file, not the optimized copy
+        self.assertEqual(self.command._content_hashes['locales/en.json'], original_hash)
+
+    def test_push_templates_without_optimize_should_upload_theme_file_after_an_optimized_push(self):
+        self.command.config.parser_config(self.parser)
+        self.command.config.optimize = True
+        self.mock_gateway.return_value.create_or_update_template.return_value.ok = True
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('configs')
+                with open('configs/a.json', 'w') as f:
+                    f.write('{\n    "v": 1\n}\n')
+                self.command._push_templates(['configs/a.json'])
+
+                with open('configs/a.json', 'w') as f:
+                    f.write('{"v": 2}\n')
+                self.command.config.optimize = False
+                self.command._push_templates(['configs/a.json'])
+            finally:
+                os.chdir(cwd)
+
+        upload_calls = self.mock_gateway.return_value.create_or_update_template.call_args_list
+        self.assertEqual([call.kwargs['content'] for call in upload_calls], [b'{"v":1}', b'{"v": 2}\n'])
+
     #####
     # watch (_handle_files_change)
     #####
+    @patch("ntk.command.validate_files", MagicMock(return_value={}))
     @patch("ntk.command.Command._get_accept_files", autospec=True)
     def test_watch_command_should_call_gateway_with_correct_arguments_belong_to_files_change(
         self, mock_get_accept_file
@@ -391,6 +827,490 @@ class TestCommand(unittest.TestCase):
             self.command._handle_files_change(changes)
             mock_compile_sass.assert_called_once()
 
+    def test_watch_command_with_unchanged_content_should_skip_upload(self):
+        self.command.config.parser_config(self.parser)
+        self.mock_gateway.return_value.create_or_update_template.return_value.ok = True
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('layouts')
+                with open('layouts/base.html', 'w') as f:
+                    f.write('<div>My home page</div>')
+
+                self.command._handle_files_change([(Change.added, './layouts/base.html')])
+                # editor saves the file without changing it
+                self.command._handle_files_change([(Change.modified, './layouts/base.html')])
+            finally:
+                os.chdir(cwd)
+
+        self.mock_gateway.return_value.create_or_update_template.assert_called_once_with(
+            theme_id=1234, template_name='layouts/base.html', content=b'<div>My home page</div>', files={})
+
+    def test_watch_command_with_sass_change_should_upload_compiled_css_once(self):
+        self.command.config.parser_config(self.parser)
+        self.mock_gateway.return_value.create_or_update_template.return_value.ok = True
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('sass')
+                os.makedirs('assets')
+                with open('sass/main.scss', 'w') as f:
+                    f.write('$color: red;\nbody { color: $color; }\n')
+
+                self.command._handle_files_change([(Change.modified, './sass/main.scss')])
+                # file change event caused by compiling sass
+                self.command._handle_files_change([(Change.added, './assets/main.css')])
+            finally:
+                os.chdir(cwd)
+
+        uploaded = [
+            gateway_call.kwargs['template_name']
+            for gateway_call in self.mock_gateway.return_value.create_or_update_template.mock_calls
+        ]
+        self.assertEqual(uploaded, ['assets/main.css', 'sass/main.scss'])
+
+    def test_watch_command_with_failed_compiled_css_upload_should_upload_it_once_store_is_back(self):
+        self.command.config.parser_config(self.parser)
+        mock_create_or_update_template = self.mock_gateway.return_value.create_or_update_template
+        mock_create_or_update_template.side_effect = ConnectionError('Connection refused')
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('sass')
+                os.makedirs('assets')
+                with open('sass/main.scss', 'w') as f:
+                    f.write('$color: red;\nbody { color: $color; }\n')
+                self.command._offline_queue = OfflineQueue('development', 1234)
+
+                with self.assertRaises(ConnectionError):
+                    self.command._handle_files_change([(Change.modified, './sass/main.scss')])
+                call_count = mock_create_or_update_template.call_count
+                # file change event caused by compiling sass, the compiled css is already queued
+                self.command._handle_files_change([(Change.added, './assets/main.css')])
+                self.assertEqual(mock_create_or_update_template.call_count, call_count)
+
+                mock_create_or_update_template.side_effect = None
+                mock_create_or_update_template.return_value = MagicMock(ok=True, status_code=200)
+                mock_create_or_update_template.reset_mock()
+                self.command._sync_changes(self.command._offline_queue.get_changes())
+            finally:
+                os.chdir(cwd)
+
+        uploaded = sorted(
+            gateway_call.kwargs['template_name'] for gateway_call in mock_create_or_update_template.mock_calls)
+        self.assertEqual(uploaded, ['assets/main.css', 'sass/main.scss'])
+        self.assertEqual(len(self.command._offline_queue), 0)
+
+    def test_sync_changes_should_only_push_and_delete_differences(self):
+        self.command.config.parser_config(self.parser)
+        self.mock_gateway.return_value.create_or_update_template.return_value.ok = True
+        self.mock_gateway.return_value.delete_template.return_value.ok = True
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('layouts')
+                for name in ['unchanged', 'changed', 'added']:
+                    with open(f'layouts/{name}.html', 'w') as f:
+                        f.write(name)
+                self.command._content_hashes = {
+                    'layouts/unchanged.html': get_file_hash('layouts/unchanged.html'),
+                    'layouts/changed.html': 'previous hash',
+                    'layouts/deleted.html': 'previous hash',
+                }
+
+                self.command._sync_changes([
+                    (Change.modified, './layouts/unchanged.html'),
+                    (Change.modified, './layouts/changed.html'),
+                    (Change.added, './layouts/added.html'),
+                    (Change.deleted, './layouts/deleted.html'),
+                ])
+            finally:
+                os.chdir(cwd)
+
+        uploaded = sorted(
+            gateway_call.kwargs['template_name']
+            for gateway_call in self.mock_gateway.return_value.create_or_update_template.mock_calls
+        )
+        self.assertEqual(uploaded, ['layouts/added.html', 'layouts/changed.html'])
+        self.mock_gateway.return_value.delete_template.assert_called_once_with(
+            theme_id=1234, template_name='layouts/deleted.html')
+        self.assertNotIn('layouts/deleted.html', self.command._content_hashes)
+
+    def test_watch_command_should_record_latency_of_confirmed_changes(self):
+        self.command.config.parser_config(self.parser)
+        responses = {
+            'layouts/ok.html': MagicMock(ok=True, status_code=201),
+            'layouts/invalid.html': MagicMock(ok=False, status_code=400),
+        }
+        self.mock_gateway.return_value.create_or_update_template.side_effect = (
+            lambda **kwargs: responses[kwargs['template_name']])
+        self.mock_gateway.return_value.delete_template.return_value.ok = True
+        self.command._latency = LatencyRecorder()
+        self.command._live_changes = []
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('layouts')
+                for name in responses:
+                    with open(name, 'w') as f:
+                        f.write(name)
+                    self.command._detected_at[name] = time.time()
+
+                self.command._handle_files_change([(Change.modified, './layouts/ok.html')])
+                self.command._handle_files_change([(Change.modified, './layouts/invalid.html')])
+                self.command._handle_files_change([(Change.deleted, './layouts/deleted.html')])
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual([name for name, _ in self.command._live_changes], ['layouts/ok.html', 'layouts/deleted.html'])
+        self.assertGreaterEqual(self.command._live_changes[0][1], 0)
+        self.assertIsNone(self.command._live_changes[1][1])
+        self.assertEqual(len(self.command._latency), 1)
+
+    def test_sync_changes_with_offline_queue_should_keep_changes_the_store_did_not_take(self):
+        self.command.config.parser_config(self.parser)
+        responses = {
+            'layouts/ok.html': MagicMock(ok=True, status_code=201),
+            'layouts/invalid.html': MagicMock(ok=False, status_code=400),
+            'layouts/unavailable.html': MagicMock(ok=False, status_code=503),
+        }
+
+        def create_or_update_template(theme_id, template_name, content, files):
+            if template_name == 'layouts/offline.html':
+                raise ConnectionError('Connection refused')
+            return responses[template_name]
+
+        self.mock_gateway.return_value.create_or_update_template.side_effect = create_or_update_template
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('layouts')
+                for name in ['ok', 'invalid', 'unavailable', 'offline']:
+                    with open(f'layouts/{name}.html', 'w') as f:
+                        f.write(name)
+                self.command._offline_queue = OfflineQueue('development', 1234)
+
+                with self.assertRaises(ConnectionError):
+                    self.command._sync_changes([
+                        (Change.modified, f'./layouts/{name}.html')
+                        for name in ['ok', 'invalid', 'unavailable', 'offline']
+                    ])
+                self.command._offline_queue.save()
+                queued = OfflineQueue('development', 1234).changes
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(queued, {'layouts/unavailable.html': 'push', 'layouts/offline.html': 'push'})
+
+    def test_poll_remote_changes_should_pull_remote_edits_and_report_conflicts(self):
+        self.command.config.parser_config(self.parser)
+        mock_get_templates = self.mock_gateway.return_value.get_templates
+
+        def listing(contents, etag):
+            response = MagicMock(ok=True, status_code=200, headers={'ETag': etag})
+            response.json.return_value = [
+                {'name': name, 'content': content, 'file': None} for name, content in contents.items()]
+            return response
+
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('layouts')
+                for name in ['base', 'page', 'cart']:
+                    with open(f'layouts/{name}.html', 'w') as f:
+                        f.write(f'{name} v1')
+
+                # the first poll only records the state of both sides
+                mock_get_templates.return_value = listing(
+                    {'layouts/base.html': 'base v1', 'layouts/page.html': 'page v1', 'layouts/cart.html': 'cart v1'},
+                    '"1"')
+                self.command._poll_remote_changes()
+                self.assertEqual(sorted(os.listdir('layouts')), ['base.html', 'cart.html', 'page.html'])
+
+                # an unchanged listing costs an empty response
+                mock_get_templates.return_value = MagicMock(ok=True, status_code=304)
+                self.command._poll_remote_changes()
+                mock_get_templates.assert_called_with(theme_id=1234, etag='"1"')
+
+                # base is edited in the store, page both in the store and locally
+                with open('layouts/page.html', 'w') as f:
+                    f.write('page local edit')
+                mock_get_templates.return_value = listing(
+                    {'layouts/base.html': 'base v2', 'layouts/page.html': 'page v2', 'layouts/cart.html': 'cart v1'},
+                    '"2"')
+                with self.assertLogs(level='INFO') as log:
+                    self.command._poll_remote_changes()
+
+                contents = {}
+                for name in ['base.html', 'page.html', 'page.html.remote', 'cart.html']:
+                    with open(f'layouts/{name}') as f:
+                        contents[name] = f.read()
+                base_hash = get_file_hash('layouts/base.html')
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(contents, {
+            'base.html': 'base v2', 'page.html': 'page local edit', 'page.html.remote': 'page v2',
+            'cart.html': 'cart v1'
+        })
+        # the pulled file is not uploaded back by watch
+        self.assertEqual(self.command._content_hashes['layouts/base.html'], base_hash)
+        self.assertIn('INFO:root:[development] Pulling layouts/base.html changed in the store', log.output)
+        self.assertIn(
+            'WARNING:root:[development] layouts/page.html was changed both locally and in the store, '
+            'the store version is saved to layouts/page.html.remote', log.output)
+        self.mock_gateway.return_value.create_or_update_template.assert_not_called()
+
+    #####
+    # rollback
+    #####
+    def test_push_then_rollback_should_only_upload_files_changed_since_snapshot(self):
+        self.command.config.parser_config(self.parser)
+        mock_gateway = self.mock_gateway.return_value
+        mock_gateway.create_or_update_template.return_value = MagicMock(ok=True, headers={})
+        mock_gateway.delete_template.return_value = MagicMock(ok=True)
+        self.parser.since = None
+        self.parser.no_snapshot = False
+        self.parser.filenames = []
+        self.parser.all_envs = False
+        self.parser.env = 'development'
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('layouts')
+                for name in ['base', 'page']:
+                    with open(f'layouts/{name}.html', 'w') as f:
+                        f.write(f'{name} v1')
+                with patch('ntk.conf.Config.write_config'):
+                    self.command.push(self.parser)
+                    snapshot_id = SnapshotStore('development').find('latest')
+
+                    # a bad deploy changes page and adds a template
+                    with open('layouts/page.html', 'w') as f:
+                        f.write('page v2')
+                    with open('layouts/new.html', 'w') as f:
+                        f.write('new')
+                    self.command.push(self.parser)
+
+                    mock_gateway.create_or_update_template.reset_mock()
+                    mock_gateway.get_templates.return_value = MagicMock(ok=True)
+                    mock_gateway.get_templates.return_value.json.return_value = [
+                        {'name': 'layouts/base.html', 'content': 'base v1', 'file': None},
+                        {'name': 'layouts/page.html', 'content': 'page v2', 'file': None},
+                        {'name': 'layouts/new.html', 'content': 'new', 'file': None},
+                    ]
+                    self.parser.snapshot = snapshot_id
+                    with self.assertLogs(level='INFO') as log:
+                        self.command.rollback(self.parser)
+                    snapshot_count = len(SnapshotStore('development').get_snapshot_ids())
+            finally:
+                os.chdir(cwd)
+
+        mock_gateway.create_or_update_template.assert_called_once_with(
+            theme_id=1234, template_name='layouts/page.html', content=b'page v1', files={})
+        mock_gateway.delete_template.assert_called_once_with(theme_id=1234, template_name='layouts/new.html')
+        self.assertIn(
+            f'INFO:root:[development] Theme id 1234 is back to snapshot {snapshot_id}', log.output)
+        self.assertEqual(snapshot_count, 3)
+
+    def test_rollback_with_unknown_snapshot_should_raise_error(self):
+        self.parser.snapshot = 'unknown'
+        with tempfile.TemporaryDirectory() as tmpdir, patch('ntk.conf.Config.write_config'):
+            cwd = os.getcwd()
+            os.chdir(tmpdir)
+            try:
+                with self.assertRaises(TypeError) as error:
+                    self.command.rollback(self.parser)
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(
+            str(error.exception), '[development] Snapshot unknown not found, run ntk rollback to list them')
+
+    #####
+    # mirror
+    #####
+    @patch("ntk.command.ThemeMirror", autospec=True)
+    @patch("ntk.command.Config.write_config", autospec=True)
+    def test_mirror_command_should_mirror_filtered_themes(self, mock_write_config, mock_theme_mirror):
+        self.mock_gateway.return_value.get_themes.return_value.ok = True
+        self.mock_gateway.return_value.get_themes.return_value.json.return_value = {
+            'results': [
+                {'id': 1234, 'name': 'Default Theme'}, {'id': 1235, 'name': 'Staging'}, {'id': 7, 'name': 'Old'}
+            ]
+        }
+        self.parser.themes = '1234, Stag*'
+        self.parser.directory = 'backup'
+
+        with self.assertLogs(level='INFO'):
+            self.command.mirror(self.parser)
+
+        mock_theme_mirror.assert_called_once_with(self.command.gateway, 'backup', 'development')
+        mock_theme_mirror.return_value.mirror.assert_called_once_with(
+            [{'id': 1234, 'name': 'Default Theme'}, {'id': 1235, 'name': 'Staging'}])
+
+    #####
+    # export and import
+    #####
+    @patch("ntk.command.ThemeExport", autospec=True)
+    @patch("ntk.command.Config.write_config", autospec=True)
+    def test_export_command_should_export_theme_templates(self, mock_write_config, mock_theme_export):
+        templates = [{'name': 'layouts/base.html', 'content': 'base', 'file': None}]
+        self.mock_gateway.return_value.get_templates.return_value.ok = True
+        self.mock_gateway.return_value.get_templates.return_value.json.return_value = templates
+        mock_theme_export.return_value.export.return_value = (1, 0)
+        self.parser.archive = 'theme.zip'
+
+        with self.assertLogs(level='INFO') as log:
+            self.command.export(self.parser)
+
+        self.mock_gateway.return_value.get_templates.assert_called_once_with(theme_id=1234)
+        mock_theme_export.assert_called_once_with(self.command.gateway, 'theme.zip', 'development')
+        mock_theme_export.return_value.export.assert_called_once_with(templates)
+        self.assertIn('INFO:root:[development] Exported 1 files into theme.zip, 0 failed', log.output)
+
+    @patch("ntk.command.Config.write_config", autospec=True)
+    def test_import_command_should_upload_theme_files_of_archive(self, mock_write_config):
+        self.mock_gateway.return_value.create_or_update_template.return_value.ok = True
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.parser.archive = os.path.join(tmpdir, 'theme.zip')
+            with zipfile.ZipFile(self.parser.archive, 'w') as archive:
+                archive.writestr('layouts/base.html', 'base')
+                archive.writestr('assets/logo.png', b'\x89PNG')
+                archive.writestr('config.yml', 'apikey: secret')
+
+            with self.assertLogs(level='INFO'):
+                self.command.import_theme(self.parser)
+
+        self.mock_gateway.return_value.create_or_update_template.assert_has_calls([
+            call(theme_id=1234, template_name='layouts/base.html', content=b'base', files={}),
+            call(theme_id=1234, template_name='assets/logo.png', content='',
+                 files={'file': ('assets/logo.png', b'\x89PNG')}),
+        ], any_order=True)
+        self.assertEqual(self.mock_gateway.return_value.create_or_update_template.call_count, 2)
+
+    @patch("ntk.command.Config.write_config", autospec=True)
+    def test_import_command_with_invalid_archive_should_raise_error(self, mock_write_config):
+        self.parser.archive = 'missing.zip'
+        with self.assertRaises(TypeError) as error:
+            self.command.import_theme(self.parser)
+        self.assertIn('[development] argument archive: missing.zip is not a zip archive', str(error.exception))
+
+    #####
+    # ls, grep and diff
+    #####
+    def set_remote_templates(self, templates):
+        response = self.mock_gateway.return_value.get_templates.return_value
+        response.ok = True
+        response.status_code = 200
+        response.headers = {'ETag': '"v1"'}
+        response.json.return_value = templates
+
+    @patch("ntk.command.Config.write_config", autospec=True)
+    def test_ls_and_grep_commands_should_answer_from_index(self, mock_write_config):
+        self.set_remote_templates([
+            {'name': 'layouts/base.html', 'content': '{% include "partials/header.html" %}', 'file': None},
+            {'name': 'partials/header.html', 'content': '<header></header>', 'file': None},
+        ])
+        self.parser.refresh = False
+        self.parser.filenames = []
+        self.parser.pattern = 'partials/header'
+        self.parser.ignore_case = False
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                with self.assertLogs(level='INFO') as ls_log:
+                    self.command.ls(self.parser)
+                with self.assertLogs(level='INFO') as grep_log:
+                    self.command.grep(self.parser)
+            finally:
+                os.chdir(cwd)
+
+        # the index is fresh, the second command does not ask the store again
+        self.mock_gateway.return_value.get_templates.assert_called_once_with(theme_id=1234, etag=None)
+        self.assertIn('INFO:root:[development] 2 files in theme id 1234', ls_log.output)
+        self.assertEqual(grep_log.output, [
+            'INFO:root:[development] layouts/base.html:1: {% include "partials/header.html" %}'])
+
+    @patch("ntk.command.Config.write_config", autospec=True)
+    def test_ls_command_with_unreachable_store_should_answer_from_stale_index(self, mock_write_config):
+        self.set_remote_templates([{'name': 'layouts/base.html', 'content': '<html></html>', 'file': None}])
+        self.parser.filenames = []
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                self.parser.refresh = True
+                mock_get_templates = self.mock_gateway.return_value.get_templates
+                mock_get_templates.side_effect = requests.exceptions.ConnectionError('Connection refused')
+                with self.assertRaises(TypeError) as error:
+                    self.command.ls(self.parser)
+
+                mock_get_templates.side_effect = None
+                self.command.ls(self.parser)
+                mock_get_templates.side_effect = requests.exceptions.ConnectionError('Connection refused')
+                with self.assertLogs(level='INFO') as cm:
+                    self.command.ls(self.parser)
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(
+            str(error.exception),
+            '[development] Theme id 1234 is not indexed yet and the store could not be reached, Connection refused')
+        self.assertTrue(cm.output[0].startswith(
+            'WARNING:root:[development] Index of theme id 1234 could not be refreshed, using the index of '))
+        self.assertIn('INFO:root:[development] 1 files in theme id 1234', cm.output)
+
+    @patch("ntk.command.Config.write_config", autospec=True)
+    def test_grep_command_with_invalid_pattern_should_raise_error(self, mock_write_config):
+        self.parser.pattern = '(unclosed'
+        with self.assertRaises(TypeError) as error:
+            self.command.grep(self.parser)
+        self.assertIn('[development] argument pattern is not a valid regular expression', str(error.exception))
+
+    @patch("ntk.command.Config.write_config", autospec=True)
+    def test_diff_command_should_compare_local_files_with_index(self, mock_write_config):
+        self.set_remote_templates([
+            {'name': 'layouts/base.html', 'content': '<div>remote</div>\n', 'file': None},
+            {'name': 'layouts/same.html', 'content': '<div>same</div>', 'file': None},
+            {'name': 'layouts/removed.html', 'content': '<div>removed</div>', 'file': None},
+        ])
+        self.parser.refresh = True
+        self.parser.filenames = []
+        self.parser.patch = True
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                os.makedirs('layouts')
+                for name, content in [('base', '<div>local</div>\n'), ('same', '<div>same</div>'), ('new', '')]:
+                    with open(f'layouts/{name}.html', 'w') as f:
+                        f.write(content)
+
+                with self.assertLogs(level='INFO') as log, patch('sys.stdout') as mock_stdout:
+                    self.command.diff(self.parser)
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(log.output, [
+            'INFO:root:[development] \tmodified    \tlayouts/base.html',
+            'INFO:root:[development] \tlocal only  \tlayouts/new.html',
+            'INFO:root:[development] \tremote only \tlayouts/removed.html',
+            'INFO:root:[development] 3 files differ from theme id 1234',
+        ])
+        patch_lines = [line for (lines,), _ in mock_stdout.writelines.call_args_list for line in lines]
+        self.assertEqual(patch_lines[:5], [
+            '--- remote/layouts/base.html\n', '+++ local/layouts/base.html\n', '@@ -1 +1 @@\n',
+            '-<div>remote</div>\n', '+<div>local</div>\n'])
+
     #####
     # sass
     #####
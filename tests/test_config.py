@@ -144,13 +144,41 @@ class TestConfig(unittest.TestCase):
         mock_validate_config.assert_called_once()
         mock_write_config.assert_not_called()
 
+    def test_validate_config_with_invalid_rate_limit_should_raise_error(self):
+        self.config.rate_limit = -1
+        with self.assertRaises(TypeError) as error:
+            self.config.validate_config()
+        self.assertEqual(
+            str(error.exception),
+            '[development] argument -rl/--rate_limit must be a positive number of requests per second')
+
+    def test_validate_config_with_invalid_max_bandwidth_should_raise_error(self):
+        self.config.max_bandwidth = '2M'
+        with self.assertRaises(TypeError) as error:
+            self.config.validate_config()
+        self.assertEqual(
+            str(error.exception),
+            '[development] argument -bw/--max_bandwidth must be a positive number of kilobytes per second')
+
+    def test_validate_config_with_invalid_max_file_size_should_raise_error(self):
+        self.config.max_file_size = '5M'
+        with self.assertRaises(TypeError) as error:
+            self.config.validate_config()
+        self.assertEqual(
+            str(error.exception), '[development] argument -mfs/--max_file_size must be a positive number of kilobytes')
+
     def test_parser_config_should_set_config_config_correctly(self):
         config = {
             'env': 'sandbox',
             'apikey': '2b78f637972b1c9d1234',
             'store': 'http://sandbox.com',
             'theme_id': 1234,
-            'sass_output_style': 'nested'
+            'sass_output_style': 'nested',
+            'rate_limit': None,
+            'gzip': False,
+            'optimize': False,
+            'max_bandwidth': None,
+            'max_file_size': None
         }
         parser = MagicMock(**config)
 
@@ -171,3 +199,15 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(self.config.theme_id, 1234)
         self.assertEqual(self.config.sass_output_style, 'nested')
         mock_write_config.assert_called_once()
+
+    @patch("yaml.load", autospec=True)
+    @patch("os.path.exists", autospec=True)
+    def test_get_envs_should_split_env_list_or_read_all_envs(self, mock_patch_exists, mock_load_yaml):
+        mock_patch_exists.return_value = True
+        mock_load_yaml.return_value = {'staging': {}, 'production': {}}
+
+        self.assertEqual(self.config.get_envs(MagicMock(env='development', all_envs=False)), ['development'])
+        self.assertEqual(
+            self.config.get_envs(MagicMock(env='staging, production', all_envs=False)), ['staging', 'production'])
+        with patch('builtins.open', mock_open(read_data='yaml data')):
+            self.assertEqual(self.config.get_envs(MagicMock(all_envs=True)), ['staging', 'production'])
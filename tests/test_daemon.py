@@ -0,0 +1,129 @@
+import asyncio
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from ntk.daemon import Daemon, forward_to_daemon, get_socket_path
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, 'ntk.sock')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_get_socket_path_should_depend_on_theme_directory(self):
+        with patch.dict(os.environ, {'XDG_RUNTIME_DIR': self.tmpdir.name}):
+            self.assertEqual(get_socket_path('.'), get_socket_path(os.getcwd()))
+            self.assertNotEqual(get_socket_path('.'), get_socket_path(self.tmpdir.name))
+            self.assertEqual(os.path.dirname(get_socket_path('.')), os.path.join(self.tmpdir.name, 'ntk'))
+            self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, 'ntk')))
+
+            self.assertEqual(get_socket_path('.', create=True), get_socket_path('.'))
+        self.assertEqual(os.stat(os.path.join(self.tmpdir.name, 'ntk')).st_mode & 0o777, 0o700)
+
+    def test_get_socket_path_with_directory_open_to_other_users_should_raise_error(self):
+        os.makedirs(os.path.join(self.tmpdir.name, 'ntk'), mode=0o777)
+        os.chmod(os.path.join(self.tmpdir.name, 'ntk'), 0o777)
+        with patch.dict(os.environ, {'XDG_RUNTIME_DIR': self.tmpdir.name}):
+            with self.assertRaises(OSError):
+                get_socket_path('.', create=True)
+            with self.assertRaises(TypeError):
+                Daemon().run()
+
+    @patch('ntk.daemon.logging', autospec=True)
+    def test_forward_to_daemon_without_daemon_should_not_create_private_directory(self, mock_logging):
+        with patch.dict(os.environ, {'XDG_RUNTIME_DIR': self.tmpdir.name}):
+            self.assertFalse(forward_to_daemon(['push', 'layouts/base.html']))
+
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, 'ntk')))
+        self.assertEqual(mock_logging.mock_calls, [])
+
+    @patch('ntk.daemon.socket.socket')
+    @patch('ntk.daemon.get_socket_path')
+    def test_forward_to_daemon_should_not_connect_to_anything_else_than_own_socket(
+        self, mock_get_socket_path, mock_socket
+    ):
+        mock_get_socket_path.return_value = self.socket_path
+        with open(self.socket_path, 'w') as f:
+            f.write('not a socket')
+
+        self.assertFalse(forward_to_daemon(['push', 'layouts/base.html']))
+        mock_socket.assert_not_called()
+
+    @patch('ntk.daemon.get_socket_path')
+    def test_forward_to_daemon_without_daemon_should_return_false(self, mock_get_socket_path):
+        mock_get_socket_path.return_value = self.socket_path
+        self.assertFalse(forward_to_daemon(['push', 'layouts/base.html']))
+        # commands which are not served by the daemon are never forwarded
+        self.assertFalse(forward_to_daemon(['watch']))
+        mock_get_socket_path.assert_called_once()
+
+    @patch('ntk.daemon.get_socket_path')
+    @patch('ntk.ntk.execute', autospec=True)
+    def test_forward_to_daemon_should_run_command_on_daemon_and_stream_output(
+        self, mock_execute, mock_get_socket_path
+    ):
+        mock_get_socket_path.return_value = self.socket_path
+
+        def execute(parser, argv):
+            print(f'executed {" ".join(argv)}')
+            logging.info('uploaded layouts/base.html')
+
+        mock_execute.side_effect = execute
+        daemon = Daemon(socket_path=self.socket_path)
+        loop = asyncio.new_event_loop()
+        serve_task = loop.create_task(daemon.serve())
+
+        def serve():
+            try:
+                loop.run_until_complete(serve_task)
+            except asyncio.CancelledError:
+                pass
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        while not os.path.exists(self.socket_path):
+            time.sleep(0.01)
+
+        output = io.StringIO()
+        with self.assertLogs(level='INFO'):
+            self.assertTrue(forward_to_daemon(['push', 'layouts/base.html'], output=output))
+
+        loop.call_soon_threadsafe(serve_task.cancel)
+        thread.join(5)
+        loop.close()
+
+        self.assertIn('executed push layouts/base.html\n', output.getvalue())
+        self.assertIn('INFO uploaded layouts/base.html\n', output.getvalue())
+        self.assertEqual(mock_execute.call_args.args[1], ['push', 'layouts/base.html'])
+
+    @patch('ntk.command.Command._push_templates', autospec=True)
+    def test_daemon_should_not_keep_theme_arguments_of_previous_requests(self, mock_push_templates):
+        mock_push_templates.return_value = None
+        daemon = Daemon(socket_path=self.socket_path)
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        try:
+            first_output = io.StringIO()
+            daemon._execute(
+                ['push', '-a', 'abcd1234', '-s', 'http://development.com', '-t', '5', 'layouts/base.html'],
+                first_output)
+            second_output = io.StringIO()
+            daemon._execute(['push', 'layouts/base.html'], second_output)
+        finally:
+            os.chdir(cwd)
+
+        mock_push_templates.assert_called_once()
+        self.assertEqual(mock_push_templates.call_args.args[0].config.theme_id, 5)
+        self.assertIn(
+            'argument -a/--apikey, -s/--store, -t/--theme_id are required.', second_output.getvalue())
+        # the connections to the store are kept between requests
+        self.assertIs(mock_push_templates.call_args.args[0].gateway, daemon.gateway)
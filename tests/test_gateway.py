@@ -1,6 +1,8 @@
+import gzip
 import unittest
 from unittest.mock import call, MagicMock, patch
 
+from ntk import gateway as gateway_module
 from ntk.gateway import Gateway
 
 
@@ -15,7 +17,7 @@ class TestGateway(unittest.TestCase):
     #####
     # _request
     #####
-    @patch('ntk.gateway.requests.request', autospec=True)
+    @patch('ntk.gateway.requests.Session.request')
     def test_request(self, mock_request):
         mock_response_200 = MagicMock()
         mock_response_200.status_code = 200
@@ -42,7 +44,7 @@ class TestGateway(unittest.TestCase):
         ]
         assert mock_request.mock_calls == expected_calls
 
-    @patch('ntk.gateway.requests.request', autospec=True)
+    @patch('ntk.gateway.requests.Session.request')
     def test_request_with_rate_limit_should_retry(self, mock_request):
         mock_response_429 = MagicMock()
         mock_response_429.status_code = 429
@@ -82,10 +84,38 @@ class TestGateway(unittest.TestCase):
         ]
         assert mock_request.mock_calls == expected_calls
 
+    @patch('ntk.gateway.requests.Session.request')
+    def test_request_should_report_throttled_response_to_store_limiter(self, mock_request):
+        mock_response_429 = MagicMock(status_code=429)
+        mock_response_429.content.decode.return_value = "throttled"
+        mock_response_200 = MagicMock(status_code=200)
+        mock_request.side_effect = [mock_response_429, mock_response_200]
+
+        with patch.object(Gateway, 'limiter') as mock_limiter:
+            self.gateway._request('GET', 'http://simple.com/api/admin/themes/', apikey=self.apikey)
+
+        self.assertEqual(mock_limiter.record.call_count, 2)
+        self.assertTrue(mock_limiter.record.call_args_list[0].kwargs['overloaded'])
+        self.assertFalse(mock_limiter.record.call_args_list[1].kwargs['overloaded'])
+
+    @patch('ntk.gateway.requests.Session.request')
+    def test_request_should_report_latency_of_text_uploads_only(self, mock_request):
+        mock_request.return_value = MagicMock(status_code=201)
+
+        with patch.object(Gateway, 'limiter') as mock_limiter:
+            self.gateway.create_or_update_template(
+                theme_id=6, template_name='layouts/base.html', content=b'<html></html>', files={})
+            self.gateway.create_or_update_template(
+                theme_id=6, template_name='assets/logo.png', content='', files={'file': ('logo.png', b'\x89PNG')})
+
+        latencies = [record.args[0] for record in mock_limiter.record.call_args_list]
+        self.assertIsNotNone(latencies[0])
+        self.assertIsNone(latencies[1])
+
     #####
     # get_themes
     #####
-    @patch('ntk.gateway.requests.request', autospec=True)
+    @patch('ntk.gateway.requests.Session.request')
     def test_get_themes(self, mock_request):
         # check if call request failed
         mock_request.return_value.ok = True
@@ -109,7 +139,7 @@ class TestGateway(unittest.TestCase):
 
     ####
     # create_theme
-    @patch('ntk.gateway.requests.request', autospec=True)
+    @patch('ntk.gateway.requests.Session.request')
     def test_create_theme(self, mock_request):
         # check if call request failed
         mock_request.return_value.headers = {'content-type': 'text/html'}
@@ -137,7 +167,7 @@ class TestGateway(unittest.TestCase):
     #####
     # get_templates
     #####
-    @patch('ntk.gateway.requests.request', autospec=True)
+    @patch('ntk.gateway.requests.Session.request')
     def test_get_templates(self, mock_request):
         # check if call request failed
         mock_request.return_value.ok = True
@@ -164,7 +194,7 @@ class TestGateway(unittest.TestCase):
     #####
     # get_template
     #####
-    @patch('ntk.gateway.requests.request', autospec=True)
+    @patch('ntk.gateway.requests.Session.request')
     def test_get_template(self, mock_request):
         template_name = 'assets/custom.css'
         # check if call request failed
@@ -190,7 +220,7 @@ class TestGateway(unittest.TestCase):
     #####
     # create_or_update_template
     #####
-    @patch('ntk.gateway.requests.request', autospec=True)
+    @patch('ntk.gateway.requests.Session.request')
     def test_create_or_update_template(self, mock_request):
         # check if call request failed
         with self.assertLogs(level='INFO') as log:
@@ -218,10 +248,165 @@ class TestGateway(unittest.TestCase):
                              headers={'Authorization': 'Bearer apikey'}, data=payload, files=files)
         self.assertIn(expected_call, mock_request.mock_calls)
 
+    @patch('ntk.gateway.requests.Session.request')
+    def test_create_or_update_text_template_should_send_raw_content_in_multipart_part(self, mock_request):
+        mock_request.return_value.ok = True
+        mock_request.return_value.headers = {'content-type': 'application/json'}
+
+        self.gateway.create_or_update_template(
+            theme_id=6, template_name='locales/fr.json', content='{"title": "Référence"}'.encode('utf-8'), files={})
+
+        expected_call = call(
+            'POST', 'http://simple.com/api/admin/themes/6/templates/',
+            headers={'Authorization': 'Bearer apikey'}, data={'name': 'locales/fr.json'},
+            files={'content': (None, '{"title": "Référence"}'.encode('utf-8'), 'text/plain; charset=utf-8')})
+        self.assertEqual(mock_request.mock_calls[0], expected_call)
+
+    @patch('ntk.gateway.requests.Session.request')
+    @patch('ntk.gateway.requests.Session.send')
+    def test_create_or_update_template_with_gzip_should_compress_large_text_content(self, mock_send, mock_request):
+        gateway_module._gzip_support.clear()
+        self.gateway.gzip = True
+        mock_send.return_value.status_code = 201
+        mock_send.return_value.ok = True
+        mock_send.return_value.headers = {'content-type': 'application/json'}
+        content = b'{"title": "Reference"}' * 1000
+
+        self.gateway.create_or_update_template(theme_id=5, template_name='locales/en.json', content=content)
+
+        mock_request.assert_not_called()
+        prepared = mock_send.call_args[0][0]
+        self.assertEqual(prepared.headers['Content-Encoding'], 'gzip')
+        self.assertIn(content, gzip.decompress(prepared.body))
+        self.assertEqual(gateway_module._gzip_support, {'http://simple.com': True})
+
+        # small content is not worth compressing
+        self.gateway.create_or_update_template(theme_id=5, template_name='locales/en.json', content=b'{}')
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual(mock_send.call_count, 1)
+
+    @patch('ntk.gateway.requests.Session.request')
+    @patch('ntk.gateway.requests.Session.send')
+    def test_create_or_update_template_with_gzip_unsupported_should_fall_back_to_plain_body(
+            self, mock_send, mock_request):
+        gateway_module._gzip_support.clear()
+        self.gateway.gzip = True
+        mock_response_415 = MagicMock(status_code=415, ok=False)
+        mock_response_201 = MagicMock(status_code=201, ok=True, headers={'content-type': 'application/json'})
+        bodies = []
+
+        def send(prepared, **kwargs):
+            bodies.append((prepared.headers.get('Content-Encoding'), prepared.body))
+            return [mock_response_415, mock_response_201][len(bodies) - 1]
+
+        mock_send.side_effect = send
+        content = b'body { color: red; }' * 1000
+
+        with self.assertLogs(level='INFO') as log:
+            response = self.gateway.create_or_update_template(
+                theme_id=5, template_name='assets/base.css', content=content)
+
+        self.assertEqual(response, mock_response_201)
+        self.assertEqual(bodies[0][0], 'gzip')
+        self.assertEqual(bodies[1][0], None)
+        self.assertIn(content, bodies[1][1])
+        self.assertEqual(log.output, [
+            'INFO:root:http://simple.com does not accept gzip request bodies, uploading uncompressed.'])
+        self.assertEqual(gateway_module._gzip_support, {'http://simple.com': False})
+
+        # the answer is kept, later uploads are not compressed anymore
+        self.gateway.create_or_update_template(theme_id=5, template_name='assets/base.css', content=content)
+        self.assertEqual(mock_send.call_count, 2)
+        self.assertEqual(mock_request.call_count, 1)
+
+    @patch('ntk.gateway.requests.Session.request')
+    def test_create_or_update_template_with_gzip_should_not_compress_media_files(self, mock_request):
+        gateway_module._gzip_support.clear()
+        self.gateway.gzip = True
+        files = {'file': ('assets/image.jpg', b'\xff' * 100000)}
+
+        self.gateway.create_or_update_template(
+            theme_id=5, template_name='assets/image.jpg', content='', files=files)
+
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual(mock_request.call_args[1]['files'], files)
+
+    @patch('ntk.gateway.requests.Session.request')
+    def test_get_templates_with_etag_should_send_conditional_request(self, mock_request):
+        mock_request.return_value.status_code = 304
+        mock_request.return_value.ok = True
+        mock_request.return_value.headers = {}
+
+        response = self.gateway.get_templates(theme_id=5, etag='"abc"')
+
+        self.assertEqual(response.status_code, 304)
+        mock_request.assert_called_once_with(
+            'GET', 'http://simple.com/api/admin/themes/5/templates/',
+            headers={'If-None-Match': '"abc"', 'Authorization': 'Bearer apikey'}, data={}, files={})
+
+    @patch('ntk.gateway.requests.Session.request')
+    def test_request_with_stream_should_leave_body_unread(self, mock_request):
+        mock_request.return_value.status_code = 200
+
+        self.gateway._request('GET', 'https://cdn.com/assets/video.mp4', stream=True)
+
+        mock_request.assert_called_once_with(
+            'GET', 'https://cdn.com/assets/video.mp4', headers={}, data={}, files={}, stream=True)
+
+    @patch('ntk.gateway.get_bandwidth_limiter', autospec=True)
+    @patch('ntk.gateway.requests.Session.request')
+    @patch('ntk.gateway.requests.Session.send')
+    def test_create_or_update_template_with_max_bandwidth_should_send_media_by_chunks(
+            self, mock_send, mock_request, mock_get_bandwidth_limiter):
+        self.gateway.max_bandwidth = 64
+        mock_send.return_value.status_code = 201
+        mock_send.return_value.headers = {'content-type': 'application/json'}
+        limiter = mock_get_bandwidth_limiter.return_value
+        sent = []
+        mock_send.side_effect = lambda prepared, **kwargs: sent.append(
+            (prepared.headers['Content-Length'], b''.join(prepared.body))) or mock_send.return_value
+
+        files = {'file': ('assets/image.jpg', b'\xff' * 100000)}
+        self.gateway.create_or_update_template(
+            theme_id=5, template_name='assets/image.jpg', content='', files=files)
+
+        mock_get_bandwidth_limiter.assert_called_with(64 * 1024, 'upload')
+        self.assertEqual(int(sent[0][0]), len(sent[0][1]))
+        self.assertIn(b'\xff' * 100000, sent[0][1])
+        self.assertEqual(sum(size for (size,), _ in limiter.consume.call_args_list), len(sent[0][1]))
+        self.assertEqual(limiter.consume.call_count, 2)
+
+        # text templates are not held back
+        self.gateway.create_or_update_template(theme_id=5, template_name='layouts/base.html', content=b'<div>')
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual(limiter.consume.call_count, 2)
+
+    @patch('ntk.gateway.get_bandwidth_limiter', autospec=True)
+    @patch('ntk.gateway.requests.Session.request')
+    def test_request_with_max_bandwidth_should_read_media_downloads_by_chunks(
+            self, mock_request, mock_get_bandwidth_limiter):
+        self.gateway.max_bandwidth = 64
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.iter_content.return_value = iter([b'\x89PNG', b'data'])
+        limiter = mock_get_bandwidth_limiter.return_value
+
+        response = self.gateway._request('GET', 'https://cdn.com/assets/image.png')
+
+        self.assertEqual(response._content, b'\x89PNGdata')
+        mock_request.assert_called_once_with(
+            'GET', 'https://cdn.com/assets/image.png', headers={}, data={}, files={}, stream=True)
+        mock_get_bandwidth_limiter.assert_called_with(64 * 1024, 'download')
+        self.assertEqual(limiter.consume.call_args_list, [call(4), call(4)])
+
+        # store API calls are not held back
+        limiter.reset_mock()
+        self.gateway.get_themes()
+        limiter.consume.assert_not_called()
+
     #####
     # delete_template
     #####
-    @patch('ntk.gateway.requests.request', autospec=True)
+    @patch('ntk.gateway.requests.Session.request')
     def test_delete_template(self, mock_request):
         mock_request.return_value.headers = {'content-type': 'application/json'}
         # check if call request failed
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import time
+import unittest
+
+from ntk.ignore import get_ignore_matcher, IgnoreMatcher
+
+
+class TestIgnoreMatcher(unittest.TestCase):
+    def test_is_ignored_should_follow_gitignore_patterns(self):
+        matcher = IgnoreMatcher([
+            '# generated files\n',
+            '*.map\n',
+            '.*.swp\n',
+            'assets/vendor/\n',
+            '/assets/tests\n',
+            'assets/**/fixtures\n',
+            'assets/img/?.png\n',
+            'assets/[ab].js\n',
+            '\n',
+        ])
+
+        self.assertTrue(matcher.is_ignored('assets/main.css.map'))
+        self.assertTrue(matcher.is_ignored('assets/js/deep/bundle.js.map'))
+        self.assertTrue(matcher.is_ignored('layouts/.base.html.swp'))
+        self.assertTrue(matcher.is_ignored('assets/vendor', is_dir=True))
+        self.assertTrue(matcher.is_ignored('assets/vendor/jquery/jquery.js'))
+        self.assertTrue(matcher.is_ignored('assets/tests/index.js'))
+        self.assertTrue(matcher.is_ignored('assets/js/lib/fixtures/data.json'))
+        self.assertTrue(matcher.is_ignored('assets/img/a.png'))
+        self.assertTrue(matcher.is_ignored('assets/b.js'))
+
+        self.assertFalse(matcher.is_ignored('assets/main.css'))
+        self.assertFalse(matcher.is_ignored('assets/vendor'))
+        self.assertFalse(matcher.is_ignored('assets/js/tests/index.js'))
+        self.assertFalse(matcher.is_ignored('assets/img/ab.png'))
+        self.assertFalse(matcher.is_ignored('assets/c.js'))
+
+    def test_is_ignored_should_let_last_matching_pattern_decide(self):
+        matcher = IgnoreMatcher(['assets/*.js', '!assets/main.js', 'assets/main.js.map'])
+
+        self.assertTrue(matcher.is_ignored('assets/other.js'))
+        self.assertFalse(matcher.is_ignored('assets/main.js'))
+        self.assertTrue(matcher.is_ignored('assets/main.js.map'))
+
+    def test_should_prune_should_keep_directories_a_later_negated_pattern_may_include(self):
+        matcher = IgnoreMatcher(['assets/vendor/', '!assets/vendor/keep.js', 'assets/dist/', 'node_modules/'])
+
+        self.assertFalse(matcher.should_prune('assets/vendor'))
+        self.assertFalse(matcher.is_ignored('assets/vendor/keep.js'))
+        self.assertTrue(matcher.is_ignored('assets/vendor/lib.js'))
+        self.assertTrue(matcher.should_prune('assets/dist'))
+        self.assertTrue(matcher.should_prune('assets/js/node_modules'))
+        self.assertFalse(matcher.should_prune('assets/js'))
+
+        self.assertFalse(IgnoreMatcher(['assets/vendor/', '!*.js']).should_prune('assets/vendor'))
+        self.assertFalse(IgnoreMatcher(['vendor/', '!assets/*/keep.js']).should_prune('assets/vendor'))
+        self.assertTrue(IgnoreMatcher(['!assets/vendor/keep.js', 'assets/vendor/']).should_prune('assets/vendor'))
+
+    def test_is_ignored_without_patterns_should_ignore_nothing(self):
+        matcher = IgnoreMatcher(['# nothing to ignore'])
+        self.assertFalse(matcher)
+        self.assertFalse(matcher.is_ignored('assets/main.js'))
+
+    def test_get_ignore_matcher_should_compile_again_only_when_file_changes(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                self.assertFalse(get_ignore_matcher())
+
+                with open('.ntkignore', 'w') as f:
+                    f.write('*.map\n')
+                matcher = get_ignore_matcher()
+                self.assertTrue(matcher.is_ignored('assets/main.css.map'))
+                self.assertIs(get_ignore_matcher(), matcher)
+
+                time.sleep(0.01)
+                with open('.ntkignore', 'w') as f:
+                    f.write('*.swp\n')
+                self.assertFalse(get_ignore_matcher().is_ignored('assets/main.css.map'))
+            finally:
+                os.chdir(cwd)
@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import MagicMock
+
+from ntk.index import ThemeIndex
+from ntk.utils import get_content_hash
+
+
+class TestThemeIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = ThemeIndex(':memory:')
+        self.gateway = MagicMock(store='http://simple.com')
+        self.listing = [
+            {'name': 'layouts/base.html', 'content': '<html>\n{% include "partials/header.html" %}\n</html>',
+             'file': None, 'updated_at': '2026-10-01T10:00:00'},
+            {'name': 'partials/header.html', 'content': '<header>Shop</header>', 'file': None,
+             'updated_at': '2026-10-01T10:00:00'},
+            {'name': 'assets/logo.png', 'content': '', 'file': 'https://cdn.com/logo.png', 'size': 1024,
+             'updated_at': '2026-10-01T10:00:00'},
+        ]
+        self.set_listing(self.listing, etag='"v1"')
+
+    def tearDown(self):
+        self.index.close()
+
+    def set_listing(self, listing, etag=None, status_code=200):
+        response = self.gateway.get_templates.return_value
+        response.status_code = status_code
+        response.ok = status_code < 400
+        response.headers = {'ETag': etag}
+        response.json.return_value = listing
+
+    def test_refresh_should_index_templates(self):
+        self.assertEqual(self.index.refresh(self.gateway, 5), (3, 0, 0))
+
+        self.gateway.get_templates.assert_called_once_with(theme_id=5, etag=None)
+        self.assertEqual(self.index.get_templates('http://simple.com', 5), [
+            ('assets/logo.png', 1024, None, '2026-10-01T10:00:00', 'https://cdn.com/logo.png'),
+            ('layouts/base.html', 51, get_content_hash(self.listing[0]['content'].encode()), '2026-10-01T10:00:00',
+             None),
+            ('partials/header.html', 21, get_content_hash(b'<header>Shop</header>'), '2026-10-01T10:00:00', None),
+        ])
+        self.assertEqual(
+            [row[0] for row in self.index.get_templates('http://simple.com', 5, ['layouts/*'])],
+            ['layouts/base.html'])
+        self.assertIsNotNone(self.index.get_refreshed_at('http://simple.com', 5))
+        self.assertIsNone(self.index.get_refreshed_at('http://simple.com', 6))
+
+    def test_refresh_should_only_write_changed_templates(self):
+        self.index.refresh(self.gateway, 5)
+
+        # an unchanged listing is answered with an empty 304 response
+        self.set_listing(None, status_code=304)
+        self.assertEqual(self.index.refresh(self.gateway, 5), (0, 0, 0))
+        self.gateway.get_templates.assert_called_with(theme_id=5, etag='"v1"')
+
+        listing = [dict(self.listing[0], content='<html></html>'), self.listing[1]]
+        listing.append({'name': 'locales/en.json', 'content': '{}', 'file': None})
+        self.set_listing(listing, etag='"v2"')
+        self.assertEqual(self.index.refresh(self.gateway, 5), (1, 1, 1))
+        self.assertEqual(self.index.get_content('http://simple.com', 5, 'layouts/base.html'), '<html></html>')
+        self.assertEqual(
+            [row[0] for row in self.index.get_templates('http://simple.com', 5)],
+            ['layouts/base.html', 'locales/en.json', 'partials/header.html'])
+
+    def test_refresh_with_failed_listing_should_keep_index(self):
+        self.index.refresh(self.gateway, 5)
+        self.set_listing(None, status_code=500)
+
+        self.assertIsNone(self.index.refresh(self.gateway, 5))
+        self.assertEqual(len(self.index.get_templates('http://simple.com', 5)), 3)
+
+    def test_grep_should_return_matching_lines(self):
+        self.index.refresh(self.gateway, 5)
+
+        self.assertEqual(
+            self.index.grep('http://simple.com', 5, 'partials/header'),
+            [('layouts/base.html', 2, '{% include "partials/header.html" %}')])
+        self.assertEqual(
+            self.index.grep('http://simple.com', 5, r'<(html|header)>'),
+            [('layouts/base.html', 1, '<html>'), ('partials/header.html', 1, '<header>Shop</header>')])
+        self.assertEqual(self.index.grep('http://simple.com', 5, 'SHOP'), [])
+        self.assertEqual(
+            self.index.grep('http://simple.com', 5, 'SHOP', ignore_case=True),
+            [('partials/header.html', 1, '<header>Shop</header>')])
+        self.assertEqual(self.index.grep('http://simple.com', 5, 'html', patterns=['partials/*']), [])
+
+    def test_grep_should_not_mix_themes(self):
+        self.index.refresh(self.gateway, 5)
+        self.set_listing([{'name': 'layouts/base.html', 'content': 'other', 'file': None}])
+        self.index.refresh(self.gateway, 6)
+
+        self.assertEqual(self.index.grep('http://simple.com', 6, 'include'), [])
+        self.assertEqual(len(self.index.grep('http://simple.com', 5, 'include')), 1)
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from ntk.limiter import (
+    AdaptiveLimiter, BandwidthLimiter, get_bandwidth_limiter, get_limiter, get_shared_limiter, SharedRateLimiter
+)
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    def test_healthy_responses_should_increase_limit_additively(self):
+        limiter = AdaptiveLimiter(initial=2, maximum=4)
+        for _ in range(3):
+            limiter.record(0.1)
+        self.assertEqual(int(limiter.limit), 3)
+        for _ in range(20):
+            limiter.record(0.1)
+        self.assertEqual(int(limiter.limit), 4)
+
+    def test_overloaded_response_should_halve_limit_once_per_window(self):
+        limiter = AdaptiveLimiter(initial=8)
+        limiter.record(0.1)
+        limiter.record(0.1, overloaded=True)
+        self.assertEqual(int(limiter.limit), 4)
+        # the rest of the in flight window fails at the same time
+        limiter.record(0.1, overloaded=True)
+        self.assertEqual(int(limiter.limit), 4)
+
+        with patch('ntk.limiter.time.monotonic', return_value=limiter.last_decrease + 1):
+            limiter.record(None, overloaded=True)
+        self.assertEqual(int(limiter.limit), 2)
+        self.assertEqual([limit for _, limit in limiter.history], [8, 4, 2])
+        self.assertEqual(limiter.summary(), 'concurrency limit 8 -> 2 (min 2, max 8, 2 adjustments)')
+
+    def test_rising_latency_should_decrease_limit(self):
+        limiter = AdaptiveLimiter(initial=8, latency_tolerance=3.0)
+        limiter.record(0.1)
+        limiter.record(1.0)
+        self.assertEqual(int(limiter.limit), 4)
+
+    def test_acquire_should_block_above_limit(self):
+        limiter = AdaptiveLimiter(initial=1)
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def worker():
+            with limiter:
+                acquired.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.release()
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_get_limiter_should_share_limiter_per_store(self):
+        self.assertIs(get_limiter('http://simple.com'), get_limiter('http://simple.com'))
+        self.assertIsNot(get_limiter('http://simple.com'), get_limiter('http://other.com'))
+
+
+class TestSharedRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch('ntk.limiter.time.sleep', autospec=True)
+    @patch('ntk.limiter.time.time', autospec=True, return_value=1000.0)
+    def test_processes_should_divide_rate_fairly(self, mock_time, mock_sleep):
+        first = SharedRateLimiter('http://simple.com', rate=10, state_dir=self.tmpdir.name)
+        second = SharedRateLimiter('http://simple.com', rate=10, state_dir=self.tmpdir.name)
+        second.pid = 'other process'
+
+        # alone, the first process gets the whole budget
+        first.acquire()
+        first.acquire()
+        self.assertAlmostEqual(mock_sleep.call_args_list[-1].args[0], 0.1)
+
+        # once a second process is active, each one gets half of the budget
+        second.acquire()
+        mock_sleep.reset_mock()
+        first.acquire()
+        first.acquire()
+        self.assertAlmostEqual(mock_sleep.call_args_list[-1].args[0], 0.4)
+
+    def test_state_file_should_be_in_private_directory(self):
+        with patch.dict(os.environ, {'XDG_RUNTIME_DIR': self.tmpdir.name}):
+            limiter = SharedRateLimiter('http://simple.com', rate=10)
+        self.assertEqual(os.path.dirname(limiter.state_file), os.path.join(self.tmpdir.name, 'ntk'))
+
+    def test_get_shared_limiter_without_rate_should_return_none(self):
+        self.assertIsNone(get_shared_limiter('http://simple.com', None))
+        with patch.dict(os.environ, {'XDG_RUNTIME_DIR': self.tmpdir.name}):
+            self.assertIs(get_shared_limiter('http://simple.com', 5), get_shared_limiter('http://simple.com', 5))
+
+
+class TestBandwidthLimiter(unittest.TestCase):
+    @patch('ntk.limiter.time.sleep', autospec=True)
+    @patch('ntk.limiter.time.monotonic', autospec=True, return_value=100.0)
+    def test_consume_should_wait_for_bucket_to_refill(self, mock_monotonic, mock_sleep):
+        limiter = BandwidthLimiter(rate=1000)
+
+        # a full bucket covers one second worth of bytes
+        limiter.consume(1000)
+        mock_sleep.assert_not_called()
+
+        # each caller reserves its bytes, the next one waits behind the previous ones
+        limiter.consume(500)
+        self.assertAlmostEqual(mock_sleep.call_args.args[0], 0.5)
+        limiter.consume(500)
+        self.assertAlmostEqual(mock_sleep.call_args.args[0], 1.0)
+
+        # idle time refills the bucket, never above one second worth of bytes
+        mock_sleep.reset_mock()
+        mock_monotonic.return_value = 200.0
+        limiter.consume(1000)
+        mock_sleep.assert_not_called()
+
+    def test_get_bandwidth_limiter_should_share_limiter_per_direction(self):
+        self.assertIsNone(get_bandwidth_limiter(None, 'upload'))
+        self.assertIs(get_bandwidth_limiter(1024, 'upload'), get_bandwidth_limiter(1024, 'upload'))
+        self.assertIsNot(get_bandwidth_limiter(1024, 'upload'), get_bandwidth_limiter(1024, 'download'))
@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+
+from ntk.live_reload import LiveReloadServer
+
+
+class TestLiveReloadServer(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.server = LiveReloadServer(port=0)
+        self.loop.run_until_complete(self.server.start())
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.server.close())
+        self.loop.close()
+
+    async def get(self, path):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.server.port)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+        return reader, writer
+
+    def test_events_should_stream_reload_events_to_every_client(self):
+        async def run():
+            clients = [await self.get('/events'), await self.get('/events?tab=2')]
+            headers = [await reader.readuntil(b'retry: 1000\n\n') for reader, _ in clients]
+            while len(self.server.clients) < 2:
+                await asyncio.sleep(0.01)
+
+            self.assertEqual(self.server.notify(['layouts/base.html', 'assets/main.css']), 2)
+            events = [await reader.readuntil(b'\n\n') for reader, _ in clients]
+
+            for _, writer in clients:
+                writer.close()
+            return headers, events
+
+        headers, events = self.loop.run_until_complete(run())
+
+        self.assertIn(b'Content-Type: text/event-stream', headers[0])
+        self.assertIn(b'Access-Control-Allow-Origin: *', headers[0])
+        self.assertEqual(events, [b'event: reload\ndata: {"files": ["assets/main.css", "layouts/base.html"]}\n\n'] * 2)
+
+    def test_livereload_script_should_subscribe_to_events(self):
+        async def run():
+            reader, writer = await self.get('/livereload.js')
+            response = await reader.read()
+            writer.close()
+            return response
+
+        response = self.loop.run_until_complete(run())
+
+        self.assertTrue(response.startswith(b'HTTP/1.1 200 OK'))
+        self.assertIn(f"new EventSource('http://127.0.0.1:{self.server.port}/events')".encode(), response)
+
+    def test_unknown_path_should_return_not_found(self):
+        async def run():
+            reader, writer = await self.get('/unknown')
+            response = await reader.read()
+            writer.close()
+            return response
+
+        self.assertTrue(self.loop.run_until_complete(run()).startswith(b'HTTP/1.1 404 Not Found'))
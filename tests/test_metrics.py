@@ -0,0 +1,43 @@
+import unittest
+
+from ntk.metrics import get_percentile, LatencyRecorder
+
+
+class TestMetrics(unittest.TestCase):
+    def test_get_percentile_should_return_nearest_rank(self):
+        samples = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+
+        self.assertEqual(get_percentile(samples, 50), 0.5)
+        self.assertEqual(get_percentile(samples, 90), 0.9)
+        self.assertEqual(get_percentile(samples, 99), 1.0)
+        self.assertEqual(get_percentile([0.3], 0), 0.3)
+
+
+class TestLatencyRecorder(unittest.TestCase):
+    def test_record_should_split_latency_by_stage(self):
+        recorder = LatencyRecorder()
+
+        self.assertEqual(recorder.record(100.0, 100.5, 101.0, 102.0), 2.0)
+        # saved again after the change was detected, the stages before the save are empty
+        self.assertEqual(recorder.record(100.0, 99.0, 98.0, 100.25), 0.25)
+
+        self.assertEqual(len(recorder), 2)
+        self.assertEqual(recorder.get_percentiles('detect'), {50: 0.0, 90: 0.5, 99: 0.5})
+        self.assertEqual(recorder.get_percentiles('queue', (50,)), {50: 0.0})
+        self.assertEqual(recorder.get_percentiles('upload', (99,)), {99: 1.0})
+        self.assertEqual(recorder.get_percentiles('total', (50, 99)), {50: 0.25, 99: 2.0})
+
+    def test_summary_should_have_one_line_per_stage(self):
+        recorder = LatencyRecorder(max_samples=2)
+        self.assertEqual(recorder.summary(), [])
+
+        for acknowledged_at in (10.0, 1.0, 2.0):
+            recorder.record(0.0, 0.0, 0.0, acknowledged_at)
+
+        self.assertEqual(len(recorder), 2)
+        self.assertEqual(recorder.summary(), [
+            'save to change detected: p50 0.00s, p90 0.00s, p99 0.00s',
+            'detected to upload started: p50 0.00s, p90 0.00s, p99 0.00s',
+            'upload started to store acknowledgement: p50 1.00s, p90 2.00s, p99 2.00s',
+            'save to store acknowledgement: p50 1.00s, p90 2.00s, p99 2.00s',
+        ])
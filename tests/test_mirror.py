@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from ntk.mirror import match_theme, ThemeMirror
+
+
+class TestThemeMirror(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmpdir.name, 'backup')
+        self.gateway = MagicMock()
+        self.listings = {
+            1: [
+                {'name': 'layouts/base.html', 'content': 'base', 'file': None},
+                {'name': 'assets/logo.png', 'content': '', 'file': 'https://cdn.com/1/assets/logo.png'},
+            ],
+            2: [
+                {'name': 'layouts/base.html', 'content': 'other base', 'file': None},
+                {'name': '../../escape.html', 'content': 'outside', 'file': None},
+            ],
+        }
+
+        def get_templates(theme_id):
+            response = MagicMock(ok=True)
+            response.json.return_value = self.listings[theme_id]
+            return response
+
+        self.gateway.get_templates.side_effect = get_templates
+        self.gateway._request.return_value = MagicMock(ok=True, content=b'\x89PNG')
+        self.themes = [{'id': 1, 'name': 'Default', 'active': True}, {'id': 2, 'name': 'Staging', 'active': False}]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def read(self, *names):
+        with open(os.path.join(self.directory, *names), 'rb') as f:
+            return f.read()
+
+    def test_match_theme_should_match_ids_and_names(self):
+        self.assertTrue(match_theme(self.themes[0], []))
+        self.assertTrue(match_theme(self.themes[0], ['1']))
+        self.assertTrue(match_theme(self.themes[1], ['Stag*']))
+        self.assertFalse(match_theme(self.themes[1], ['1', 'Default']))
+
+    def test_mirror_should_write_every_theme_and_manifest(self):
+        with self.assertLogs(level='INFO'):
+            manifest = ThemeMirror(self.gateway, self.directory, 'development').mirror(self.themes)
+
+        self.assertEqual(self.read('1', 'layouts', 'base.html'), b'base')
+        self.assertEqual(self.read('1', 'assets', 'logo.png'), b'\x89PNG')
+        self.assertEqual(self.read('2', 'layouts', 'base.html'), b'other base')
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, 'escape.html')))
+        self.gateway._request.assert_called_once_with('GET', 'https://cdn.com/1/assets/logo.png')
+
+        with open(os.path.join(self.directory, 'manifest.json')) as f:
+            self.assertEqual(json.load(f), manifest)
+        self.assertEqual(sorted(manifest['themes']), ['1', '2'])
+        self.assertEqual(manifest['themes']['1']['name'], 'Default')
+        self.assertEqual(manifest['themes']['1']['files']['assets/logo.png']['size'], 4)
+        self.assertTrue(manifest['themes']['1']['complete'])
+
+    def test_mirror_again_should_skip_unchanged_files_and_remove_deleted_ones(self):
+        mirror = ThemeMirror(self.gateway, self.directory, 'development')
+        with self.assertLogs(level='INFO'):
+            mirror.mirror(self.themes[:1])
+
+        self.listings[1] = [{'name': 'layouts/base.html', 'content': 'base v2', 'file': None}]
+        with self.assertLogs(level='INFO') as log:
+            mirror.mirror(self.themes[:1])
+
+        self.assertEqual(self.read('1', 'layouts', 'base.html'), b'base v2')
+        self.assertFalse(os.path.exists(os.path.join(self.directory, '1', 'assets', 'logo.png')))
+        self.assertEqual(self.gateway._request.call_count, 1)
+        self.assertIn(
+            'INFO:root:[development] Mirrored theme id 1 "Default": 1 files, 1 updated, 0 unchanged, 0 failed',
+            log.output)
+
+        self.listings[1].append({'name': 'assets/logo.png', 'content': '', 'file': 'https://cdn.com/1/logo.png'})
+        with self.assertLogs(level='INFO') as log:
+            mirror.mirror(self.themes[:1])
+        self.assertIn(
+            'INFO:root:[development] Mirrored theme id 1 "Default": 2 files, 1 updated, 1 unchanged, 0 failed',
+            log.output)
+
+    def test_mirror_with_failed_download_should_keep_previous_entry_and_report_it(self):
+        self.gateway._request.return_value = MagicMock(ok=False, status_code=404)
+        with self.assertLogs(level='INFO') as log:
+            manifest = ThemeMirror(self.gateway, self.directory, 'development').mirror(self.themes[:1])
+
+        self.assertFalse(manifest['themes']['1']['complete'])
+        self.assertIn(
+            'ERROR:root:[development] Mirrored theme id 1 "Default": 1 files, 1 updated, 0 unchanged, 1 failed',
+            log.output)
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from watchgod.watcher import Change
+
+from ntk.offline import DELETE, is_unavailable, OfflineQueue, PUSH
+
+
+class TestOfflineQueue(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_add_should_keep_latest_action_of_each_template(self):
+        queue = OfflineQueue('development', 1234, queue_dir='queue')
+        queue.add(['layouts/base.html', 'assets/main.css'], PUSH)
+        queue.add(['assets/main.css'], DELETE)
+
+        self.assertEqual(queue.changes, {'layouts/base.html': PUSH, 'assets/main.css': DELETE})
+
+    def test_queue_should_survive_a_restart(self):
+        queue = OfflineQueue('development', 1234, queue_dir='queue')
+        queue.add(['layouts/base.html', 'assets/main.css'], PUSH)
+        queue.discard('assets/main.css')
+        queue.save()
+
+        self.assertEqual(OfflineQueue('development', 1234, queue_dir='queue').changes, {'layouts/base.html': PUSH})
+        # queues are kept per environment and are dropped when the theme changed
+        self.assertEqual(len(OfflineQueue('production', 1234, queue_dir='queue')), 0)
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(len(OfflineQueue('development', 5678, queue_dir='queue')), 0)
+
+    def test_get_changes_should_follow_files_on_disk(self):
+        os.makedirs('layouts')
+        with open('layouts/base.html', 'w') as f:
+            f.write('content')
+        queue = OfflineQueue('development', 1234, queue_dir='queue')
+        queue.add(['layouts/base.html', 'layouts/removed.html'], PUSH)
+
+        self.assertEqual(sorted(queue.get_changes()), [
+            (Change.modified, os.path.abspath('layouts/base.html')),
+            (Change.deleted, os.path.abspath('layouts/removed.html')),
+        ])
+
+    def test_is_unavailable_should_only_match_responses_worth_retrying(self):
+        self.assertTrue(is_unavailable(MagicMock(status_code=503)))
+        self.assertTrue(is_unavailable(MagicMock(status_code=429)))
+        self.assertFalse(is_unavailable(MagicMock(status_code=400)))
+        self.assertFalse(is_unavailable(MagicMock(status_code=201)))
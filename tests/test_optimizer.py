@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ntk import optimizer
+from ntk.optimizer import get_cache_path, optimize_content, optimize_files
+
+
+class TestOptimizer(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        os.makedirs('locales')
+        os.makedirs('layouts')
+        with open('locales/en.json', 'wb') as f:
+            f.write('{\n    "title": "Référence",\n    "items": [1, 2]\n}\n'.encode('utf-8'))
+        with open('layouts/base.html', 'w') as f:
+            f.write('<html>\n</html>\n')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_optimize_content_should_minify_json(self):
+        content = b'{\n    "title": "R\xc3\xa9f\xc3\xa9rence",\n    "items": [1, 2]\n}\n'
+        self.assertEqual(
+            optimize_content('locales/en.json', content), '{"title":"Référence","items":[1,2]}'.encode('utf-8'))
+
+    def test_optimize_content_should_keep_content_it_can_not_optimize(self):
+        self.assertEqual(optimize_content('locales/en.json', b'{"broken": '), b'{"broken": ')
+        self.assertEqual(optimize_content('locales/en.json', b'{}'), b'{}')
+        self.assertEqual(optimize_content('layouts/base.html', b'<html>\n</html>\n'), b'<html>\n</html>\n')
+
+    def test_optimize_files_should_write_optimized_copy_to_cache(self):
+        optimized_paths = optimize_files(['locales/en.json', 'layouts/base.html'], cache_dir='cache')
+
+        self.assertEqual(list(optimized_paths), ['locales/en.json'])
+        with open(optimized_paths['locales/en.json'], 'rb') as f:
+            self.assertEqual(f.read(), '{"title":"Référence","items":[1,2]}'.encode('utf-8'))
+        with open('locales/en.json', 'rb') as f:
+            self.assertEqual(optimized_paths['locales/en.json'], get_cache_path('locales/en.json', f.read(), 'cache'))
+
+    @patch('ntk.optimizer._optimize_file', wraps=optimizer._optimize_file)
+    def test_optimize_files_should_only_optimize_content_not_in_cache(self, mock_optimize_file):
+        optimize_files(['locales/en.json'], cache_dir='cache')
+        optimize_files(['locales/en.json'], cache_dir='cache')
+        self.assertEqual(mock_optimize_file.call_count, 1)
+
+        with open('locales/en.json', 'w') as f:
+            f.write('{"title": "Changed"}')
+        optimize_files(['locales/en.json'], cache_dir='cache')
+        self.assertEqual(mock_optimize_file.call_count, 2)
+
+    def test_optimize_files_with_many_files_should_use_process_pool(self):
+        for name in ['fr', 'de', 'es']:
+            with open(f'locales/{name}.json', 'w') as f:
+                f.write(f'{{\n    "language": "{name}"\n}}')
+
+        with patch('ntk.optimizer.ProcessPoolExecutor', wraps=optimizer.ProcessPoolExecutor) as mock_executor:
+            optimized_paths = optimize_files(
+                ['locales/fr.json', 'locales/de.json', 'locales/es.json'], cache_dir='cache')
+
+        mock_executor.assert_called_once()
+        # never forked from a process running upload threads
+        self.assertEqual(mock_executor.call_args.kwargs['mp_context'].get_start_method(), 'spawn')
+        for name in ['fr', 'de', 'es']:
+            with open(optimized_paths[f'locales/{name}.json']) as f:
+                self.assertEqual(f.read(), f'{{"language":"{name}"}}')
@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from watchgod.watcher import Change
+
+from ntk.pipeline import UploadPipeline
+
+
+class TestUploadPipeline(unittest.TestCase):
+    def test_submit_should_handle_each_change_without_blocking_event_loop(self):
+        handler = MagicMock()
+        pipeline = UploadPipeline(handler)
+
+        async def main():
+            pipeline.submit({(Change.modified, 'layouts/base.html'), (Change.deleted, 'assets/main.css')})
+            await pipeline.join()
+
+        asyncio.run(main())
+        pipeline.shutdown()
+
+        handled = sorted(call_args.args[0][0] for call_args in handler.call_args_list)
+        self.assertEqual(handled, [(Change.modified, 'layouts/base.html'), (Change.deleted, 'assets/main.css')])
+
+    def test_submit_same_file_during_upload_should_only_handle_latest_change(self):
+        started = threading.Event()
+        release = threading.Event()
+        handled = []
+
+        def handler(changes):
+            handled.extend(changes)
+            started.set()
+            release.wait(5)
+
+        pipeline = UploadPipeline(handler)
+
+        async def main():
+            pipeline.submit([(Change.modified, 'layouts/base.html')])
+            await asyncio.get_event_loop().run_in_executor(None, started.wait, 5)
+            # obsolete saves while the first upload is in flight
+            pipeline.submit([(Change.modified, 'layouts/base.html')])
+            pipeline.submit([(Change.added, 'layouts/base.html')])
+            pipeline.submit([(Change.deleted, 'layouts/base.html')])
+            self.assertEqual(len(handled), 1)
+            release.set()
+            await pipeline.join()
+
+        asyncio.run(main())
+        pipeline.shutdown()
+
+        self.assertEqual(handled, [(Change.modified, 'layouts/base.html'), (Change.deleted, 'layouts/base.html')])
+
+    @patch('ntk.utils.get_file_size', autospec=True)
+    def test_large_file_upload_should_not_block_template_uploads(self, mock_get_file_size):
+        mock_get_file_size.side_effect = lambda pathfile: 200 * 1024 * 1024 if pathfile.endswith('.mp4') else 100
+        release = threading.Event()
+        handled = []
+
+        def handler(changes):
+            if changes[0][1].endswith('.mp4'):
+                release.wait(5)
+            handled.extend(changes)
+
+        pipeline = UploadPipeline(handler, max_workers=1)
+
+        async def main():
+            pipeline.submit([(Change.added, 'assets/video.mp4')])
+            pipeline.submit([(Change.modified, 'layouts/base.html')])
+            while not handled:
+                await asyncio.sleep(0.01)
+            release.set()
+            await pipeline.join()
+
+        asyncio.run(main())
+        pipeline.shutdown()
+
+        self.assertEqual(handled, [(Change.modified, 'layouts/base.html'), (Change.added, 'assets/video.mp4')])
+
+    def test_burst_of_changes_should_be_handled_by_bulk_handler(self):
+        handler = MagicMock()
+        bulk_handler = MagicMock()
+        pipeline = UploadPipeline(handler, bulk_handler=bulk_handler, burst_threshold=3)
+
+        async def main():
+            pipeline.submit([(Change.modified, f'assets/{index}.css') for index in range(5)])
+            await pipeline.join()
+            pipeline.submit([(Change.modified, 'layouts/base.html')])
+            await pipeline.join()
+
+        asyncio.run(main())
+        pipeline.shutdown()
+
+        bulk_handler.assert_called_once()
+        self.assertEqual(len(bulk_handler.call_args.args[0]), 5)
+        handler.assert_called_once_with([(Change.modified, 'layouts/base.html')])
+
+    def test_burst_of_changes_should_wait_for_running_uploads_of_the_same_files(self):
+        release = threading.Event()
+        handled = []
+
+        def handler(changes):
+            release.wait(5)
+            handled.append(('handler', changes))
+
+        pipeline = UploadPipeline(
+            handler, bulk_handler=lambda changes: handled.append(('bulk', changes)), burst_threshold=3)
+
+        async def main():
+            pipeline.submit([(Change.modified, 'layouts/base.html')])
+            await asyncio.sleep(0.05)
+            pipeline.submit([(Change.modified, f'assets/{index}.css') for index in range(2)] + [
+                (Change.modified, 'layouts/base.html')])
+            await asyncio.sleep(0.05)
+            self.assertEqual(handled, [])
+            release.set()
+            await pipeline.join()
+
+        asyncio.run(main())
+        pipeline.shutdown()
+
+        self.assertEqual([name for name, _ in handled], ['handler', 'bulk'])
+        self.assertIn((Change.modified, 'layouts/base.html'), handled[1][1])
+
+    def test_submit_bulk_should_wait_for_running_uploads(self):
+        release = threading.Event()
+        handled = []
+
+        def handler(changes):
+            release.wait(5)
+            handled.append(('handler', changes))
+
+        pipeline = UploadPipeline(handler, bulk_handler=lambda changes: handled.append(('bulk', changes)))
+
+        async def main():
+            pipeline.submit([(Change.modified, 'layouts/base.html')])
+            await asyncio.sleep(0.05)
+            pipeline.submit_bulk([(Change.modified, 'layouts/base.html')])
+            await asyncio.sleep(0.05)
+            self.assertEqual(handled, [])
+            release.set()
+            await pipeline.join()
+
+        asyncio.run(main())
+        pipeline.shutdown()
+
+        self.assertEqual(handled, [
+            ('handler', [(Change.modified, 'layouts/base.html')]),
+            ('bulk', [(Change.modified, 'layouts/base.html')])])
+
+    def test_submit_bulk_should_hand_changes_to_bulk_handler_below_threshold(self):
+        handler = MagicMock()
+        bulk_handler = MagicMock()
+        pipeline = UploadPipeline(handler, bulk_handler=bulk_handler)
+
+        async def main():
+            pipeline.submit_bulk([(Change.modified, 'layouts/base.html'), (Change.deleted, 'assets/main.css')])
+            await pipeline.join()
+
+        asyncio.run(main())
+        pipeline.shutdown()
+
+        handler.assert_not_called()
+        bulk_handler.assert_called_once_with(
+            [(Change.modified, 'layouts/base.html'), (Change.deleted, 'assets/main.css')])
+
+    def test_idle_callback_should_be_called_once_every_change_is_handled(self):
+        release = threading.Event()
+        idle = []
+
+        def handler(changes):
+            release.wait(5)
+
+        pipeline = UploadPipeline(handler, idle_callback=lambda: idle.append(len(pipeline.running)))
+
+        async def main():
+            pipeline.submit({(Change.modified, 'layouts/base.html'), (Change.modified, 'assets/main.css')})
+            await asyncio.sleep(0.05)
+            self.assertEqual(idle, [])
+            release.set()
+            await pipeline.join()
+
+        asyncio.run(main())
+        pipeline.shutdown()
+
+        self.assertEqual(idle, [0])
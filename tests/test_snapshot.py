@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ntk.snapshot import SnapshotStore
+
+
+class TestSnapshotStore(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        self.store = SnapshotStore('development', root='snapshots')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def write(self, pathfile, content):
+        with open(pathfile, 'w') as f:
+            f.write(content)
+        return pathfile
+
+    def test_put_blob_should_store_each_content_once(self):
+        first_hash = self.store.put_blob(self.write('a.html', 'same content'))
+        second_hash = self.store.put_blob(self.write('b.html', 'same content'))
+
+        self.assertEqual(first_hash, second_hash)
+        blobs = [name for _, _, names in os.walk('snapshots/objects') for name in names]
+        self.assertEqual(blobs, [first_hash])
+        with open(self.store.get_blob_path(first_hash)) as f:
+            self.assertEqual(f.read(), 'same content')
+
+    def test_record_should_only_store_changes_to_parent_snapshot(self):
+        first_id = self.store.record({'layouts/base.html': 'a', 'assets/main.css': 'b'}, True, theme_id=1)
+        second_id = self.store.record({'layouts/base.html': 'c', 'assets/main.js': 'd'}, True, theme_id=1)
+
+        second = self.store._read(second_id)
+        self.assertEqual(second['parent'], first_id)
+        self.assertEqual(second['changed'], {'layouts/base.html': 'c', 'assets/main.js': 'd'})
+        self.assertEqual(second['deleted'], ['assets/main.css'])
+        self.assertNotIn('files', second)
+
+        self.assertEqual(self.store.get(second_id)['files'], {'layouts/base.html': 'c', 'assets/main.js': 'd'})
+        self.assertEqual(self.store.get(first_id)['files'], {'layouts/base.html': 'a', 'assets/main.css': 'b'})
+        self.assertEqual(self.store.get_latest()['id'], second_id)
+
+    @patch('ntk.snapshot.SNAPSHOT_CHAIN_LENGTH', 2)
+    def test_record_should_store_whole_tree_at_end_of_chain(self):
+        self.store.record({'a': '1'}, True)
+        self.store.record({'a': '2'}, True)
+        third_id = self.store.record({'a': '3'}, True)
+
+        self.assertEqual(self.store._read(third_id)['files'], {'a': '3'})
+        self.assertEqual(self.store._read(third_id)['depth'], 0)
+
+    def test_find_should_match_unique_prefix_and_latest(self):
+        first_id = self.store.record({'a': '1'}, True)
+        second_id = self.store.record({'a': '2'}, True)
+
+        self.assertEqual(self.store.find(first_id[:-2]), first_id)
+        self.assertEqual(self.store.find('latest'), second_id)
+        with self.assertRaises(KeyError):
+            self.store.find('2000')
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ntk import validator
+from ntk.validator import validate_content, validate_files
+
+
+class TestValidator(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        os.makedirs('locales')
+        os.makedirs('layouts')
+        os.makedirs('assets')
+        self.write('locales/en.json', b'{"title": "Home"}')
+        self.write('layouts/base.html', b'{% load i18n %}{% if user %}{% trans "Hi" %}{% else %}-{% endif %}')
+        self.write('assets/logo.png', b'\x89PNG')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def write(self, pathfile, content):
+        with open(pathfile, 'wb') as f:
+            f.write(content)
+
+    def test_validate_content_should_check_json_and_utf8(self):
+        self.assertEqual(validate_content('locales/en.json', b'{"title": "Home"}'), [])
+        self.assertEqual(len(validate_content('locales/en.json', b'{"title": ')), 1)
+        self.assertIn('not valid JSON', validate_content('locales/en.json', b'{"title": ')[0])
+        self.assertEqual(validate_content('assets/main.css', b'body {}\xff'), ['not valid UTF-8, byte 7'])
+
+    def test_validate_content_should_check_template_tags_balance(self):
+        self.assertEqual(validate_content(
+            'layouts/base.html',
+            b'{% block content %}{% for i in items %}{% empty %}{% endfor %}{% endblock %}'
+            b'{% comment %}{% if %}{% endcomment %}{# {% if %} #}{% cache 60 menu %}{% endcache %}'), [])
+        self.assertEqual(
+            validate_content('layouts/base.html', b'{% if a %}\n{% for x in y %}\n{% endif %}'),
+            ['line 3: {% endif %} closes {% for %} of line 2'])
+        self.assertEqual(
+            validate_content('layouts/base.html', b'<div>\n{% block content %}'),
+            ['line 2: {% block %} is never closed'])
+        self.assertEqual(validate_content('layouts/base.html', b'{% endif %}'), ['line 1: unexpected {% endif %}'])
+        self.assertEqual(
+            validate_content('layouts/base.html', b'\n{% url "home" '), ['line 2: {% is never closed by %}'])
+
+    def test_validate_files_should_only_return_invalid_files(self):
+        self.write('locales/fr.json', b'{"title": ')
+
+        invalid = validate_files(['locales/en.json', 'locales/fr.json', 'layouts/base.html', 'assets/logo.png'])
+
+        self.assertEqual(list(invalid), ['locales/fr.json'])
+
+    @patch('ntk.validator._validate_file', wraps=validator._validate_file)
+    def test_validate_files_should_not_check_valid_content_again(self, mock_validate_file):
+        validate_files(['locales/en.json'], cache_dir='cache')
+        validate_files(['locales/en.json'], cache_dir='cache')
+        self.assertEqual(mock_validate_file.call_count, 1)
+
+        self.write('locales/en.json', b'{"title": ')
+        validate_files(['locales/en.json'], cache_dir='cache')
+        validate_files(['locales/en.json'], cache_dir='cache')
+        self.assertEqual(mock_validate_file.call_count, 3)
+
+    @patch('ntk.validator.open', create=True, side_effect=AssertionError('read'))
+    def test_validate_files_should_not_read_media_files(self, mock_open_file):
+        self.assertEqual(validate_files(['assets/logo.png', 'assets/video.mp4'], cache_dir='cache'), {})
+        mock_open_file.assert_not_called()
+
+    def test_validate_files_with_max_file_size_should_refuse_larger_files_without_reading_them(self):
+        self.write('assets/video.mp4', b'0' * 3000)
+        self.write('locales/fr.json', b'{"title": "' + b'a' * 3000 + b'"}')
+
+        with patch('ntk.validator.open', create=True, side_effect=open) as mock_open_file:
+            invalid = validate_files(
+                ['assets/video.mp4', 'locales/fr.json', 'locales/en.json'], cache_dir='cache', max_file_size=2)
+
+        self.assertEqual(invalid, {
+            'assets/video.mp4': ['3000 bytes, larger than max_file_size of 2 KB'],
+            'locales/fr.json': ['3013 bytes, larger than max_file_size of 2 KB'],
+        })
+        read_files = [open_call.args[0] for open_call in mock_open_file.call_args_list if open_call.args[1] == 'rb']
+        self.assertEqual(read_files, ['locales/en.json'])
+
+    def test_validate_files_should_not_limit_file_size_by_default(self):
+        self.write('assets/video.mp4', b'0' * 3000)
+        self.assertEqual(validate_files(['assets/video.mp4'], cache_dir='cache'), {})
+
+    def test_validate_files_with_many_files_should_use_process_pool(self):
+        for name in ['fr', 'de', 'es']:
+            self.write(f'locales/{name}.json', b'{"broken": ' if name == 'de' else b'{}')
+
+        with patch('ntk.validator.ProcessPoolExecutor', wraps=validator.ProcessPoolExecutor) as mock_executor:
+            invalid = validate_files([f'locales/{name}.json' for name in ['fr', 'de', 'es']], cache_dir='cache')
+
+        self.assertEqual(list(invalid), ['locales/de.json'])
+        self.assertEqual(mock_executor.call_args.kwargs['mp_context'].get_start_method(), 'spawn')
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from watchgod.watcher import Change
+
+from ntk import watcher
+from ntk.utils import is_theme_file
+from ntk.watcher import get_watch_paths, ThemeWatcher, watch_theme
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        for pathfile in ['layouts/base.html', 'assets/main.css', 'node_modules/lib/index.js', 'README.md']:
+            os.makedirs(os.path.join(self.root, os.path.dirname(pathfile)), exist_ok=True)
+            with open(os.path.join(self.root, pathfile), 'w') as f:
+                f.write('content')
+
+        self.cwd = os.getcwd()
+        os.chdir(self.root)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_is_theme_file_should_match_glob_pattern(self):
+        self.assertTrue(is_theme_file('layouts/base.html'))
+        self.assertTrue(is_theme_file('assets/fonts/icons.woff2'))
+        self.assertTrue(is_theme_file('sass/components/_button.scss'))
+        self.assertFalse(is_theme_file('layouts/base.css'))
+        self.assertFalse(is_theme_file('node_modules/lib/index.js'))
+        self.assertFalse(is_theme_file('config.yml'))
+
+    def test_get_watch_paths_should_return_only_existing_theme_directories(self):
+        self.assertEqual(
+            get_watch_paths(self.root), [os.path.join(self.root, 'assets'), os.path.join(self.root, 'layouts')])
+
+    def test_theme_watcher_should_only_track_theme_files(self):
+        theme_watcher = ThemeWatcher('.')
+        self.assertEqual(sorted(theme_watcher.files), ['./assets/main.css', './layouts/base.html'])
+
+        with open('node_modules/lib/other.js', 'w') as f:
+            f.write('content')
+        with open('layouts/page.html', 'w') as f:
+            f.write('content')
+
+        self.assertEqual(theme_watcher.check(), {(Change.added, './layouts/page.html')})
+
+    def test_theme_watcher_should_skip_ignored_files(self):
+        os.makedirs('assets/vendor')
+        with open('assets/vendor/lib.js', 'w') as f:
+            f.write('content')
+        with open('.ntkignore', 'w') as f:
+            f.write('assets/vendor/\n*.map\n')
+
+        theme_watcher = ThemeWatcher('.')
+        self.assertEqual(sorted(theme_watcher.files), ['./assets/main.css', './layouts/base.html'])
+
+        with open('assets/main.css.map', 'w') as f:
+            f.write('content')
+        self.assertEqual(theme_watcher.check(), set())
+        self.assertFalse(watcher._watch_filter(Change.added, os.path.abspath('assets/main.css.map')))
+        self.assertTrue(watcher._watch_filter(Change.added, os.path.abspath('assets/main.css')))
+
+    @patch.object(watcher, 'watchfiles', None)
+    @patch('ntk.watcher.watchgod.awatch', autospec=True)
+    def test_watch_theme_without_watchfiles_should_fallback_to_polling(self, mock_awatch):
+        async def changes(*args, **kwargs):
+            yield {(Change.modified, './layouts/base.html')}
+
+        mock_awatch.side_effect = changes
+
+        async def collect():
+            return [changes async for changes in watch_theme(self.root)]
+
+        self.assertEqual(asyncio.run(collect()), [{(Change.modified, './layouts/base.html')}])
+        mock_awatch.assert_called_once_with(self.root, watcher_cls=ThemeWatcher)